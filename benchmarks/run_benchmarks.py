@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+SMS Microservice Benchmarks / Benchmarks do Microserviço SMS
+Seeds a scratch database at realistic volumes, drives the Flask app through the
+test client (sends go through the simulated provider) and reports p50/p99 latency,
+throughput and peak RSS per endpoint.
+Popula um banco temporário com volumes realistas, exercita a aplicação Flask pelo
+test client (envios usam o provedor simulado) e informa latência p50/p99, vazão e
+pico de RSS por endpoint.
+
+Usage / Uso:
+    python benchmarks/run_benchmarks.py --scales 10k,100k
+    python benchmarks/run_benchmarks.py --scales 10k --save-baseline main
+    python benchmarks/run_benchmarks.py --scales 10k --compare main
+
+Baselines are machine specific and are not committed. Record one on the base
+branch with --save-baseline, then run --compare with the same scales on the
+branch under test; the exit status is 1 when a metric regresses past --threshold.
+Baselines dependem da máquina e não são versionadas. Grave uma no branch base com
+--save-baseline e depois rode --compare com as mesmas escalas no branch testado; o
+código de saída é 1 quando uma métrica piora além de --threshold.
+
+Each endpoint runs in its own process so peak RSS is attributed to that endpoint.
+Cada endpoint roda em seu próprio processo para que o pico de RSS seja atribuído a ele.
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+# Benchmarked endpoints: name -> (default iterations, description)
+# Endpoints medidos: nome -> (iterações padrão, descrição)
+ENDPOINTS = {
+    'history_first_page': (50, 'GET /api/sms/history?limit=100'),
+    'history_deep_page': (20, 'GET /api/sms/history?limit=100&offset=<middle>'),
+    'history_cursor_page': (20, 'GET /api/sms/history?limit=100&cursor=<middle>'),
+    'history_contact_type': (20, 'GET /api/sms/history?limit=100&contact_type=client'),
+    'message_status': (100, 'GET /api/sms/status/<id>'),
+    'service_status': (50, 'GET /api/sms/status'),
+    'groups': (20, 'GET /api/groups'),
+    'contacts': (3, 'GET /api/contacts'),
+    'send_bulk_enqueue': (10, 'POST /api/sms/send/bulk (1,000 recipients)'),
+    'dispatch': (1, 'Outbox drain of 5,000 messages through the simulated provider'),
+}
+
+GROUP_COUNT = 20
+BULK_RECIPIENTS = 1000
+DISPATCH_MESSAGES = 5000
+SEED_BATCH = 10000
+
+def parse_scale(value):
+    """
+    Parse 10k / 100k / 1m style scales / Interpreta escalas no formato 10k / 100k / 1m
+    """
+    value = value.strip().lower()
+    multiplier = 1
+    if value.endswith('k'):
+        multiplier, value = 1000, value[:-1]
+    elif value.endswith('m'):
+        multiplier, value = 1000000, value[:-1]
+    return int(float(value) * multiplier)
+
+def configure_environment(db_path, provider_latency_ms):
+    """
+    Point the app at the scratch database before src.main is imported
+    Aponta a aplicação para o banco temporário antes de importar src.main
+    """
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    # Never archive, and never touch the real archive directory / Nunca arquiva nem toca o diretório de arquivo real
+    os.environ['SMS_RETENTION_DAYS'] = '0'
+    os.environ['SMS_ARCHIVE_DIR'] = os.path.splitext(db_path)[0] + '-archive'
+    os.environ['SMS_DISPATCH_WORKERS'] = '0'
+    os.environ['SMS_PROVIDER'] = 'simulated'
+    os.environ['SMS_SIM_LATENCY_MS'] = str(provider_latency_ms)
+    os.environ.setdefault('SMS_SIM_LATENCY_DISTRIBUTION', 'lognormal')
+
+def phone_number(index):
+    return f'+1555{index:07d}'
+
+def seed(db_path, scale):
+    """
+    Seed contacts, groups, templates and messages with set-based inserts
+    Popula contatos, grupos, templates e mensagens com inserts em lote
+    """
+    from src.main import app
+    from src.models.sms import db, Contact, ContactGroup, SmsMessage, SmsTemplate, contact_group_members
+    
+    rng = random.Random(scale)
+    now = datetime.utcnow()
+    
+    with app.app_context():
+        db.session.execute(db.insert(ContactGroup), [
+            {'name': f'Group {index}', 'description': 'Benchmark group', 'group_type': 'mixed', 'active': True, 'created_at': now}
+            for index in range(GROUP_COUNT)
+        ])
+        db.session.execute(db.insert(SmsTemplate), [
+            {'name': f'Template {index}', 'template': 'Hello {name}, update for {project_name}.', 'template_type': 'general', 'active': True, 'created_at': now}
+            for index in range(10)
+        ])
+        db.session.commit()
+        
+        for start in range(0, scale, SEED_BATCH):
+            indexes = range(start, min(start + SEED_BATCH, scale))
+            db.session.execute(db.insert(Contact), [
+                {
+                    'name': f'Contact {index}',
+                    'phone_number': phone_number(index),
+                    'phone_e164': phone_number(index),
+                    'contact_type': 'client' if index % 2 else 'employee',
+                    'email': f'contact{index}@example.com',
+                    'company': f'Company {index % 500}',
+                    'position': 'Project Manager',
+                    'active': index % 20 != 0,
+                    'created_at': now
+                }
+                for index in indexes
+            ])
+            db.session.execute(contact_group_members.insert(), [
+                {'contact_id': index + 1, 'group_id': index % GROUP_COUNT + 1}
+                for index in indexes
+            ])
+            db.session.execute(db.insert(SmsMessage), [
+                {
+                    'from_number': '+15550000001',
+                    'to_number': phone_number(recipient),
+                    'contact_id': recipient + 1,
+                    'contact_type': 'client' if recipient % 2 else 'employee',
+                    'message': 'Benchmark message body for history queries - Financial Solutions',
+                    'status': rng.choice(('delivered', 'delivered', 'delivered', 'sent', 'failed', 'undelivered')),
+                    'provider_message_id': f'sim_seed_{index}',
+                    'provider_response': 'sent',
+                    'attempts': 1,
+                    'created_at': now - timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+                    'updated_at': now
+                }
+                for index, recipient in zip(indexes, (rng.randrange(scale) for _ in indexes))
+            ])
+            db.session.commit()
+
+def measure(endpoint, iterations, scale):
+    """
+    Run one endpoint and return its latency samples and operation count
+    Executa um endpoint e retorna suas amostras de latência e número de operações
+    """
+    from src.main import app
+    from src.models.sms import db, SmsMessage
+    from src.routes.sms import dispatcher
+    from src.services.sms_service import encode_history_cursor
+    
+    client = app.test_client()
+    
+    with app.app_context():
+        max_id = db.session.query(db.func.max(SmsMessage.id)).scalar() or 1
+        middle = SmsMessage.query.order_by(SmsMessage.created_at.desc(), SmsMessage.id.desc()).offset(scale // 2).first()
+        middle_cursor = encode_history_cursor(middle) if middle else ''
+    
+    def request(method, url, **kwargs):
+        response = getattr(client, method)(url, **kwargs)
+        if response.status_code >= 500:
+            raise RuntimeError(f'{url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+        return response
+    
+    def run_once(iteration):
+        if endpoint == 'history_first_page':
+            request('get', '/api/sms/history?limit=100')
+        elif endpoint == 'history_deep_page':
+            request('get', f'/api/sms/history?limit=100&offset={scale // 2}')
+        elif endpoint == 'history_cursor_page':
+            request('get', f'/api/sms/history?limit=100&cursor={middle_cursor}')
+        elif endpoint == 'history_contact_type':
+            request('get', '/api/sms/history?limit=100&contact_type=client')
+        elif endpoint == 'message_status':
+            request('get', f'/api/sms/status/{(iteration * 7919) % max_id + 1}')
+        elif endpoint == 'service_status':
+            request('get', '/api/sms/status')
+        elif endpoint == 'groups':
+            request('get', '/api/groups')
+        elif endpoint == 'contacts':
+            request('get', '/api/contacts')
+        elif endpoint == 'send_bulk_enqueue':
+            request('post', '/api/sms/send/bulk', json={
+                'to': [phone_number(scale + iteration * BULK_RECIPIENTS + index) for index in range(BULK_RECIPIENTS)],
+                'message': 'Benchmark bulk send'
+            })
+        elif endpoint == 'dispatch':
+            request('post', '/api/sms/send/bulk', json={
+                'to': [phone_number(scale + index) for index in range(DISPATCH_MESSAGES)],
+                'message': 'Benchmark dispatch'
+            })
+            with app.app_context():
+                started = time.perf_counter()
+                delivered = dispatcher.drain()
+                return time.perf_counter() - started, delivered
+        return None
+    
+    samples = []
+    operations = 0
+    for iteration in range(iterations):
+        started = time.perf_counter()
+        timed = run_once(iteration)
+        if timed is not None:
+            elapsed, count = timed
+            samples.append(elapsed)
+            operations += count
+        else:
+            samples.append(time.perf_counter() - started)
+            operations += 1
+    
+    return samples, operations
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process / Pico de memória residente deste processo
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux / ru_maxrss é em bytes no macOS e kilobytes no Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def run_child(args, *extra):
+    """
+    Run this script in a child process and parse its JSON output
+    Executa este script em um processo filho e interpreta sua saída JSON
+    """
+    command = [sys.executable, os.path.abspath(__file__), *extra,
+               '--db', args.db, '--provider-latency-ms', str(args.provider_latency_ms)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'benchmark child failed')
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def run_scale(args, scale):
+    """
+    Seed one scale and benchmark every selected endpoint
+    Popula uma escala e mede cada endpoint selecionado
+    """
+    with tempfile.TemporaryDirectory(prefix='sms-bench-') as workdir:
+        args.db = os.path.join(workdir, 'bench.db')
+        
+        print(f'\n== scale {scale:,} ==')
+        started = time.perf_counter()
+        run_child(args, 'seed', '--scale', str(scale))
+        print(f'seeded in {time.perf_counter() - started:.1f}s')
+        
+        results = {}
+        for endpoint in args.endpoints:
+            iterations = args.iterations or ENDPOINTS[endpoint][0]
+            try:
+                results[endpoint] = run_child(args, 'measure', '--scale', str(scale),
+                                              '--endpoint', endpoint, '--iterations', str(iterations))
+            except RuntimeError as e:
+                results[endpoint] = {'error': str(e)}
+            print(format_row(endpoint, results[endpoint]))
+        
+        return results
+
+def format_row(endpoint, result):
+    if 'error' in result:
+        return f'{endpoint:<22} ERROR {result["error"]}'
+    return (f'{endpoint:<22} p50 {result["p50_ms"]:>10.2f} ms   p99 {result["p99_ms"]:>10.2f} ms   '
+            f'{result["throughput"]:>10.1f} ops/s   peak RSS {result["peak_rss_mb"]:>8.1f} MB')
+
+def compare(results, baseline, threshold):
+    """
+    Print the change against a baseline and report regressions
+    Mostra a variação em relação a uma baseline e informa regressões
+    
+    Returns:
+        list: Descriptions of regressions beyond threshold / Descrições das regressões acima do limite
+    """
+    regressions = []
+    print('\n== comparison with baseline ==')
+    for scale, endpoints in results.items():
+        for endpoint, result in endpoints.items():
+            previous = baseline.get(scale, {}).get(endpoint)
+            if not previous or 'error' in previous or 'error' in result:
+                continue
+            
+            for metric, higher_is_worse in (('p50_ms', True), ('p99_ms', True), ('throughput', False), ('peak_rss_mb', True)):
+                if not previous[metric]:
+                    continue
+                change = (result[metric] - previous[metric]) / previous[metric]
+                worse = change > threshold if higher_is_worse else change < -threshold
+                marker = '  REGRESSION' if worse else ''
+                print(f'{scale:>8} {endpoint:<22} {metric:<12} {previous[metric]:>10.2f} -> {result[metric]:>10.2f} ({change:+.0%}){marker}')
+                if worse:
+                    regressions.append(f'{scale} {endpoint} {metric} {change:+.0%}')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the SMS microservice API')
+    parser.add_argument('command', nargs='?', default='run', choices=('run', 'seed', 'measure'))
+    parser.add_argument('--scales', default='10k', help='Comma separated row counts, e.g. 10k,100k,1m')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='Comma separated endpoint names')
+    parser.add_argument('--iterations', type=int, default=0, help='Override iterations per endpoint')
+    parser.add_argument('--provider-latency-ms', type=float, default=0, help='Mean simulated provider latency')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--save-baseline', metavar='NAME', help='Save results as benchmarks/baselines/NAME.json')
+    parser.add_argument('--compare', metavar='NAME', help='Compare results with benchmarks/baselines/NAME.json')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative change reported as a regression')
+    # Internal arguments used by child processes / Argumentos internos usados pelos processos filhos
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--scale', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--endpoint', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.command == 'seed':
+        configure_environment(args.db, args.provider_latency_ms)
+        seed(args.db, args.scale)
+        print(json.dumps({'seeded': args.scale}))
+        return 0
+    
+    if args.command == 'measure':
+        configure_environment(args.db, args.provider_latency_ms)
+        samples, operations = measure(args.endpoint, args.iterations, args.scale)
+        print(json.dumps({
+            'iterations': len(samples),
+            'p50_ms': percentile(samples, 0.50) * 1000,
+            'p99_ms': percentile(samples, 0.99) * 1000,
+            'throughput': operations / sum(samples) if sum(samples) else 0.0,
+            'peak_rss_mb': peak_rss_mb()
+        }))
+        return 0
+    
+    args.endpoints = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+    unknown = [name for name in args.endpoints if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f'unknown endpoints: {", ".join(unknown)}')
+    
+    # Check the baseline before spending minutes on the run / Verifica a baseline antes de gastar minutos na execução
+    baseline_path = os.path.join(BASELINE_DIR, f'{args.compare}.json') if args.compare else None
+    if baseline_path and not os.path.exists(baseline_path):
+        parser.error(f'no baseline named {args.compare!r} at {baseline_path}; record one with --save-baseline {args.compare}')
+    
+    results = {}
+    for scale in (parse_scale(value) for value in args.scales.split(',')):
+        results[str(scale)] = run_scale(args, scale)
+    
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f'{args.save_baseline}.json')
+        with open(path, 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f'\nBaseline saved to {path}')
+    
+    if args.compare:
+        with open(baseline_path) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) beyond {args.threshold:.0%}')
+            return 1
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,12 +5,14 @@ This script initializes the SMS microservice with sample data for testing
 Este script inicializa o microserviço SMS com dados de exemplo para testes
 """
 
+import json
 import os
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from src.main import app
 from src.models.sms import db, Contact, ContactGroup, SmsTemplate
+from src.services.templates import extract_placeholders
 
 def init_sample_data():
     """
@@ -159,6 +161,7 @@ def init_sample_data():
         ]
         
         for template in templates:
+            template.placeholders = json.dumps(extract_placeholders(template.template))
             db.session.add(template)
         
         db.session.commit()
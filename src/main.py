@@ -6,7 +6,9 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.sms import db
-from src.routes.sms import sms_bp
+from src.models.migrations import run_migrations
+from src.models.storage import configure_database
+from src.routes.sms import sms_bp, archiver, dispatcher, status_updates
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'sms_service_secret_key_2025'
@@ -17,12 +19,24 @@ CORS(app, origins="*")
 # Register SMS blueprint / Registra blueprint SMS
 app.register_blueprint(sms_bp, url_prefix='/api')
 
-# Database configuration / Configuração do banco de dados
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+# Database configuration (DATABASE_URL overrides the SQLite file) / Configuração do banco de dados (DATABASE_URL substitui o arquivo SQLite)
+configure_database(
+    app,
+    f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+)
 with app.app_context():
     db.create_all()
+    run_migrations()
+
+# Start outbox dispatch workers and status receipt writer. Rate limits are per process:
+# with several app processes, set SMS_DISPATCH_PROCESSES or SMS_DISPATCH_WORKERS=0 on all but one
+# Inicia workers de despacho da fila de saída e gravador de confirmações de status. Limites são por processo:
+# com vários processos, defina SMS_DISPATCH_PROCESSES ou SMS_DISPATCH_WORKERS=0 em todos exceto um
+dispatcher.start(app)
+status_updates.start(app)
+
+# Archive messages past the retention window / Arquiva mensagens após a janela de retenção
+archiver.start(app)
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -0,0 +1,207 @@
+import json
+from datetime import datetime
+from src.models.sms import db
+
+# Applied schema versions / Versões de esquema aplicadas
+schema_migrations = db.Table('schema_migrations',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(200), nullable=False),
+    db.Column('applied_at', db.DateTime, nullable=False)
+)
+
+# Registered migrations as (version, description, function) / Migrações registradas como (versão, descrição, função)
+MIGRATIONS = []
+
+def migration(version, description):
+    """
+    Register a schema migration. Migrations run once, in version order, each in its
+    own transaction, and must be idempotent because databases created by
+    db.create_all() already have the latest schema.
+    Registra uma migração de esquema. Migrações rodam uma vez, em ordem de versão,
+    cada uma em sua própria transação, e devem ser idempotentes porque bancos criados
+    por db.create_all() já possuem o esquema mais recente.
+    """
+    def decorator(function):
+        MIGRATIONS.append((version, description, function))
+        MIGRATIONS.sort(key=lambda entry: entry[0])
+        return function
+    return decorator
+
+def add_column(connection, table_name, column_name):
+    """
+    Add a column as declared on the model, if it does not exist yet
+    Adiciona uma coluna conforme declarada no modelo, se ainda não existir
+    """
+    inspector = db.inspect(connection)
+    if column_name in {column['name'] for column in inspector.get_columns(table_name)}:
+        return
+    
+    column = db.metadata.tables[table_name].columns[column_name]
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.execute(db.text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}'))
+
+def create_index(connection, table_name, index_name):
+    """
+    Create an index declared on the model, if it does not exist yet
+    Cria um índice declarado no modelo, se ainda não existir
+    """
+    for index in db.metadata.tables[table_name].indexes:
+        if index.name == index_name:
+            index.create(connection, checkfirst=True)
+            return
+    raise ValueError(f'Index {index_name} is not declared on {table_name}')
+
+def run_migrations():
+    """
+    Apply pending migrations to the configured database (called at startup)
+    Aplica migrações pendentes ao banco configurado (chamado na inicialização)
+    
+    Returns:
+        list: Versions applied by this call / Versões aplicadas por esta chamada
+    """
+    schema_migrations.create(db.engine, checkfirst=True)
+    
+    with db.engine.connect() as connection:
+        applied = set(connection.execute(db.select(schema_migrations.c.version)).scalars())
+    
+    newly_applied = []
+    for version, description, function in MIGRATIONS:
+        if version in applied:
+            continue
+        
+        try:
+            with db.engine.begin() as connection:
+                function(connection)
+                connection.execute(schema_migrations.insert().values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.utcnow()
+                ))
+        except db.exc.IntegrityError:
+            # Another process applied it concurrently / Outro processo aplicou em paralelo
+            continue
+        
+        newly_applied.append(version)
+        print(f"Applied database migration {version}: {description}")
+    
+    return newly_applied
+
+@migration(1, 'Outbox dispatch columns on sms_message')
+def add_outbox_columns(connection):
+    for column_name in ('job_id', 'attempts', 'claim_token', 'claimed_at', 'next_attempt_at'):
+        add_column(connection, 'sms_message', column_name)
+    create_index(connection, 'sms_message', 'ix_sms_message_job_id')
+    create_index(connection, 'sms_message', 'ix_sms_message_claim_token')
+
+@migration(2, 'History pagination index on sms_message (created_at, id)')
+def add_history_index(connection):
+    create_index(connection, 'sms_message', 'ix_sms_message_created_at_id')
+
+@migration(3, 'Lookup indexes for contacts, messages and group members')
+def add_lookup_indexes(connection):
+    create_index(connection, 'contact', 'ix_contact_phone_number')
+    create_index(connection, 'sms_message', 'ix_sms_message_to_number')
+    create_index(connection, 'sms_message', 'ix_sms_message_status')
+    create_index(connection, 'sms_message', 'ix_sms_message_provider_message_id')
+    create_index(connection, 'contact_group_members', 'ix_contact_group_members_group_id')
+
+@migration(4, 'Placeholder metadata and version on sms_template')
+def add_template_metadata(connection):
+    from src.services.templates import extract_placeholders
+    
+    add_column(connection, 'sms_template', 'placeholders')
+    add_column(connection, 'sms_template', 'version')
+    connection.execute(db.text('UPDATE sms_template SET version = 1 WHERE version IS NULL'))
+    
+    # Backfill placeholders of existing templates / Preenche placeholders dos templates existentes
+    rows = connection.execute(db.text('SELECT id, template FROM sms_template WHERE placeholders IS NULL')).all()
+    for template_id, text in rows:
+        try:
+            placeholders = extract_placeholders(text)
+        except ValueError:
+            placeholders = []
+        connection.execute(
+            db.text('UPDATE sms_template SET placeholders = :placeholders WHERE id = :id'),
+            {'placeholders': json.dumps(placeholders), 'id': template_id}
+        )
+
+@migration(5, 'E.164 phone column on contact and canonical sms_message.to_number')
+def add_e164_columns(connection):
+    from src.services.phone import normalize_phone
+    
+    add_column(connection, 'contact', 'phone_e164')
+    
+    # Backfill in batches of distinct numbers / Preenche em lotes de números distintos
+    numbers = connection.execute(db.text(
+        'SELECT DISTINCT phone_number FROM contact WHERE phone_e164 IS NULL'
+    )).scalars().all()
+    updates = [{'number': number, 'normalized': normalize_phone(number)} for number in numbers]
+    updates = [update for update in updates if update['normalized']]
+    for start in range(0, len(updates), 1000):
+        connection.execute(
+            db.text('UPDATE contact SET phone_e164 = :normalized WHERE phone_number = :number AND phone_e164 IS NULL'),
+            updates[start:start + 1000]
+        )
+    create_index(connection, 'contact', 'ix_contact_phone_e164')
+    
+    # Messages store E.164 in to_number, as new messages already do; invalid numbers stay as written
+    # Mensagens guardam E.164 em to_number, como as novas mensagens já fazem; números inválidos ficam como escritos
+    numbers = connection.execute(db.text('SELECT DISTINCT to_number FROM sms_message')).scalars().all()
+    updates = [{'number': number, 'normalized': normalize_phone(number)} for number in numbers]
+    updates = [update for update in updates if update['normalized'] and update['normalized'] != update['number']]
+    for start in range(0, len(updates), 1000):
+        connection.execute(
+            db.text('UPDATE sms_message SET to_number = :normalized WHERE to_number = :number'),
+            updates[start:start + 1000]
+        )
+
+@migration(6, 'Recipient contact and group linkage on sms_message')
+def add_recipient_linkage(connection):
+    for column_name in ('contact_id', 'contact_type', 'group_id'):
+        add_column(connection, 'sms_message', column_name)
+    
+    # Newest active contact with the same canonical number / Contato ativo mais recente com o mesmo número canônico
+    matching_contact = (
+        'FROM contact WHERE contact.phone_e164 = sms_message.to_number '
+        'ORDER BY contact.active DESC, contact.id DESC LIMIT 1'
+    )
+    connection.execute(db.text(
+        f'UPDATE sms_message SET contact_id = (SELECT contact.id {matching_contact}), '
+        f'contact_type = (SELECT contact.contact_type {matching_contact}) '
+        'WHERE contact_id IS NULL'
+    ))
+    connection.execute(db.text(
+        'UPDATE sms_message SET group_id = (SELECT sms_job.group_id FROM sms_job WHERE sms_job.id = sms_message.job_id) '
+        'WHERE group_id IS NULL AND job_id IS NOT NULL'
+    ))
+    
+    create_index(connection, 'sms_message', 'ix_sms_message_contact_id')
+    create_index(connection, 'sms_message', 'ix_sms_message_contact_type_created_at')
+    create_index(connection, 'sms_message', 'ix_sms_message_group_id_created_at')
+
+@migration(7, 'Encoding and segment count on sms_message')
+def add_segment_columns(connection):
+    from src.services.segments import measure
+    
+    for column_name in ('encoding', 'segments'):
+        add_column(connection, 'sms_message', column_name)
+    
+    # Backfill in id batches / Preenche em lotes por id
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            db.text('SELECT id, message FROM sms_message WHERE id > :last_id AND segments IS NULL ORDER BY id LIMIT 1000'),
+            {'last_id': last_id}
+        ).all()
+        if not rows:
+            break
+        
+        updates = []
+        for message_id, text in rows:
+            info = measure(text or '')
+            updates.append({'id': message_id, 'encoding': info.encoding, 'segments': info.segments})
+        connection.execute(
+            db.text('UPDATE sms_message SET encoding = :encoding, segments = :segments WHERE id = :id'),
+            updates
+        )
+        last_id = rows[-1][0]
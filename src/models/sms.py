@@ -1,23 +1,66 @@
+import json
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from src.services.phone import normalize_phone
+from src.services.segments import measure
 
 db = SQLAlchemy()
 
+# Delivery statuses that can never change again / Status de entrega que nunca mudam novamente
+TERMINAL_STATUSES = frozenset({'delivered', 'undelivered', 'failed', 'canceled'})
+
+# Progress order of statuses; a message never moves to a lower rank
+# Ordem de progresso dos status; uma mensagem nunca volta para uma posição menor
+STATUS_RANK = {
+    'pending': 0,
+    'sending': 1,
+    'accepted': 2,
+    'scheduled': 2,
+    'queued': 2,
+    'sent': 3,
+    'delivered': 4,
+    'undelivered': 4,
+    'failed': 4,
+    'canceled': 4,
+}
+
 class SmsMessage(db.Model):
     """
     Model for storing SMS message history
     Modelo para armazenar histórico de mensagens SMS
     """
+    __table_args__ = (
+        # Keyset pagination of the history / Paginação por chave do histórico
+        db.Index('ix_sms_message_created_at_id', 'created_at', 'id'),
+        # Filtered history pages / Páginas filtradas do histórico
+        db.Index('ix_sms_message_contact_type_created_at', 'contact_type', 'created_at', 'id'),
+        db.Index('ix_sms_message_group_id_created_at', 'group_id', 'created_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     from_number = db.Column(db.String(20), nullable=False)
-    to_number = db.Column(db.String(20), nullable=False)
+    to_number = db.Column(db.String(20), nullable=False, index=True)
     message = db.Column(db.Text, nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, sent, delivered, failed
-    provider_message_id = db.Column(db.String(100))
+    encoding = db.Column(db.String(8))  # GSM-7 or UCS-2 / GSM-7 ou UCS-2
+    segments = db.Column(db.Integer)  # Parts billed by the provider / Partes cobradas pelo provedor
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, sending, sent, delivered, failed
+    provider_message_id = db.Column(db.String(100), index=True)
     provider_response = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Outbox dispatch fields / Campos de despacho da fila de saída
+    job_id = db.Column(db.Integer, db.ForeignKey('sms_job.id'), index=True)
+    attempts = db.Column(db.Integer, default=0)
+    claim_token = db.Column(db.String(36), index=True)
+    claimed_at = db.Column(db.DateTime)
+    next_attempt_at = db.Column(db.DateTime)
+    
+    # Recipient linkage recorded at send time / Vínculo do destinatário registrado no envio
+    contact_id = db.Column(db.Integer, db.ForeignKey('contact.id'), index=True)
+    contact_type = db.Column(db.String(20))
+    group_id = db.Column(db.Integer, db.ForeignKey('contact_group.id'))
+    
     def __repr__(self):
         return f'<SmsMessage {self.id}: {self.to_number}>'
     
@@ -31,12 +74,123 @@ class SmsMessage(db.Model):
             'from_number': self.from_number,
             'to_number': self.to_number,
             'message': self.message,
+            'encoding': self.encoding,
+            'segments': self.segments,
             'status': self.status,
             'provider_message_id': self.provider_message_id,
+            'job_id': self.job_id,
+            'group_id': self.group_id,
+            'contact_id': self.contact_id,
+            'contact_type': self.contact_type,
+            'attempts': self.attempts,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class SmsJob(db.Model):
+    """
+    Model for tracking queued send requests (single, bulk or group)
+    Modelo para acompanhar solicitações de envio enfileiradas (única, em massa ou grupo)
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(20), nullable=False)  # single, bulk, group
+    group_id = db.Column(db.Integer)
+    total = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<SmsJob {self.id}: {self.job_type}>'
+    
+    def to_dict(self, status_counts=None):
+        """
+        Convert model to dictionary for JSON serialization
+        Converte modelo para dicionário para serialização JSON
+        
+        Args:
+            status_counts (dict): Message counts by status / Contagem de mensagens por status
+        """
+        status_counts = status_counts or {}
+        in_flight = status_counts.get('pending', 0) + status_counts.get('sending', 0)
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'group_id': self.group_id,
+            'total': self.total,
+            'status': 'in_progress' if in_flight else 'completed',
+            'status_counts': status_counts,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class IdempotencyKey(db.Model):
+    """
+    Model for replaying send requests and suppressing duplicate recipients
+    Modelo para repetir respostas de envios e suprimir destinatários duplicados
+    
+    scope 'recipient' rows hold per-recipient dedupe keys and the queued message id;
+    other scopes hold the response of a request sent with an Idempotency-Key header.
+    Linhas com escopo 'recipient' guardam chaves de deduplicação por destinatário e o
+    id da mensagem enfileirada; os demais escopos guardam a resposta de uma requisição
+    enviada com o cabeçalho Idempotency-Key.
+    """
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'key', name='uq_idempotency_key_scope_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(20), nullable=False)  # send, send_bulk, send_group, recipient
+    key = db.Column(db.String(255), nullable=False)
+    request_hash = db.Column(db.String(64))
+    status_code = db.Column(db.Integer)  # None while the request is in progress / None enquanto a requisição está em andamento
+    response = db.Column(db.Text)
+    message_id = db.Column(db.Integer)
+    job_id = db.Column(db.Integer)  # Send job committed under this key / Job de envio confirmado com esta chave
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.scope}:{self.key}>'
+
+class MessageArchive(db.Model):
+    """
+    Model for the monthly archive files holding messages moved out of sms_message
+    Modelo para os arquivos mensais que guardam mensagens retiradas de sms_message
+    
+    size_bytes is the committed length of the file; anything after it was written
+    by an archival run that did not commit and is ignored and overwritten.
+    size_bytes é o tamanho confirmado do arquivo; o que estiver depois dele foi escrito
+    por uma execução de arquivamento sem commit e é ignorado e sobrescrito.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.String(7), unique=True, nullable=False)  # YYYY-MM of created_at / YYYY-MM de created_at
+    path = db.Column(db.String(255), nullable=False)  # Relative to the archive directory / Relativo ao diretório de arquivo
+    row_count = db.Column(db.Integer, default=0)
+    size_bytes = db.Column(db.Integer, default=0)
+    min_id = db.Column(db.Integer)
+    max_id = db.Column(db.Integer)
+    first_created_at = db.Column(db.DateTime)
+    last_created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<MessageArchive {self.month}>'
+    
+    def to_dict(self):
+        """
+        Convert model to dictionary for JSON serialization
+        Converte modelo para dicionário para serialização JSON
+        """
+        return {
+            'month': self.month,
+            'path': self.path,
+            'row_count': self.row_count,
+            'size_bytes': self.size_bytes,
+            'min_id': self.min_id,
+            'max_id': self.max_id,
+            'first_created_at': self.first_created_at.isoformat() if self.first_created_at else None,
+            'last_created_at': self.last_created_at.isoformat() if self.last_created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
 class Contact(db.Model):
     """
     Model for storing contacts (clients and employees)
@@ -44,7 +198,8 @@ class Contact(db.Model):
     """
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
-    phone_number = db.Column(db.String(20), nullable=False)
+    phone_number = db.Column(db.String(20), nullable=False, index=True)
+    phone_e164 = db.Column(db.String(16), index=True)  # Canonical form of phone_number / Forma canônica de phone_number
     contact_type = db.Column(db.String(20), nullable=False)  # client, employee
     email = db.Column(db.String(120))
     company = db.Column(db.String(100))
@@ -58,22 +213,35 @@ class Contact(db.Model):
     def __repr__(self):
         return f'<Contact {self.name}: {self.phone_number}>'
     
-    def to_dict(self):
+    @db.validates('phone_number')
+    def _normalize_phone_number(self, key, phone_number):
+        # Keep the canonical column in step / Mantém a coluna canônica sincronizada
+        self.phone_e164 = normalize_phone(phone_number)
+        return phone_number
+    
+    def to_dict(self, member_counts=None):
         """
         Convert model to dictionary for JSON serialization
         Converte modelo para dicionário para serialização JSON
+        
+        Args:
+            member_counts (dict): Precomputed group sizes by group id / Tamanhos de grupo pré-calculados por id
         """
+        if member_counts is None:
+            member_counts = ContactGroup.member_counts([group.id for group in self.groups])
+        
         return {
             'id': self.id,
             'name': self.name,
             'phone_number': self.phone_number,
+            'phone_e164': self.phone_e164,
             'contact_type': self.contact_type,
             'email': self.email,
             'company': self.company,
             'position': self.position,
             'active': self.active,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'groups': [group.to_dict() for group in self.groups]
+            'groups': [group.to_dict(contact_count=member_counts.get(group.id, 0)) for group in self.groups]
         }
 
 class ContactGroup(db.Model):
@@ -94,11 +262,38 @@ class ContactGroup(db.Model):
     def __repr__(self):
         return f'<ContactGroup {self.name}>'
     
-    def to_dict(self):
+    @staticmethod
+    def member_counts(group_ids):
+        """
+        Count members of several groups with one aggregated query
+        Conta os membros de vários grupos com uma única consulta agregada
+        
+        Args:
+            group_ids (list): Group ids / Ids dos grupos
+        
+        Returns:
+            dict: Member count by group id / Contagem de membros por id do grupo
+        """
+        if not group_ids:
+            return {}
+        
+        rows = db.session.query(contact_group_members.c.group_id, db.func.count()) \
+            .filter(contact_group_members.c.group_id.in_(set(group_ids))) \
+            .group_by(contact_group_members.c.group_id) \
+            .all()
+        return dict(rows)
+    
+    def to_dict(self, contact_count=None):
         """
         Convert model to dictionary for JSON serialization
         Converte modelo para dicionário para serialização JSON
+        
+        Args:
+            contact_count (int): Precomputed member count / Contagem de membros pré-calculada
         """
+        if contact_count is None:
+            contact_count = ContactGroup.member_counts([self.id]).get(self.id, 0)
+        
         return {
             'id': self.id,
             'name': self.name,
@@ -106,14 +301,16 @@ class ContactGroup(db.Model):
             'group_type': self.group_type,
             'active': self.active,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'contact_count': len(self.contacts)
+            'contact_count': contact_count
         }
 
 # Association table for many-to-many relationship between contacts and groups
 # Tabela de associação para relacionamento muitos-para-muitos entre contatos e grupos
 contact_group_members = db.Table('contact_group_members',
     db.Column('contact_id', db.Integer, db.ForeignKey('contact.id'), primary_key=True),
-    db.Column('group_id', db.Integer, db.ForeignKey('contact_group.id'), primary_key=True)
+    db.Column('group_id', db.Integer, db.ForeignKey('contact_group.id'), primary_key=True),
+    # Member lookups by group / Busca de membros por grupo
+    db.Index('ix_contact_group_members_group_id', 'group_id', 'contact_id')
 )
 
 class SmsTemplate(db.Model):
@@ -126,12 +323,20 @@ class SmsTemplate(db.Model):
     template = db.Column(db.Text, nullable=False)
     description = db.Column(db.Text)
     template_type = db.Column(db.String(50))  # weather_alert, project_update, general
+    placeholders = db.Column(db.Text)  # JSON list of placeholder names / Lista JSON de nomes de placeholders
+    version = db.Column(db.Integer, nullable=False, default=1)  # Bumped when the text changes / Incrementada quando o texto muda
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
         return f'<SmsTemplate {self.name}>'
     
+    def placeholder_names(self):
+        """
+        Stored placeholder names / Nomes de placeholders armazenados
+        """
+        return json.loads(self.placeholders) if self.placeholders else []
+    
     def to_dict(self):
         """
         Convert model to dictionary for JSON serialization
@@ -143,6 +348,10 @@ class SmsTemplate(db.Model):
             'template': self.template,
             'description': self.description,
             'template_type': self.template_type,
+            'placeholders': self.placeholder_names(),
+            # Of the fixed text; values filled in can still force UCS-2 / Do texto fixo; valores preenchidos ainda podem forçar UCS-2
+            'encoding': measure(self.template).encoding,
+            'version': self.version,
             'active': self.active,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
@@ -0,0 +1,109 @@
+import os
+from src.models.sms import db
+
+def database_url(default_url):
+    """
+    Database URL from DATABASE_URL, falling back to the bundled SQLite file
+    URL do banco a partir de DATABASE_URL, usando o arquivo SQLite incluído como padrão
+    
+    Args:
+        default_url (str): URL used when DATABASE_URL is not set / URL usada quando DATABASE_URL não está definida
+    
+    Returns:
+        str: SQLAlchemy database URL / URL do banco para o SQLAlchemy
+    """
+    url = os.getenv('DATABASE_URL') or default_url
+    
+    # Heroku style URLs are not accepted by SQLAlchemy 2 / URLs no estilo Heroku não são aceitas pelo SQLAlchemy 2
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def engine_options(url):
+    """
+    Connection pool settings for the given database URL
+    Configurações do pool de conexões para a URL informada
+    
+    Environment / Ambiente:
+        DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+        SQLITE_BUSY_TIMEOUT_MS
+    """
+    options = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+    }
+    
+    if url.startswith('sqlite'):
+        if ':memory:' in url or url.rstrip('/') == 'sqlite:':
+            # In-memory databases use a single shared connection / Bancos em memória usam uma única conexão compartilhada
+            return {}
+        
+        # Connections are shared by the worker threads / Conexões são compartilhadas pelas threads de trabalho
+        options['connect_args'] = {
+            'check_same_thread': False,
+            'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')) / 1000
+        }
+    else:
+        options['pool_recycle'] = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+        options['pool_pre_ping'] = True
+    
+    return options
+
+def apply_sqlite_pragmas(engine):
+    """
+    Tune every new SQLite connection (no-op for other databases)
+    Ajusta cada nova conexão SQLite (sem efeito para outros bancos)
+    
+    WAL lets readers run alongside the writer and, with synchronous=NORMAL,
+    commits no longer wait for a full fsync; busy_timeout makes concurrent
+    writers from several processes wait instead of failing with
+    "database is locked".
+    WAL permite leitores em paralelo ao escritor e, com synchronous=NORMAL, os
+    commits não esperam um fsync completo; busy_timeout faz escritores
+    concorrentes de vários processos esperarem em vez de falhar com
+    "database is locked".
+    
+    Environment / Ambiente:
+        SQLITE_AUTO_VACUUM (INCREMENTAL), SQLITE_JOURNAL_MODE (WAL), SQLITE_SYNCHRONOUS (NORMAL), SQLITE_BUSY_TIMEOUT_MS (5000),
+        SQLITE_CACHE_SIZE_KB (20000)
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+    
+    pragmas = (
+        # Lets archival return freed pages; applies to new database files / Permite que o arquivamento devolva páginas livres; vale para novos arquivos de banco
+        ('auto_vacuum', os.getenv('SQLITE_AUTO_VACUUM', 'INCREMENTAL')),
+        ('journal_mode', os.getenv('SQLITE_JOURNAL_MODE', 'WAL')),
+        ('synchronous', os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('busy_timeout', int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))),
+        ('cache_size', -int(os.getenv('SQLITE_CACHE_SIZE_KB', '20000'))),
+        ('temp_store', 'MEMORY'),
+    )
+    
+    @db.event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+def configure_database(app, default_url):
+    """
+    Configure and initialize the database for a Flask app
+    Configura e inicializa o banco de dados para uma aplicação Flask
+    
+    Args:
+        app (Flask): Application / Aplicação
+        default_url (str): URL used when DATABASE_URL is not set / URL usada quando DATABASE_URL não está definida
+    """
+    url = database_url(default_url)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    
+    with app.app_context():
+        apply_sqlite_pragmas(db.engine)
@@ -1,9 +1,108 @@
-from flask import Blueprint, jsonify, request
-from src.models.sms import SmsMessage, Contact, ContactGroup, SmsTemplate, db
-from src.services.sms_service import SmsService
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from functools import wraps
+from flask import Blueprint, Response, g, jsonify, make_response, request, stream_with_context
+from src.models.sms import Contact, ContactGroup, SmsTemplate, db
+from src.services.sms_service import EXPORT_FIELDS, SmsService
+from src.services.contact_import import ContactImporter
+from src.services.dispatcher import OutboxDispatcher
+from src.services.idempotency import IdempotencyStore
+from src.services.phone import normalize_phone
+from src.services.segments import parse_transliterate_mode
+from src.services.stats import StatisticsCache
+from src.services.status_updates import StatusUpdateBuffer
+from src.services.templates import extract_placeholders
 
 sms_bp = Blueprint('sms', __name__)
 sms_service = SmsService()
+dispatcher = OutboxDispatcher(sms_service)
+
+# Service counters kept current from committed writes / Contadores mantidos a partir das escritas confirmadas
+stats_cache = StatisticsCache()
+stats_cache.install(db.session)
+
+# Delivery receipts written in batches / Confirmações de entrega gravadas em lotes
+status_updates = StatusUpdateBuffer()
+if sms_service.provider.simulated:
+    sms_service.provider.on_status = status_updates.add
+
+# Moves messages past the retention window to archive files / Move mensagens após a janela de retenção para arquivos
+archiver = sms_service.archive
+
+def idempotent(scope):
+    """
+    Replay the stored response of requests repeated with the same Idempotency-Key header
+    Repete a resposta armazenada de requisições reenviadas com o mesmo cabeçalho Idempotency-Key
+    
+    Only 2xx responses (including 207 partial group sends) are stored; failed requests release the key so they can be retried.
+    Apenas respostas 2xx (incluindo envios parciais para grupo com 207) são armazenadas; requisições com falha liberam a chave para nova tentativa.
+    
+    Views pass g.idempotency_key to the service, which links the key to the send job in
+    the transaction that queues it; a retry whose response was never stored (crash, lease
+    expired) gets that job back instead of queueing the send again.
+    As views passam g.idempotency_key ao serviço, que liga a chave ao job de envio na
+    transação que o enfileira; uma nova tentativa cuja resposta nunca foi armazenada (queda,
+    prazo expirado) recebe esse job em vez de enfileirar o envio de novo.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get('Idempotency-Key')
+            if not key:
+                return view(*args, **kwargs)
+            
+            if len(key) > 255:
+                return jsonify({'success': False, 'error': 'Idempotency-Key must be at most 255 characters'}), 400
+            
+            request_hash = IdempotencyStore.request_hash({'args': kwargs, 'body': request.get_json(silent=True)})
+            state, record = sms_service.idempotency.begin(scope, key, request_hash)
+            
+            if state == 'replay':
+                response = make_response(record.response, record.status_code)
+                response.mimetype = 'application/json'
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            
+            if state == 'job':
+                # Queued before, response not stored / Enfileirado antes, resposta não armazenada
+                result = sms_service.get_job_status(record.job_id)
+                if not result['success']:
+                    return jsonify(result), 409
+                response = jsonify({
+                    'success': True,
+                    'job_id': record.job_id,
+                    'status': 'queued',
+                    'job': result['job']
+                })
+                response.status_code = 202
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            
+            if state == 'mismatch':
+                return jsonify({'success': False, 'error': 'Idempotency-Key was already used with a different request'}), 422
+            
+            if state == 'in_progress':
+                return jsonify({'success': False, 'error': 'A request with this Idempotency-Key is in progress'}), 409
+            
+            g.idempotency_key = (scope, key)
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                sms_service.idempotency.abandon(scope, key)
+                raise
+            
+            if 200 <= response.status_code < 300:
+                sms_service.idempotency.complete(scope, key, response.status_code, response.get_json())
+            else:
+                sms_service.idempotency.abandon(scope, key)
+            
+            return response
+        
+        return wrapper
+    return decorator
 
 @sms_bp.route('/sms/health', methods=['GET'])
 def health_check():
@@ -37,30 +136,32 @@ def service_status():
     Endpoint de status do serviço com informações detalhadas
     """
     try:
-        # Get service statistics / Obtém estatísticas do serviço
-        total_messages = SmsMessage.query.count()
-        total_contacts = Contact.query.filter_by(active=True).count()
-        total_groups = ContactGroup.query.filter_by(active=True).count()
-        total_templates = SmsTemplate.query.filter_by(active=True).count()
+        # Get cached service statistics, ?refresh=true forces an exact recount
+        # Obtém estatísticas em cache, ?refresh=true força uma recontagem exata
+        refresh = request.args.get('refresh', 'false').lower() == 'true'
+        statistics, counted_at = stats_cache.snapshot(force=refresh)
         
         return jsonify({
             'service': 'sms-service',
             'status': 'operational',
             'version': '1.0.0',
-            'statistics': {
-                'total_messages': total_messages,
-                'total_contacts': total_contacts,
-                'total_groups': total_groups,
-                'total_templates': total_templates
-            },
+            'statistics': statistics,
+            'statistics_counted_at': counted_at.isoformat() if counted_at else None,
             'endpoints': {
                 'send_sms': '/api/sms/send',
                 'bulk_sms': '/api/sms/send/bulk',
                 'group_sms': '/api/sms/send/group/<group_id>',
+                'jobs': '/api/sms/jobs/<job_id>',
+                'status_batch': '/api/sms/status/batch',
+                'status_webhook': '/api/sms/webhooks/status',
                 'history': '/api/sms/history',
+                'history_export': '/api/sms/history/export',
+                'archive': '/api/sms/archive',
                 'contacts': '/api/contacts',
+                'contacts_import': '/api/contacts/import',
                 'groups': '/api/groups',
-                'templates': '/api/templates'
+                'templates': '/api/templates',
+                'template_preview': '/api/templates/<template_id>/preview'
             }
         }), 200
         
@@ -72,6 +173,7 @@ def service_status():
         }), 500
 
 @sms_bp.route('/sms/send', methods=['POST'])
+@idempotent('send')
 def send_sms():
     """
     Send a single SMS message
@@ -84,23 +186,35 @@ def send_sms():
         if not data.get('to'):
             return jsonify({'success': False, 'error': 'Phone number (to) is required'}), 400
         
-        if not data.get('message'):
-            return jsonify({'success': False, 'error': 'Message content is required'}), 400
+        if not data.get('message') and data.get('template_id') is None:
+            return jsonify({'success': False, 'error': 'Message content or template_id is required'}), 400
         
-        # Send SMS / Envia SMS
-        result = sms_service.send_sms(
+        try:
+            transliterate = parse_transliterate_mode(data.get('transliterate'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Enqueue SMS for background dispatch / Enfileira SMS para despacho em segundo plano
+        result = sms_service.queue_sms(
             to_number=data['to'],
-            message=data['message'],
-            template_data=data.get('template_data')
+            message=data.get('message'),
+            template_data=data.get('template_data'),
+            template_id=data.get('template_id'),
+            transliterate=transliterate,
+            idempotency_key=g.get('idempotency_key')
         )
         
-        status_code = 200 if result['success'] else 400
-        return jsonify(result), status_code
+        if not result['success']:
+            return jsonify(result), 400
+        
+        dispatcher.notify()
+        return jsonify(result), 202
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @sms_bp.route('/sms/send/bulk', methods=['POST'])
+@idempotent('send_bulk')
 def send_bulk_sms():
     """
     Send SMS to multiple phone numbers
@@ -113,23 +227,45 @@ def send_bulk_sms():
         if not data.get('to') or not isinstance(data['to'], list):
             return jsonify({'success': False, 'error': 'Phone numbers list (to) is required'}), 400
         
-        if not data.get('message'):
-            return jsonify({'success': False, 'error': 'Message content is required'}), 400
+        if not data.get('message') and data.get('template_id') is None:
+            return jsonify({'success': False, 'error': 'Message content or template_id is required'}), 400
         
-        # Send bulk SMS / Envia SMS em massa
-        result = sms_service.send_bulk_sms(
+        dedupe_keys = data.get('dedupe_keys')
+        if dedupe_keys is not None and (not isinstance(dedupe_keys, list) or len(dedupe_keys) != len(data['to'])):
+            return jsonify({'success': False, 'error': 'dedupe_keys must be a list with one key per phone number'}), 400
+        
+        # Same rule as the Idempotency-Key header; null means no key for that recipient
+        # Mesma regra do cabeçalho Idempotency-Key; null significa sem chave para o destinatário
+        if dedupe_keys and any(key is not None and not (isinstance(key, str) and 0 < len(key) <= 255) for key in dedupe_keys):
+            return jsonify({'success': False, 'error': 'Each dedupe key must be null or a non-empty string of at most 255 characters'}), 400
+        
+        try:
+            transliterate = parse_transliterate_mode(data.get('transliterate'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Enqueue bulk SMS as one job / Enfileira SMS em massa como um único job
+        result = sms_service.queue_bulk_sms(
             phone_numbers=data['to'],
-            message=data['message'],
-            template_data=data.get('template_data')
+            message=data.get('message'),
+            template_data=data.get('template_data'),
+            template_id=data.get('template_id'),
+            dedupe_keys=dedupe_keys,
+            transliterate=transliterate,
+            idempotency_key=g.get('idempotency_key')
         )
         
-        status_code = 200 if result['success'] else 207  # 207 for partial success
-        return jsonify(result), status_code
+        if not result['success']:
+            return jsonify(result), 400
+        
+        dispatcher.notify()
+        return jsonify(result), 202
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @sms_bp.route('/sms/send/group/<int:group_id>', methods=['POST'])
+@idempotent('send_group')
 def send_group_sms(group_id):
     """
     Send SMS to all contacts in a group
@@ -139,17 +275,51 @@ def send_group_sms(group_id):
         data = request.json
         
         # Validate required fields / Valida campos obrigatórios
-        if not data.get('message'):
-            return jsonify({'success': False, 'error': 'Message content is required'}), 400
+        if not data.get('message') and data.get('template_id') is None:
+            return jsonify({'success': False, 'error': 'Message content or template_id is required'}), 400
+        
+        try:
+            transliterate = parse_transliterate_mode(data.get('transliterate'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        # Send group SMS / Envia SMS para grupo
-        result = sms_service.send_group_sms(
+        # Enqueue group SMS as one job; workers are woken after every chunk
+        # Enfileira SMS para grupo como um único job; workers são acordados a cada bloco
+        result = sms_service.queue_group_sms(
             group_id=group_id,
-            message=data['message'],
-            template_data=data.get('template_data')
+            message=data.get('message'),
+            template_data=data.get('template_data'),
+            template_id=data.get('template_id'),
+            transliterate=transliterate,
+            notify=dispatcher.notify,
+            idempotency_key=g.get('idempotency_key')
         )
         
-        status_code = 200 if result['success'] else 400
+        # Chunks committed before a failure stay queued, so the response is kept under the
+        # Idempotency-Key and a retry does not queue them again
+        # Blocos confirmados antes de uma falha continuam enfileirados, então a resposta fica
+        # registrada na Idempotency-Key e uma nova tentativa não os enfileira de novo
+        if result.get('status') == 'partial':
+            return jsonify(result), 207
+        
+        if not result['success']:
+            return jsonify(result), 400
+        
+        return jsonify(result), 202
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@sms_bp.route('/sms/jobs/<int:job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """
+    Get the progress of a queued send job
+    Obtém o progresso de um job de envio enfileirado
+    """
+    try:
+        result = sms_service.get_job_status(job_id)
+        
+        status_code = 200 if result['success'] else 404
         return jsonify(result), status_code
         
     except Exception as e:
@@ -163,15 +333,34 @@ def get_sms_history():
     """
     try:
         # Get query parameters / Obtém parâmetros de consulta
-        limit = int(request.args.get('limit', 100))
-        offset = int(request.args.get('offset', 0))
+        try:
+            limit = int(request.args.get('limit', 100))
+            offset = int(request.args.get('offset', 0))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'limit and offset must be integers'}), 400
+        
+        if not 1 <= limit <= sms_service.history_max_limit:
+            return jsonify({'success': False, 'error': f'limit must be between 1 and {sms_service.history_max_limit}'}), 400
+        if offset < 0:
+            return jsonify({'success': False, 'error': 'offset must not be negative'}), 400
+        
         contact_type = request.args.get('contact_type')
+        cursor = request.args.get('cursor')
+        total_mode = request.args.get('total')  # exact, estimate, none
+        group_id = request.args.get('group_id', type=int)
+        job_id = request.args.get('job_id', type=int)
+        include_archived = request.args.get('include_archived', 'false').lower() == 'true'
         
         # Get message history / Obtém histórico de mensagens
         result = sms_service.get_message_history(
             limit=limit,
             offset=offset,
-            contact_type=contact_type
+            contact_type=contact_type,
+            cursor=cursor,
+            total_mode=total_mode,
+            group_id=group_id,
+            job_id=job_id,
+            include_archived=include_archived
         )
         
         status_code = 200 if result['success'] else 400
@@ -180,6 +369,110 @@ def get_sms_history():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@sms_bp.route('/sms/history/export', methods=['GET'])
+def export_sms_history():
+    """
+    Stream message history as NDJSON or CSV
+    Transmite o histórico de mensagens como NDJSON ou CSV
+    
+    Query parameters / Parâmetros de consulta:
+        format: ndjson (default) or csv / ndjson (padrão) ou csv
+        start, end: ISO dates, end exclusive / Datas ISO, end exclusivo
+        status: Comma separated statuses / Status separados por vírgula
+        contact_type: client or employee / client ou employee
+        group_id, job_id: Originating group or send job / Grupo de origem ou job de envio
+        include_archived: true (default) or false / true (padrão) ou false
+    """
+    try:
+        data_format = request.args.get('format', 'ndjson')
+        if data_format not in ('ndjson', 'csv'):
+            return jsonify({'success': False, 'error': f'Unsupported format: {data_format}'}), 400
+        
+        try:
+            start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+            end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+        except ValueError:
+            return jsonify({'success': False, 'error': 'start and end must be ISO dates'}), 400
+        
+        statuses = [status.strip() for status in request.args.get('status', '').split(',') if status.strip()]
+        
+        rows = sms_service.export_messages(
+            start=start,
+            end=end,
+            statuses=statuses,
+            contact_type=request.args.get('contact_type'),
+            group_id=request.args.get('group_id', type=int),
+            job_id=request.args.get('job_id', type=int),
+            include_archived=request.args.get('include_archived', 'true').lower() == 'true'
+        )
+        
+        mimetype = 'application/x-ndjson' if data_format == 'ndjson' else 'text/csv'
+        return Response(
+            stream_with_context(_export_chunks(rows, data_format)),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename=sms-history.{data_format}'}
+        )
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _export_chunks(rows, data_format, rows_per_chunk=500):
+    """
+    Encode exported rows into response chunks / Codifica linhas exportadas em blocos da resposta
+    """
+    buffer = io.StringIO()
+    writer = None
+    if data_format == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+    
+    count = 0
+    for row in rows:
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row))
+            buffer.write('\n')
+        
+        count += 1
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@sms_bp.route('/sms/archive', methods=['GET'])
+def get_archive():
+    """
+    List the monthly message archive files and the retention settings
+    Lista os arquivos mensais de mensagens e as configurações de retenção
+    """
+    try:
+        return jsonify({
+            'success': True,
+            'retention_days': archiver.retention_days if archiver.enabled else None,
+            'months': [entry.to_dict() for entry in archiver.months()]
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@sms_bp.route('/sms/archive/run', methods=['POST'])
+def run_archive():
+    """
+    Archive messages past the retention window now
+    Arquiva agora as mensagens após a janela de retenção
+    """
+    try:
+        result = archiver.archive_once()
+        return jsonify({'success': True, **result}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @sms_bp.route('/sms/status/<int:message_id>', methods=['GET'])
 def get_message_status(message_id):
     """
@@ -195,6 +488,74 @@ def get_message_status(message_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@sms_bp.route('/sms/status/batch', methods=['POST'])
+def get_message_statuses():
+    """
+    Get the status of many messages, by ids or by send job
+    Obtém o status de muitas mensagens, por ids ou por job de envio
+    
+    Expected JSON / JSON esperado:
+    {
+        "message_ids": [1, 2, 3],
+        "job_id": 1 (optional alternative / alternativa opcional),
+        "limit": 1000 (optional, job_id page size / opcional, tamanho da página do job_id),
+        "after_id": 0 (optional, next_after_id of the previous page / opcional, next_after_id da página anterior)
+    }
+    """
+    try:
+        data = request.get_json() or {}
+        
+        message_ids = data.get('message_ids')
+        job_id = data.get('job_id')
+        if message_ids is not None and not isinstance(message_ids, list):
+            return jsonify({'success': False, 'error': 'message_ids must be a list'}), 400
+        
+        try:
+            message_ids = [int(message_id) for message_id in message_ids or []]
+            job_id = int(job_id) if job_id is not None else None
+            limit = int(data['limit']) if data.get('limit') is not None else None
+            after_id = int(data['after_id']) if data.get('after_id') is not None else None
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'message_ids, job_id, limit and after_id must be integers'}), 400
+        
+        if limit is not None and not 1 <= limit <= sms_service.status_batch_max_ids:
+            return jsonify({'success': False, 'error': f'limit must be between 1 and {sms_service.status_batch_max_ids}'}), 400
+        
+        result = sms_service.get_message_statuses(message_ids=message_ids, job_id=job_id, limit=limit, after_id=after_id)
+        
+        status_code = 200 if result['success'] else 400
+        return jsonify(result), status_code
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@sms_bp.route('/sms/webhooks/status', methods=['POST'])
+def status_webhook():
+    """
+    Receive delivery status callbacks from the provider
+    Recebe callbacks de status de entrega do provedor
+    """
+    try:
+        params = request.form.to_dict()
+        
+        # Validate the provider signature / Valida a assinatura do provedor
+        if os.getenv('SMS_WEBHOOK_VALIDATE', 'true').lower() == 'true':
+            url = os.getenv('SMS_STATUS_CALLBACK_URL') or request.url
+            signature = request.headers.get('X-Twilio-Signature')
+            if not sms_service.provider.validate_callback(url, params, signature):
+                return jsonify({'success': False, 'error': 'Invalid signature'}), 403
+        
+        if not params.get('MessageSid') or not params.get('MessageStatus'):
+            return jsonify({'success': False, 'error': 'MessageSid and MessageStatus are required'}), 400
+        
+        # Buffered and written in batches / Armazenado em buffer e gravado em lotes
+        status_updates.add(params['MessageSid'], params['MessageStatus'], params.get('ErrorCode'))
+        
+        return '', 204
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # Contact management endpoints / Endpoints de gerenciamento de contatos
 
 @sms_bp.route('/contacts', methods=['GET'])
@@ -207,7 +568,8 @@ def get_contacts():
         contact_type = request.args.get('type')  # client, employee
         active_only = request.args.get('active', 'true').lower() == 'true'
         
-        query = Contact.query
+        # Load groups in the same query / Carrega os grupos na mesma consulta
+        query = Contact.query.options(db.joinedload(Contact.groups))
         
         if contact_type:
             query = query.filter(Contact.contact_type == contact_type)
@@ -217,9 +579,12 @@ def get_contacts():
         
         contacts = query.all()
         
+        # Count members of every listed group at once / Conta membros de todos os grupos listados de uma vez
+        member_counts = ContactGroup.member_counts([group.id for contact in contacts for group in contact.groups])
+        
         return jsonify({
             'success': True,
-            'contacts': [contact.to_dict() for contact in contacts]
+            'contacts': [contact.to_dict(member_counts=member_counts) for contact in contacts]
         })
         
     except Exception as e:
@@ -240,9 +605,13 @@ def create_contact():
             if not data.get(field):
                 return jsonify({'success': False, 'error': f'{field} is required'}), 400
         
+        phone_e164 = normalize_phone(data['phone_number'])
+        if not phone_e164:
+            return jsonify({'success': False, 'error': 'Invalid phone number'}), 400
+        
         # Check if contact with this phone number already exists
         # Verifica se contato com este número já existe
-        existing_contact = Contact.query.filter_by(phone_number=data['phone_number']).first()
+        existing_contact = Contact.query.filter_by(phone_e164=phone_e164).first()
         if existing_contact:
             return jsonify({'success': False, 'error': 'Contact with this phone number already exists'}), 400
         
@@ -267,6 +636,35 @@ def create_contact():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@sms_bp.route('/contacts/import', methods=['POST'])
+def import_contacts():
+    """
+    Import contacts in bulk from a CSV or NDJSON request body, upserting by phone number
+    Importa contatos em massa de um corpo CSV ou NDJSON, com upsert pelo número de telefone
+    
+    Query parameters / Parâmetros de consulta:
+        format: csv or ndjson (defaults from Content-Type) / csv ou ndjson (padrão pelo Content-Type)
+        group_id: Group to add every contact to, may repeat / Grupo para adicionar todos os contatos, pode repetir
+    """
+    try:
+        data_format = request.args.get('format')
+        if not data_format:
+            data_format = 'csv' if request.mimetype in ('text/csv', 'application/csv') else 'ndjson'
+        
+        try:
+            group_ids = [int(group_id) for group_id in request.args.getlist('group_id')]
+        except ValueError:
+            return jsonify({'success': False, 'error': 'group_id must be an integer'}), 400
+        
+        # The body is parsed while it streams in / O corpo é lido enquanto chega
+        result = ContactImporter().import_stream(request.stream, data_format, group_ids)
+        
+        status_code = 200 if result['success'] else 400
+        return jsonify(result), status_code
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @sms_bp.route('/contacts/<int:contact_id>', methods=['PUT'])
 def update_contact(contact_id):
     """
@@ -277,6 +675,16 @@ def update_contact(contact_id):
         contact = Contact.query.get_or_404(contact_id)
         data = request.json
         
+        if 'phone_number' in data:
+            phone_e164 = normalize_phone(data['phone_number'])
+            if not phone_e164:
+                return jsonify({'success': False, 'error': 'Invalid phone number'}), 400
+            
+            # Same check as create_contact, ignoring this contact / Mesma verificação de create_contact, ignorando este contato
+            existing_contact = Contact.query.filter_by(phone_e164=phone_e164).filter(Contact.id != contact_id).first()
+            if existing_contact:
+                return jsonify({'success': False, 'error': 'Contact with this phone number already exists'}), 400
+        
         # Update fields / Atualiza campos
         contact.name = data.get('name', contact.name)
         contact.phone_number = data.get('phone_number', contact.phone_number)
@@ -333,10 +741,11 @@ def get_groups():
             query = query.filter(ContactGroup.active == True)
         
         groups = query.all()
+        member_counts = ContactGroup.member_counts([group.id for group in groups])
         
         return jsonify({
             'success': True,
-            'groups': [group.to_dict() for group in groups]
+            'groups': [group.to_dict(contact_count=member_counts.get(group.id, 0)) for group in groups]
         })
         
     except Exception as e:
@@ -369,7 +778,7 @@ def create_group():
         
         return jsonify({
             'success': True,
-            'group': group.to_dict()
+            'group': group.to_dict(contact_count=0)
         }), 201
         
     except Exception as e:
@@ -478,12 +887,19 @@ def create_template():
             if not data.get(field):
                 return jsonify({'success': False, 'error': f'{field} is required'}), 400
         
+        # Parse once and store the placeholders / Analisa uma vez e armazena os placeholders
+        try:
+            placeholders = extract_placeholders(data['template'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': f'Invalid template: {e}'}), 400
+        
         # Create new template / Cria novo template
         template = SmsTemplate(
             name=data['name'],
             template=data['template'],
             description=data.get('description'),
-            template_type=data.get('template_type', 'general')
+            template_type=data.get('template_type', 'general'),
+            placeholders=json.dumps(placeholders)
         )
         
         db.session.add(template)
@@ -497,3 +913,69 @@ def create_template():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@sms_bp.route('/templates/<int:template_id>', methods=['PUT'])
+def update_template(template_id):
+    """
+    Update an existing SMS template
+    Atualiza um template SMS existente
+    """
+    try:
+        template = SmsTemplate.query.get_or_404(template_id)
+        data = request.json
+        
+        # A new text gets new placeholders and a new version
+        # Um novo texto recebe novos placeholders e uma nova versão
+        if data.get('template') and data['template'] != template.template:
+            try:
+                placeholders = extract_placeholders(data['template'])
+            except ValueError as e:
+                return jsonify({'success': False, 'error': f'Invalid template: {e}'}), 400
+            
+            template.template = data['template']
+            template.placeholders = json.dumps(placeholders)
+            template.version = (template.version or 1) + 1
+        
+        # Update fields / Atualiza campos
+        template.name = data.get('name', template.name)
+        template.description = data.get('description', template.description)
+        template.template_type = data.get('template_type', template.template_type)
+        template.active = data.get('active', template.active)
+        
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'template': template.to_dict()
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@sms_bp.route('/templates/<int:template_id>/preview', methods=['POST'])
+def preview_template(template_id):
+    """
+    Preview a template's rendered text, encoding and segment count
+    Visualiza o texto renderizado, a codificação e o número de segmentos de um template
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        try:
+            transliterate = parse_transliterate_mode(data.get('transliterate'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        result = sms_service.preview_template(
+            template_id,
+            template_data=data.get('template_data'),
+            transliterate=transliterate
+        )
+        
+        if not result['success']:
+            return jsonify(result), 404
+        return jsonify(result), 200
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
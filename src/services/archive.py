@@ -0,0 +1,465 @@
+import gzip
+import heapq
+import io
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from itertools import groupby
+from src.models.sms import MessageArchive, SmsMessage, db
+
+try:
+    import fcntl
+except ImportError:
+    # File locks are POSIX only / Travas de arquivo existem apenas em POSIX
+    fcntl = None
+
+# Statuses still owned by the outbox are never archived / Status ainda controlados pela fila de saída nunca são arquivados
+IN_FLIGHT_STATUSES = ('pending', 'sending')
+
+_DATETIME_COLUMNS = frozenset(
+    column.name for column in SmsMessage.__table__.columns if isinstance(column.type, db.DateTime)
+)
+
+class _CommittedReader(io.RawIOBase):
+    """
+    Read a file only up to its committed length / Lê um arquivo apenas até o tamanho confirmado
+    """
+    
+    def __init__(self, raw, limit):
+        self._raw = raw
+        self._remaining = limit
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        if self._remaining <= 0:
+            return 0
+        
+        count = self._raw.readinto(memoryview(buffer)[:self._remaining]) or 0
+        self._remaining -= count
+        return count
+
+class MessageArchiver:
+    """
+    Moves messages older than the retention window into monthly gzip NDJSON files
+    Move mensagens mais antigas que a janela de retenção para arquivos mensais gzip NDJSON
+    
+    Each run appends one gzip member per month touched and deletes the archived
+    rows in the same transaction that records the new committed file length in
+    MessageArchive, so a crash can leave only an uncommitted tail that is ignored
+    by readers and overwritten by the next run. Rows are archived in (created_at, id)
+    order and a month file only holds messages created in that month.
+    Cada execução acrescenta um membro gzip por mês afetado e exclui as linhas
+    arquivadas na mesma transação que registra o novo tamanho confirmado do arquivo em
+    MessageArchive, então uma falha pode deixar apenas um final não confirmado, que é
+    ignorado pelos leitores e sobrescrito pela próxima execução. As linhas são
+    arquivadas na ordem (created_at, id) e um arquivo mensal guarda apenas mensagens
+    criadas naquele mês.
+    
+    Archival is opt-in (SMS_RETENTION_DAYS > 0). Only history and export read the
+    archive; status, batch status and job lookups see sms_message only, so archived
+    messages are no longer found there.
+    O arquivamento é opcional (SMS_RETENTION_DAYS > 0). Apenas o histórico e a
+    exportação leem o arquivo; consultas de status, status em lote e jobs veem apenas
+    sms_message, então mensagens arquivadas deixam de ser encontradas nelas.
+    """
+    
+    def __init__(self, directory=None):
+        """
+        Args:
+            directory (str): Where archive files are written / Onde os arquivos de arquivo são gravados
+        """
+        default_directory = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'archive')
+        self.directory = directory or os.getenv('SMS_ARCHIVE_DIR', default_directory)
+        
+        # Days messages stay in sms_message; 0 (default) disables archival / Dias que as mensagens ficam em sms_message; 0 (padrão) desativa o arquivamento
+        self.retention_days = float(os.getenv('SMS_RETENTION_DAYS', '0'))
+        self.batch_size = int(os.getenv('SMS_ARCHIVE_BATCH_SIZE', '5000'))
+        self.interval = float(os.getenv('SMS_ARCHIVE_INTERVAL_SECONDS', '3600'))
+        
+        # incremental, full or none / incremental, full ou none
+        self.vacuum_mode = os.getenv('SMS_ARCHIVE_VACUUM', 'incremental').lower()
+        
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+    
+    @property
+    def enabled(self):
+        return self.retention_days > 0
+    
+    def start(self, app):
+        """
+        Start the background archival loop for the given Flask app
+        Inicia o loop de arquivamento em segundo plano para a aplicação Flask informada
+        """
+        if self._thread or not self.enabled:
+            return
+        
+        self._thread = threading.Thread(target=self._run, args=(app,), name='sms-archive', daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=None):
+        """
+        Stop the background archival loop / Para o loop de arquivamento em segundo plano
+        """
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+        self._stopping.clear()
+    
+    def archive_once(self, now=None):
+        """
+        Archive every message older than the retention window (needs an app context)
+        Arquiva todas as mensagens mais antigas que a janela de retenção (requer contexto da aplicação)
+        
+        Args:
+            now (datetime): Reference time, defaults to utcnow / Hora de referência, padrão utcnow
+        
+        Returns:
+            dict: Archived row count, months touched and cutoff / Linhas arquivadas, meses afetados e data de corte
+        """
+        if not self.enabled:
+            return {'archived': 0, 'months': [], 'cutoff': None}
+        
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.retention_days)
+        table = SmsMessage.__table__
+        statement = db.select(table) \
+            .where(table.c.created_at < cutoff) \
+            .where(table.c.status.notin_(IN_FLIGHT_STATUSES)) \
+            .where(table.c.id < db.select(db.func.max(table.c.id)).scalar_subquery()) \
+            .order_by(table.c.created_at, table.c.id) \
+            .limit(self.batch_size)
+        
+        # The newest row always stays so SQLite never hands out an archived id again
+        # A linha mais recente sempre fica para que o SQLite nunca reutilize um id arquivado
+        archived = 0
+        months = set()
+        os.makedirs(self.directory, exist_ok=True)
+        
+        with self._lock, self._process_lock() as acquired:
+            if not acquired:
+                # Another process is archiving / Outro processo está arquivando
+                return {'archived': 0, 'months': [], 'cutoff': cutoff.isoformat(), 'skipped': True}
+            
+            while True:
+                rows = db.session.execute(statement).mappings().all()
+                if not rows:
+                    break
+                
+                months.update(self._archive_batch(rows))
+                archived += len(rows)
+                if len(rows) < self.batch_size:
+                    break
+        
+        if archived:
+            self.vacuum()
+        
+        return {'archived': archived, 'months': sorted(months), 'cutoff': cutoff.isoformat()}
+    
+    def vacuum(self):
+        """
+        Return space freed by archived rows / Recupera o espaço liberado pelas linhas arquivadas
+        
+        SQLite: PRAGMA incremental_vacuum (effective when auto_vacuum=INCREMENTAL) or VACUUM.
+        PostgreSQL: VACUUM (ANALYZE) or VACUUM FULL on sms_message.
+        """
+        if self.vacuum_mode not in ('incremental', 'full'):
+            return
+        
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            statement = 'VACUUM' if self.vacuum_mode == 'full' else 'PRAGMA incremental_vacuum'
+        elif dialect == 'postgresql':
+            statement = 'VACUUM FULL sms_message' if self.vacuum_mode == 'full' else 'VACUUM (ANALYZE) sms_message'
+        else:
+            return
+        
+        try:
+            with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                result = connection.exec_driver_sql(statement)
+                if result.returns_rows:
+                    # incremental_vacuum frees pages as its rows are read / incremental_vacuum libera páginas conforme as linhas são lidas
+                    result.fetchall()
+        except Exception as e:
+            print(f"Warning: sms_message vacuum failed: {e}")
+    
+    def months(self):
+        """
+        Archive files, oldest month first / Arquivos de arquivo, do mês mais antigo ao mais recente
+        
+        Returns:
+            list: MessageArchive rows / Linhas MessageArchive
+        """
+        return MessageArchive.query.order_by(MessageArchive.month).all()
+    
+    def newest_created_at(self):
+        """
+        Creation time of the newest archived message, or None
+        Data de criação da mensagem arquivada mais recente, ou None
+        """
+        return db.session.query(db.func.max(MessageArchive.last_created_at)).scalar()
+    
+    def iter_messages(self, start=None, end=None, statuses=None, contact_type=None, group_id=None, job_id=None):
+        """
+        Iterate over archived messages, oldest first / Percorre mensagens arquivadas, da mais antiga à mais recente
+        
+        Only files of months overlapping [start, end) are read.
+        Apenas arquivos de meses que se sobrepõem a [start, end) são lidos.
+        
+        Returns:
+            generator: One dict of sms_message columns per message / Um dict de colunas de sms_message por mensagem
+        """
+        filters = (start, end, statuses, contact_type, group_id, job_id)
+        for month, path, size in self._entries(start, end):
+            for record in self._read_month(path, size):
+                if self._matches(record, *filters):
+                    yield record
+    
+    def history_page(self, before=None, limit=100, contact_type=None, group_id=None, job_id=None):
+        """
+        Newest first page of archived messages / Página de mensagens arquivadas, das mais recentes primeiro
+        
+        Reads month files from the newest one until the page is full; each file
+        is scanned once keeping only the best limit + 1 rows.
+        Lê os arquivos mensais a partir do mais recente até completar a página; cada
+        arquivo é lido uma vez mantendo apenas as melhores limit + 1 linhas.
+        
+        Args:
+            before (tuple): Only messages before this (created_at, id) / Apenas mensagens antes deste (created_at, id)
+            limit (int): Page size / Tamanho da página
+        
+        Returns:
+            tuple: (records, has_more) / (registros, has_more)
+        """
+        wanted = limit + 1
+        end = before[0] + timedelta(microseconds=1) if before else None
+        position = lambda record: (record['created_at'], record['id'])
+        
+        found = []
+        for month, path, size in reversed(self._entries(end=end)):
+            candidates = (
+                record for record in self._read_month(path, size)
+                if self._matches(record, None, None, None, contact_type, group_id, job_id)
+                and (before is None or position(record) < before)
+            )
+            found.extend(heapq.nlargest(wanted - len(found), candidates, key=position))
+            if len(found) >= wanted:
+                break
+        
+        return found[:limit], len(found) > limit
+    
+    def count(self, contact_type=None, group_id=None, job_id=None):
+        """
+        Number of archived messages / Número de mensagens arquivadas
+        
+        Unfiltered counts come from MessageArchive; filtered counts decompress and
+        scan every month file, so they cost a full archive read.
+        Contagens sem filtro vêm de MessageArchive; contagens filtradas descompactam e
+        leem todos os arquivos mensais, então custam uma leitura completa do arquivo.
+        """
+        if contact_type is None and group_id is None and job_id is None:
+            return db.session.query(db.func.coalesce(db.func.sum(MessageArchive.row_count), 0)).scalar()
+        return sum(1 for _ in self.iter_messages(contact_type=contact_type, group_id=group_id, job_id=job_id))
+    
+    def _archive_batch(self, rows):
+        """
+        Append one batch to its month files and delete it from sms_message
+        Acrescenta um lote aos arquivos mensais e o exclui de sms_message
+        
+        A batch older than rows already in its month (a message that left the outbox
+        late) is merged into a rewritten file instead, keeping every file sorted.
+        Um lote mais antigo que linhas já arquivadas no mês (uma mensagem que saiu
+        tarde da fila) é mesclado em um arquivo reescrito, mantendo todo arquivo ordenado.
+        
+        Returns:
+            list: Months touched / Meses afetados
+        """
+        written = []  # (month, path, committed size or None for new files) / (mês, caminho, tamanho confirmado ou None para arquivos novos)
+        replaced = []
+        try:
+            for month, group in groupby(rows, key=lambda row: row['created_at'].strftime('%Y-%m')):
+                group = list(group)
+                entry = MessageArchive.query.filter_by(month=month).first()
+                if entry is None:
+                    entry = MessageArchive(month=month, path=f'messages-{month}.ndjson.gz', row_count=0, size_bytes=0)
+                    db.session.add(entry)
+                
+                ids = [row['id'] for row in group]
+                created = [row['created_at'] for row in group]
+                
+                if entry.row_count and created[0] <= entry.last_created_at:
+                    old_path = entry.path
+                    entry.path = f'messages-{month}-{uuid.uuid4().hex[:8]}.ndjson.gz'
+                    written.append((month, os.path.join(self.directory, entry.path), None))
+                    replaced.append(os.path.join(self.directory, old_path))
+                    
+                    position = lambda record: (record['created_at'], record['id'])
+                    merged = heapq.merge(self._read_month(old_path, entry.size_bytes), group, key=position)
+                    entry.size_bytes = self._append(written[-1][1], 0, merged)
+                else:
+                    written.append((month, os.path.join(self.directory, entry.path), entry.size_bytes))
+                    entry.size_bytes = self._append(written[-1][1], entry.size_bytes, group)
+                
+                if entry.row_count:
+                    ids += [entry.min_id, entry.max_id]
+                    created += [entry.first_created_at, entry.last_created_at]
+                entry.row_count += len(group)
+                entry.min_id, entry.max_id = min(ids), max(ids)
+                entry.first_created_at, entry.last_created_at = min(created), max(created)
+            
+            db.session.execute(
+                db.delete(SmsMessage)
+                .where(SmsMessage.id.in_([row['id'] for row in rows]))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        
+        except Exception:
+            db.session.rollback()
+            # Drop the uncommitted writes / Descarta as gravações não confirmadas
+            for _, path, size in written:
+                if size is None:
+                    self._remove(path)
+                else:
+                    self._truncate(path, size)
+            raise
+        
+        for path in replaced:
+            self._remove(path)
+        
+        return [month for month, _, _ in written]
+    
+    def _append(self, path, committed, rows):
+        """
+        Append rows as one gzip member after the committed length
+        Acrescenta linhas como um membro gzip após o tamanho confirmado
+        
+        Returns:
+            int: New file length / Novo tamanho do arquivo
+        """
+        if committed and (not os.path.exists(path) or os.path.getsize(path) < committed):
+            raise RuntimeError(f'Archive file {path} is shorter than its recorded length')
+        
+        with open(path, 'ab') as raw:
+            raw.truncate(committed)
+            with gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0) as archive_file:
+                for row in rows:
+                    archive_file.write(json.dumps(self._encode(row), separators=(',', ':')).encode('utf-8'))
+                    archive_file.write(b'\n')
+            
+            raw.flush()
+            os.fsync(raw.fileno())
+            return os.fstat(raw.fileno()).st_size
+    
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Warning: could not remove archive file {path}: {e}")
+    
+    def _truncate(self, path, size):
+        try:
+            with open(path, 'r+b') as raw:
+                raw.truncate(size)
+        except OSError as e:
+            print(f"Warning: could not truncate archive file {path}: {e}")
+    
+    def _entries(self, start=None, end=None):
+        """
+        (month, path, committed size) of the archive files overlapping [start, end), oldest first
+        (mês, caminho, tamanho confirmado) dos arquivos que se sobrepõem a [start, end), do mais antigo primeiro
+        """
+        query = db.session.query(MessageArchive.month, MessageArchive.path, MessageArchive.size_bytes) \
+            .order_by(MessageArchive.month)
+        if start:
+            query = query.filter(MessageArchive.month >= start.strftime('%Y-%m'))
+        if end:
+            query = query.filter(MessageArchive.month <= (end - timedelta(microseconds=1)).strftime('%Y-%m'))
+        return query.all()
+    
+    def _read_month(self, path, size):
+        """
+        Yield the committed records of one archive file / Gera os registros confirmados de um arquivo
+        """
+        try:
+            raw = open(os.path.join(self.directory, path), 'rb')
+        except FileNotFoundError:
+            print(f"Warning: archive file {path} is missing")
+            return
+        
+        with raw, gzip.GzipFile(fileobj=io.BufferedReader(_CommittedReader(raw, size))) as archive_file:
+            for line in archive_file:
+                yield self._decode(json.loads(line))
+    
+    def _matches(self, record, start, end, statuses, contact_type, group_id, job_id):
+        created_at = record['created_at']
+        if start and created_at < start:
+            return False
+        if end and created_at >= end:
+            return False
+        if statuses and record['status'] not in statuses:
+            return False
+        if contact_type and record.get('contact_type') != contact_type:
+            return False
+        if group_id is not None and record.get('group_id') != group_id:
+            return False
+        if job_id is not None and record.get('job_id') != job_id:
+            return False
+        return True
+    
+    def _encode(self, row):
+        return {name: value.isoformat() if isinstance(value, datetime) else value for name, value in row.items()}
+    
+    def _decode(self, record):
+        # Columns dropped since the row was archived are ignored / Colunas removidas desde o arquivamento são ignoradas
+        record = {name: value for name, value in record.items() if name in SmsMessage.__table__.c}
+        for name in _DATETIME_COLUMNS:
+            if record.get(name):
+                record[name] = datetime.fromisoformat(record[name])
+        return record
+    
+    @contextmanager
+    def _process_lock(self):
+        """
+        Keep other processes sharing the archive directory out while archiving
+        Impede outros processos que compartilham o diretório de arquivar ao mesmo tempo
+        """
+        if fcntl is None:
+            yield True
+            return
+        
+        with open(os.path.join(self.directory, '.lock'), 'a') as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+    
+    def _run(self, app):
+        """
+        Archival loop / Loop de arquivamento
+        """
+        with app.app_context():
+            while True:
+                try:
+                    result = self.archive_once()
+                    if result['archived']:
+                        print(f"Archived {result['archived']} messages older than {result['cutoff']}")
+                except Exception as e:
+                    print(f"Warning: message archival failed: {e}")
+                finally:
+                    db.session.remove()
+                
+                if self._stopping.wait(self.interval):
+                    return
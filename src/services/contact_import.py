@@ -0,0 +1,246 @@
+import csv
+import io
+import json
+import os
+from src.models.sms import Contact, ContactGroup, contact_group_members, db
+from src.services.phone import normalize_phone
+
+class ContactImporter:
+    """
+    Bulk contact import from streamed CSV or NDJSON, upserting by E.164 phone number
+    Importação de contatos em massa a partir de CSV ou NDJSON em streaming, com upsert pelo número E.164
+    
+    Rows are parsed one at a time and written in batches: one lookup of existing
+    phone numbers, one multi-row INSERT, grouped UPDATEs and one membership INSERT
+    per batch, each batch in its own transaction.
+    Linhas são lidas uma a uma e gravadas em lotes: uma busca dos números existentes,
+    um INSERT de múltiplas linhas, UPDATEs agrupados e um INSERT de participações por
+    lote, cada lote em sua própria transação.
+    """
+    
+    FIELDS = ('name', 'phone_number', 'contact_type', 'email', 'company', 'position', 'active')
+    REQUIRED_FIELDS = ('name', 'phone_number', 'contact_type')
+    FORMATS = ('csv', 'ndjson')
+    
+    def __init__(self, batch_size=None, max_errors=None):
+        """
+        Args:
+            batch_size (int): Rows written per transaction / Linhas gravadas por transação
+            max_errors (int): Row errors kept in the report / Erros de linha mantidos no relatório
+        """
+        self.batch_size = batch_size or int(os.getenv('SMS_IMPORT_BATCH_SIZE', '1000'))
+        self.max_errors = max_errors or int(os.getenv('SMS_IMPORT_MAX_ERRORS', '1000'))
+    
+    def import_stream(self, stream, data_format, group_ids=None):
+        """
+        Import contacts from a binary stream / Importa contatos de um stream binário
+        
+        Args:
+            stream: Binary file-like object (e.g. request.stream) / Objeto binário tipo arquivo (ex. request.stream)
+            data_format (str): csv or ndjson / csv ou ndjson
+            group_ids (list): Groups every imported contact joins / Grupos aos quais todo contato importado é adicionado
+        
+        Returns:
+            dict: Import report with per-row errors / Relatório da importação com erros por linha
+        """
+        if data_format not in self.FORMATS:
+            return {
+                'success': False,
+                'error': f'Unsupported format: {data_format}'
+            }
+        
+        group_ids = list(dict.fromkeys(group_ids or []))
+        if group_ids:
+            found = {group_id for (group_id,) in db.session.query(ContactGroup.id).filter(ContactGroup.id.in_(group_ids))}
+            missing = [group_id for group_id in group_ids if group_id not in found]
+            if missing:
+                return {
+                    'success': False,
+                    'error': f"Groups not found: {', '.join(str(group_id) for group_id in missing)}"
+                }
+        
+        report = {
+            'success': True,
+            'processed': 0,
+            'created': 0,
+            'updated': 0,
+            'failed': 0,
+            'errors': []
+        }
+        
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        rows = self._read_csv(text) if data_format == 'csv' else self._read_ndjson(text)
+        
+        batch = []
+        for line_number, row, error in rows:
+            report['processed'] += 1
+            if error is None:
+                row, error = self._clean(row)
+            if error is not None:
+                self._add_error(report, line_number, error)
+                continue
+            
+            batch.append((line_number, row))
+            if len(batch) >= self.batch_size:
+                self._write_batch(batch, group_ids, report)
+                batch = []
+        
+        if batch:
+            self._write_batch(batch, group_ids, report)
+        
+        report['errors_truncated'] = report['failed'] > len(report['errors'])
+        return report
+    
+    def _read_csv(self, text):
+        """
+        Yield (line number, row, error) from CSV text / Gera (linha, registro, erro) a partir de texto CSV
+        """
+        reader = csv.DictReader(text)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                yield reader.line_num, None, f'Invalid CSV: {e}'
+                continue
+            
+            if None in row:
+                yield reader.line_num, None, 'Row has more values than the header'
+                continue
+            yield reader.line_num, row, None
+    
+    def _read_ndjson(self, text):
+        """
+        Yield (line number, row, error) from NDJSON text / Gera (linha, registro, erro) a partir de texto NDJSON
+        """
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f'Invalid JSON: {e}'
+                continue
+            
+            if not isinstance(row, dict):
+                yield line_number, None, 'Each line must be a JSON object'
+                continue
+            yield line_number, row, None
+    
+    def _clean(self, row):
+        """
+        Validate one row and keep the known fields / Valida uma linha e mantém os campos conhecidos
+        
+        Returns:
+            tuple: (clean row, error or None) / (linha limpa, erro ou None)
+        """
+        clean = {}
+        for field in self.FIELDS:
+            if field not in row or row[field] is None:
+                continue
+            
+            value = row[field]
+            if field == 'active':
+                if isinstance(value, str):
+                    value = value.strip().lower()
+                    if value == '':
+                        continue
+                    if value not in ('true', 'false', '1', '0', 'yes', 'no'):
+                        return None, f'Invalid value for active: {row[field]}'
+                    value = value in ('true', '1', 'yes')
+                clean[field] = bool(value)
+                continue
+            
+            value = str(value).strip()
+            if value == '':
+                continue
+            
+            max_length = Contact.__table__.c[field].type.length
+            if max_length and len(value) > max_length:
+                return None, f'{field} is longer than {max_length} characters'
+            clean[field] = value
+        
+        missing = [field for field in self.REQUIRED_FIELDS if field not in clean]
+        if missing:
+            return None, f"Missing required fields: {', '.join(missing)}"
+        
+        # Bulk statements skip the model validator / Comandos em lote não passam pelo validador do modelo
+        clean['phone_e164'] = normalize_phone(clean['phone_number'])
+        if clean['phone_e164'] is None:
+            return None, f"Invalid phone number: {clean['phone_number']}"
+        
+        return clean, None
+    
+    def _write_batch(self, batch, group_ids, report):
+        """
+        Upsert one batch of clean rows in a single transaction
+        Faz o upsert de um lote de linhas limpas em uma única transação
+        """
+        # Later rows for the same number win / Linhas posteriores do mesmo número prevalecem
+        by_phone = {}
+        for line_number, row in batch:
+            by_phone[row['phone_e164']] = (line_number, row)
+        
+        try:
+            existing = dict(
+                db.session.query(Contact.phone_e164, Contact.id)
+                .filter(Contact.phone_e164.in_(list(by_phone)))
+                .all()
+            )
+            
+            new_rows = [row for phone, (_, row) in by_phone.items() if phone not in existing]
+            contact_ids = list(existing.values())
+            
+            if new_rows:
+                statement = db.insert(Contact).returning(Contact.id, sort_by_parameter_order=True)
+                contact_ids.extend(db.session.execute(statement, new_rows).scalars().all())
+            
+            # Executemany needs the same columns in every row / Executemany requer as mesmas colunas em todas as linhas
+            updates = {}
+            for phone, (_, row) in by_phone.items():
+                if phone in existing:
+                    updates.setdefault(frozenset(row), []).append(dict(row, id=existing[phone]))
+            for rows in updates.values():
+                db.session.execute(db.update(Contact), rows)
+            
+            if group_ids:
+                self._add_memberships(contact_ids, group_ids)
+            
+            db.session.commit()
+        
+        except Exception as e:
+            db.session.rollback()
+            for line_number, _ in batch:
+                self._add_error(report, line_number, f'Batch failed: {e}')
+            return
+        
+        report['created'] += len(new_rows)
+        report['updated'] += len(by_phone) - len(new_rows)
+    
+    def _add_memberships(self, contact_ids, group_ids):
+        """
+        Add contacts to groups, skipping existing memberships (caller commits)
+        Adiciona contatos aos grupos, ignorando participações existentes (quem chama faz o commit)
+        """
+        current = set(
+            db.session.query(contact_group_members.c.contact_id, contact_group_members.c.group_id)
+            .filter(contact_group_members.c.contact_id.in_(contact_ids))
+            .filter(contact_group_members.c.group_id.in_(group_ids))
+            .all()
+        )
+        
+        rows = [
+            {'contact_id': contact_id, 'group_id': group_id}
+            for contact_id in contact_ids
+            for group_id in group_ids
+            if (contact_id, group_id) not in current
+        ]
+        if rows:
+            db.session.execute(contact_group_members.insert(), rows)
+    
+    def _add_error(self, report, line_number, error):
+        report['failed'] += 1
+        if len(report['errors']) < self.max_errors:
+            report['errors'].append({'line': line_number, 'error': error})
@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from src.models.sms import SmsMessage, db
+
+class OutboxDispatcher:
+    """
+    Background workers that drain pending SmsMessage rows (the outbox)
+    Workers em segundo plano que esvaziam as linhas SmsMessage pendentes (a fila de saída)
+    
+    Rows are claimed with a unique token so several workers (or several processes
+    sharing the database) never send the same message twice. Claims that are not
+    finished within the lease are returned to the outbox, so a restart resumes
+    where the previous process stopped.
+    As linhas são reivindicadas com um token único para que vários workers (ou vários
+    processos compartilhando o banco) nunca enviem a mesma mensagem duas vezes.
+    Reivindicações não concluídas dentro do prazo voltam para a fila, então um
+    reinício continua de onde o processo anterior parou.
+    """
+    
+    def __init__(self, sms_service):
+        self.sms_service = sms_service
+        
+        # Dispatch configuration / Configuração de despacho
+        self.worker_count = int(os.getenv('SMS_DISPATCH_WORKERS', '4'))
+        self.batch_size = int(os.getenv('SMS_DISPATCH_BATCH_SIZE', '50'))
+        self.poll_interval = float(os.getenv('SMS_DISPATCH_POLL_INTERVAL', '1.0'))
+        self.lease_seconds = int(os.getenv('SMS_DISPATCH_LEASE_SECONDS', '300'))
+        
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+    
+    def start(self, app):
+        """
+        Start the worker threads for the given Flask app
+        Inicia as threads de workers para a aplicação Flask informada
+        
+        Args:
+            app (Flask): Application providing the database context / Aplicação que fornece o contexto do banco
+        """
+        if self._threads or self.worker_count <= 0:
+            return
+        
+        # Return claims abandoned by a previous process / Devolve reivindicações abandonadas por um processo anterior
+        with app.app_context():
+            self.release_expired_claims()
+        
+        for index in range(self.worker_count):
+            thread = threading.Thread(
+                target=self._run,
+                args=(app,),
+                name=f'sms-dispatch-{index}',
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self, timeout=None):
+        """
+        Ask the workers to finish their current batch and exit
+        Pede aos workers que terminem o lote atual e encerrem
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stopping.clear()
+    
+    def notify(self):
+        """
+        Wake idle workers after new rows are enqueued
+        Acorda workers ociosos após novas linhas serem enfileiradas
+        """
+        self._wakeup.set()
+    
+    def claim_batch(self):
+        """
+        Atomically claim up to batch_size pending messages that are due
+        Reivindica atomicamente até batch_size mensagens pendentes que estão prontas
+        
+        Returns:
+            list: Claimed rows with id, from_number, to_number, message, attempts and segments / Linhas reivindicadas com id, from_number, to_number, message, attempts e segments
+        """
+        token = uuid.uuid4().hex
+        now = datetime.utcnow()
+        
+        due = db.select(SmsMessage.id) \
+            .where(SmsMessage.status == 'pending') \
+            .where(db.or_(SmsMessage.next_attempt_at.is_(None), SmsMessage.next_attempt_at <= now)) \
+            .order_by(SmsMessage.id) \
+            .limit(self.batch_size)
+        
+        # The status condition makes the claim safe against concurrent workers
+        # A condição de status torna a reivindicação segura contra workers concorrentes
+        claimed = db.session.execute(
+            db.update(SmsMessage)
+            .where(SmsMessage.id.in_(due))
+            .where(SmsMessage.status == 'pending')
+            .values(
+                status='sending',
+                claim_token=token,
+                claimed_at=now,
+                attempts=db.func.coalesce(SmsMessage.attempts, 0) + 1
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        
+        if not claimed:
+            return []
+        
+        return db.session.execute(
+            db.select(
+                SmsMessage.id, SmsMessage.from_number, SmsMessage.to_number,
+                SmsMessage.message, SmsMessage.attempts, SmsMessage.segments
+            )
+            .where(SmsMessage.claim_token == token)
+            .order_by(SmsMessage.id)
+        ).all()
+    
+    def release_expired_claims(self):
+        """
+        Return messages whose claim outlived the lease to the outbox, failing
+        those that already used all their attempts
+        Devolve à fila mensagens cuja reivindicação excedeu o prazo, marcando como
+        falha as que já usaram todas as tentativas
+        
+        Returns:
+            int: Number of claims released / Número de reivindicações liberadas
+        """
+        expired_before = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        expired = db.and_(SmsMessage.status == 'sending', SmsMessage.claimed_at < expired_before)
+        
+        db.session.execute(
+            db.update(SmsMessage)
+            .where(expired)
+            .where(SmsMessage.attempts >= self.sms_service.max_attempts)
+            .values(status='failed', claim_token=None, provider_response='Dispatch attempts exhausted')
+            .execution_options(synchronize_session=False)
+        )
+        released = db.session.execute(
+            db.update(SmsMessage)
+            .where(expired)
+            .values(status='pending', claim_token=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        
+        return released
+    
+    def dispatch_once(self):
+        """
+        Claim and deliver one batch of messages
+        Reivindica e entrega um lote de mensagens
+        
+        Returns:
+            int: Number of messages processed / Número de mensagens processadas
+        """
+        records = self.claim_batch()
+        if records:
+            self.sms_service.deliver_batch(records)
+        return len(records)
+    
+    def drain(self):
+        """
+        Deliver pending messages until the outbox is empty (used by scripts and tests)
+        Entrega mensagens pendentes até a fila esvaziar (usado por scripts e testes)
+        
+        Returns:
+            int: Number of messages processed / Número de mensagens processadas
+        """
+        total = 0
+        while True:
+            processed = self.dispatch_once()
+            if not processed:
+                return total
+            total += processed
+    
+    def _run(self, app):
+        """
+        Worker loop / Loop do worker
+        """
+        with app.app_context():
+            last_release = time.monotonic()
+            
+            while not self._stopping.is_set():
+                try:
+                    if time.monotonic() - last_release >= self.poll_interval * 10:
+                        self.release_expired_claims()
+                        last_release = time.monotonic()
+                    
+                    if self.dispatch_once():
+                        continue
+                
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Warning: SMS dispatch worker error: {e}")
+                
+                finally:
+                    db.session.remove()
+                
+                # Wait for new work or the next poll / Aguarda novo trabalho ou a próxima verificação
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
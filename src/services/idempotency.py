@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from src.models.sms import IdempotencyKey, db
+
+class IdempotencyStore:
+    """
+    Stored responses for Idempotency-Key requests and per-recipient dedupe keys
+    Respostas armazenadas de requisições com Idempotency-Key e chaves de deduplicação por destinatário
+    
+    Entries expire after SMS_IDEMPOTENCY_TTL_SECONDS; expired rows are ignored by
+    lookups and deleted in the background of later calls. A reserved key whose
+    request never finished (e.g. the process crashed) is taken over by a retry
+    once SMS_IDEMPOTENCY_LEASE_SECONDS have passed since it was reserved. The send
+    job is linked to the key in the same transaction that queues it, so a key whose
+    job exists is never run again, even without a stored response.
+    Entradas expiram após SMS_IDEMPOTENCY_TTL_SECONDS; linhas expiradas são ignoradas
+    nas buscas e excluídas durante chamadas posteriores. Uma chave reservada cuja
+    requisição nunca terminou (ex. o processo caiu) é assumida por uma nova tentativa
+    após SMS_IDEMPOTENCY_LEASE_SECONDS desde a reserva. O job de envio é ligado à
+    chave na mesma transação que o enfileira, então uma chave cujo job existe nunca
+    é executada de novo, mesmo sem resposta armazenada.
+    """
+    
+    RECIPIENT_SCOPE = 'recipient'
+    
+    def __init__(self, ttl=None, lease=None):
+        """
+        Args:
+            ttl (float): Seconds a key is remembered / Segundos em que uma chave é lembrada
+            lease (float): Seconds an unfinished request holds its key / Segundos em que uma requisição não concluída mantém sua chave
+        """
+        self.ttl = ttl if ttl is not None else float(os.getenv('SMS_IDEMPOTENCY_TTL_SECONDS', '86400'))
+        self.lease = lease if lease is not None else float(os.getenv('SMS_IDEMPOTENCY_LEASE_SECONDS', '300'))
+        self.purge_interval = float(os.getenv('SMS_IDEMPOTENCY_PURGE_INTERVAL', '300'))
+        self._last_purge = 0.0
+    
+    @staticmethod
+    def request_hash(payload):
+        """
+        Fingerprint of a request payload / Impressão digital do payload de uma requisição
+        """
+        canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+    
+    def begin(self, scope, key, request_hash):
+        """
+        Reserve a key for a new request, or find the earlier request that used it
+        Reserva uma chave para uma nova requisição, ou encontra a requisição anterior que a usou
+        
+        Args:
+            scope (str): Endpoint the key belongs to / Endpoint ao qual a chave pertence
+            key (str): Client supplied key / Chave informada pelo cliente
+            request_hash (str): Fingerprint from request_hash() / Impressão digital de request_hash()
+        
+        Returns:
+            tuple: (state, record) where state is new, replay, job (queued, response not stored), in_progress or mismatch
+                   (estado, registro) onde estado é new, replay, job (enfileirado, resposta não armazenada), in_progress ou mismatch
+        """
+        self._purge_if_due()
+        now = datetime.utcnow()
+        
+        record = IdempotencyKey.query.filter_by(scope=scope, key=key).first()
+        if record and record.expires_at <= now:
+            db.session.delete(record)
+            db.session.commit()
+            record = None
+        
+        if record:
+            if record.request_hash != request_hash:
+                return 'mismatch', record
+            if record.status_code is None:
+                if record.job_id is not None:
+                    return 'job', record
+                if record.created_at and record.created_at <= now - timedelta(seconds=self.lease):
+                    return self._take_over(record, now)
+                return 'in_progress', record
+            return 'replay', record
+        
+        record = IdempotencyKey(
+            scope=scope,
+            key=key,
+            request_hash=request_hash,
+            expires_at=now + timedelta(seconds=self.ttl)
+        )
+        db.session.add(record)
+        try:
+            db.session.commit()
+        except db.exc.IntegrityError:
+            # A concurrent request reserved it first / Uma requisição concorrente reservou antes
+            db.session.rollback()
+            return 'in_progress', None
+        
+        return 'new', record
+    
+    def _take_over(self, record, now):
+        """
+        Reserve a key whose lease ran out; only one concurrent caller wins
+        Reserva uma chave cujo prazo expirou; apenas um chamador concorrente vence
+        """
+        taken = IdempotencyKey.query \
+            .filter_by(id=record.id, status_code=None, created_at=record.created_at) \
+            .update({'created_at': now, 'expires_at': now + timedelta(seconds=self.ttl)}, synchronize_session=False)
+        db.session.commit()
+        
+        if not taken:
+            return 'in_progress', None
+        
+        db.session.refresh(record)
+        return 'new', record
+    
+    def complete(self, scope, key, status_code, body):
+        """
+        Store the response of a reserved key / Armazena a resposta de uma chave reservada
+        """
+        IdempotencyKey.query.filter_by(scope=scope, key=key).update({
+            'status_code': status_code,
+            'response': json.dumps(body)
+        })
+        db.session.commit()
+    
+    def link_job(self, scope, key, job_id):
+        """
+        Link a reserved key to the job being queued (caller commits with the job)
+        Liga uma chave reservada ao job sendo enfileirado (quem chama faz o commit junto com o job)
+        """
+        IdempotencyKey.query \
+            .filter_by(scope=scope, key=key, status_code=None) \
+            .update({'job_id': job_id}, synchronize_session=False)
+    
+    def abandon(self, scope, key):
+        """
+        Release a reserved key so the request can be retried; keys with a queued job are kept
+        Libera uma chave reservada para que a requisição possa ser repetida; chaves com job enfileirado são mantidas
+        """
+        db.session.rollback()
+        IdempotencyKey.query.filter_by(scope=scope, key=key, status_code=None, job_id=None).delete()
+        db.session.commit()
+    
+    def find_recipients(self, keys, chunk_size=500):
+        """
+        Look up live per-recipient dedupe keys / Busca chaves de deduplicação por destinatário válidas
+        
+        Returns:
+            dict: Queued message id by dedupe key / Id da mensagem enfileirada por chave de deduplicação
+        """
+        keys = list(dict.fromkeys(keys))
+        now = datetime.utcnow()
+        
+        found = {}
+        for start in range(0, len(keys), chunk_size):
+            rows = db.session.query(IdempotencyKey.key, IdempotencyKey.message_id) \
+                .filter(IdempotencyKey.scope == self.RECIPIENT_SCOPE) \
+                .filter(IdempotencyKey.key.in_(keys[start:start + chunk_size])) \
+                .filter(IdempotencyKey.expires_at > now) \
+                .all()
+            found.update(rows)
+        
+        return found
+    
+    def remember_recipients(self, entries, chunk_size=500):
+        """
+        Record dedupe keys of queued messages (caller commits)
+        Registra chaves de deduplicação das mensagens enfileiradas (quem chama faz o commit)
+        
+        Args:
+            entries (list): (dedupe key, message id) pairs / Pares (chave de deduplicação, id da mensagem)
+        """
+        if not entries:
+            return
+        
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl)
+        
+        # Expired keys may be reused / Chaves expiradas podem ser reutilizadas
+        keys = [key for key, _ in entries]
+        for start in range(0, len(keys), chunk_size):
+            IdempotencyKey.query \
+                .filter(IdempotencyKey.scope == self.RECIPIENT_SCOPE) \
+                .filter(IdempotencyKey.key.in_(keys[start:start + chunk_size])) \
+                .filter(IdempotencyKey.expires_at <= now) \
+                .delete(synchronize_session=False)
+        
+        db.session.execute(db.insert(IdempotencyKey), [
+            {
+                'scope': self.RECIPIENT_SCOPE,
+                'key': key,
+                'message_id': message_id,
+                'created_at': now,
+                'expires_at': expires_at
+            }
+            for key, message_id in entries
+        ])
+    
+    def purge_expired(self):
+        """
+        Delete expired keys / Exclui chaves expiradas
+        
+        Returns:
+            int: Rows deleted / Linhas excluídas
+        """
+        deleted = IdempotencyKey.query \
+            .filter(IdempotencyKey.expires_at <= datetime.utcnow()) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+    
+    def _purge_if_due(self):
+        if time.monotonic() - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = time.monotonic()
+        
+        try:
+            self.purge_expired()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Warning: idempotency key purge failed: {e}")
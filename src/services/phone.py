@@ -0,0 +1,66 @@
+import os
+import re
+
+# Characters allowed around the digits of a phone number / Caracteres permitidos entre os dígitos de um telefone
+_FORMATTING = re.compile(r'[\s\-\.\(\)/]')
+
+# Country codes whose national 0 stays in E.164 (Italy, San Marino, Vatican) / Códigos de país cujo 0 nacional permanece no E.164 (Itália, San Marino, Vaticano)
+_KEEP_TRUNK_ZERO = frozenset({'39', '378', '379'})
+
+def default_country_code():
+    """
+    Country calling code for numbers written without one (SMS_DEFAULT_COUNTRY_CODE)
+    Código de país para números escritos sem ele (SMS_DEFAULT_COUNTRY_CODE)
+    """
+    return os.getenv('SMS_DEFAULT_COUNTRY_CODE', '1').lstrip('+')
+
+def normalize_phone(number, country_code=None):
+    """
+    Convert a phone number to E.164 (+ followed by 8 to 15 digits)
+    Converte um número de telefone para E.164 (+ seguido de 8 a 15 dígitos)
+    
+    Spaces, dashes, dots, slashes and parentheses are ignored. Numbers starting
+    with 00 are international; other numbers without + get the default country
+    code unless they already start with it and are long enough to include it.
+    National numbers with a trunk 0 (020 7946 0958) drop the 0 and get the default
+    country code; they are rejected when the default is NANP (1), which has no
+    trunk 0, since they then belong to some other country.
+    Espaços, hífens, pontos, barras e parênteses são ignorados. Números iniciados
+    por 00 são internacionais; outros números sem + recebem o código de país padrão,
+    a menos que já comecem com ele e sejam longos o bastante para incluí-lo.
+    Números nacionais com 0 de discagem (020 7946 0958) perdem o 0 e recebem o código
+    de país padrão; são rejeitados quando o padrão é NANP (1), que não usa 0 de
+    discagem, pois nesse caso pertencem a outro país.
+    
+    Args:
+        number (str): Phone number as typed / Número de telefone como digitado
+        country_code (str): Default country code, from the environment when omitted / Código de país padrão, do ambiente quando omitido
+    
+    Returns:
+        str: E.164 number, or None if it is not a valid phone number / Número E.164, ou None se não for um telefone válido
+    """
+    if number is None:
+        return None
+    
+    text = _FORMATTING.sub('', str(number))
+    international = text.startswith('+')
+    digits = text[1:] if international else text
+    # isdigit alone accepts other scripts (e.g. Arabic-Indic digits) / isdigit sozinho aceita outros sistemas (ex. dígitos arábico-índicos)
+    if not (digits.isascii() and digits.isdigit()):
+        return None
+    
+    if not international:
+        country_code = country_code or default_country_code()
+        if digits.startswith('00'):
+            digits = digits[2:]
+        elif digits.startswith('0'):
+            if not country_code or country_code == '1':
+                # Trunk prefix of some other country's national format / Prefixo de discagem do formato nacional de outro país
+                return None
+            digits = country_code + (digits if country_code in _KEEP_TRUNK_ZERO else digits[1:])
+        elif not (digits.startswith(country_code) and len(digits) >= len(country_code) + 10):
+            digits = country_code + digits
+    
+    if not 8 <= len(digits) <= 15 or digits.startswith('0'):
+        return None
+    return '+' + digits
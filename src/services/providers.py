@@ -0,0 +1,368 @@
+import base64
+import hashlib
+import heapq
+import hmac
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+# Provider acknowledgement of an accepted message / Confirmação do provedor para uma mensagem aceita
+ProviderMessage = namedtuple('ProviderMessage', ['sid', 'status'])
+
+def compute_signature(secret, url, params):
+    """
+    Twilio-style callback signature: base64(HMAC-SHA1(secret, url + sorted key/value pairs))
+    Assinatura de callback no estilo Twilio: base64(HMAC-SHA1(segredo, url + pares chave/valor ordenados))
+    """
+    payload = url + ''.join(f'{key}{params[key]}' for key in sorted(params))
+    digest = hmac.new(secret.encode('utf-8'), payload.encode('utf-8'), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+class ProviderError(Exception):
+    """
+    Error reported by an SMS provider
+    Erro informado por um provedor SMS
+    """
+    
+    def __init__(self, message, status_code=None, retryable=False):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable or status_code == 429 or (status_code or 0) >= 500
+    
+    @property
+    def throttled(self):
+        """
+        True when the provider rejected the request for exceeding its rate limit
+        Verdadeiro quando o provedor rejeitou a requisição por exceder seu limite
+        """
+        return self.status_code == 429
+
+class SmsProvider:
+    """
+    Interface implemented by SMS providers
+    Interface implementada pelos provedores SMS
+    """
+    
+    name = 'base'
+    simulated = False
+    
+    # Default (per number, per account) messages per second / Mensagens por segundo padrão (por número, por conta)
+    rate_limits = (0, 0)
+    
+    @property
+    def account_id(self):
+        """
+        Identifier of the provider account used for account-wide rate limits
+        Identificador da conta do provedor usado nos limites por conta
+        """
+        return self.name
+    
+    def send(self, to_number, from_number, body):
+        """
+        Submit one message / Envia uma mensagem
+        
+        Returns:
+            ProviderMessage: Provider id and initial status / Id do provedor e status inicial
+        
+        Raises:
+            ProviderError: When the provider rejects or cannot be reached / Quando o provedor rejeita ou está inacessível
+        """
+        raise NotImplementedError
+    
+    def fetch_status(self, provider_message_id):
+        """
+        Fetch the current delivery status of a message
+        Busca o status de entrega atual de uma mensagem
+        
+        Returns:
+            str: Provider status (queued, sent, delivered, failed, undelivered...) / Status do provedor
+        """
+        raise NotImplementedError
+    
+    def validate_callback(self, url, params, signature):
+        """
+        Check the signature of a status callback request
+        Verifica a assinatura de uma requisição de callback de status
+        
+        Args:
+            url (str): Full public URL the provider posted to / URL pública completa usada pelo provedor
+            params (dict): Form parameters of the callback / Parâmetros do formulário do callback
+            signature (str): Signature header sent by the provider / Cabeçalho de assinatura enviado pelo provedor
+        
+        Returns:
+            bool: True when the request comes from the provider / Verdadeiro quando a requisição vem do provedor
+        """
+        return False
+
+class TwilioProvider(SmsProvider):
+    """
+    Twilio REST API provider / Provedor da API REST do Twilio
+    """
+    
+    name = 'twilio'
+    rate_limits = (1, 100)
+    
+    def __init__(self, account_sid, auth_token):
+        # Imported lazily so the service runs without the Twilio SDK when simulating
+        # Importado sob demanda para o serviço rodar sem o SDK do Twilio ao simular
+        from twilio.rest import Client
+        
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.client = Client(account_sid, auth_token)
+        
+        # Public URL of the status webhook, if deployed / URL pública do webhook de status, se publicado
+        self.status_callback = os.getenv('SMS_STATUS_CALLBACK_URL')
+    
+    @property
+    def account_id(self):
+        return self.account_sid
+    
+    def send(self, to_number, from_number, body):
+        try:
+            options = {'status_callback': self.status_callback} if self.status_callback else {}
+            twilio_message = self.client.messages.create(
+                body=body,
+                from_=from_number,
+                to=to_number,
+                **options
+            )
+            return ProviderMessage(twilio_message.sid, str(twilio_message.status))
+        
+        except Exception as e:
+            raise self._provider_error(e) from e
+    
+    def fetch_status(self, provider_message_id):
+        try:
+            return self.client.messages(provider_message_id).fetch().status
+        
+        except Exception as e:
+            raise self._provider_error(e) from e
+    
+    def validate_callback(self, url, params, signature):
+        from twilio.request_validator import RequestValidator
+        
+        return RequestValidator(self.auth_token).validate(url, params, signature or '')
+    
+    def _provider_error(self, error):
+        """
+        Translate Twilio and transport exceptions into ProviderError
+        Converte exceções do Twilio e de transporte em ProviderError
+        """
+        from twilio.base.exceptions import TwilioException, TwilioRestException
+        
+        if isinstance(error, TwilioRestException):
+            return ProviderError(str(error), status_code=error.status)
+        if isinstance(error, TwilioException):
+            return ProviderError(str(error))
+        
+        # Network failures are worth retrying / Falhas de rede merecem nova tentativa
+        return ProviderError(str(error), retryable=True)
+
+class SimulatedProvider(SmsProvider):
+    """
+    Local fake provider for development and load testing
+    Provedor falso local para desenvolvimento e testes de carga
+    
+    Models provider latency, random errors, per-number throttling (HTTP 429)
+    and delayed delivery receipts delivered through the on_status callback.
+    Modela latência do provedor, erros aleatórios, limitação por número (HTTP 429)
+    e confirmações de entrega atrasadas entregues pelo callback on_status.
+    """
+    
+    name = 'simulated'
+    simulated = True
+    
+    LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'exponential', 'lognormal')
+    
+    def __init__(self, latency_ms=0, latency_distribution='fixed', latency_sigma=0.5,
+                 error_rate=0.0, throttle_rate=0.0, mps_per_number=0,
+                 delivery_delay_ms=None, undelivered_rate=0.0, on_status=None, seed=None):
+        """
+        Args:
+            latency_ms (float): Mean request latency / Latência média da requisição
+            latency_distribution (str): One of LATENCY_DISTRIBUTIONS / Uma das LATENCY_DISTRIBUTIONS
+            latency_sigma (float): Shape of the lognormal distribution / Forma da distribuição lognormal
+            error_rate (float): Probability of a transient 500 error / Probabilidade de erro 500 transitório
+            throttle_rate (float): Probability of a random 429 / Probabilidade de um 429 aleatório
+            mps_per_number (float): Messages per second accepted per sender, 0 for unlimited / Mensagens por segundo aceitas por remetente, 0 para ilimitado
+            delivery_delay_ms (float): Mean delay before the delivery receipt, None disables receipts / Atraso médio da confirmação de entrega, None desativa
+            undelivered_rate (float): Probability that a receipt reports undelivered / Probabilidade da confirmação informar não entregue
+            on_status (callable): Called as on_status(sid, status) for each receipt / Chamado como on_status(sid, status) para cada confirmação
+            seed (int): Random seed for reproducible runs / Semente aleatória para execuções reproduzíveis
+        """
+        if latency_distribution not in self.LATENCY_DISTRIBUTIONS:
+            raise ValueError(f'Unknown latency distribution: {latency_distribution}')
+        
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.mps_per_number = mps_per_number
+        self.delivery_delay_ms = delivery_delay_ms
+        self.undelivered_rate = undelivered_rate
+        self.on_status = on_status
+        
+        # The provider enforces the same limit it advertises / O provedor aplica o mesmo limite que anuncia
+        self.rate_limits = (mps_per_number, 0)
+        
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._statuses = {}
+        self._windows = {}
+        self._receipts = []
+        self._receipts_ready = threading.Condition(self._lock)
+        self._receipt_thread = None
+    
+    @classmethod
+    def from_env(cls):
+        """
+        Build the simulator from SMS_SIM_* environment variables
+        Cria o simulador a partir das variáveis de ambiente SMS_SIM_*
+        """
+        delivery_delay = os.getenv('SMS_SIM_DELIVERY_DELAY_MS')
+        seed = os.getenv('SMS_SIM_SEED')
+        return cls(
+            latency_ms=float(os.getenv('SMS_SIM_LATENCY_MS', '0')),
+            latency_distribution=os.getenv('SMS_SIM_LATENCY_DISTRIBUTION', 'fixed'),
+            latency_sigma=float(os.getenv('SMS_SIM_LATENCY_SIGMA', '0.5')),
+            error_rate=float(os.getenv('SMS_SIM_ERROR_RATE', '0')),
+            throttle_rate=float(os.getenv('SMS_SIM_THROTTLE_RATE', '0')),
+            mps_per_number=float(os.getenv('SMS_SIM_MPS_PER_NUMBER', '0')),
+            delivery_delay_ms=float(delivery_delay) if delivery_delay else None,
+            undelivered_rate=float(os.getenv('SMS_SIM_UNDELIVERED_RATE', '0')),
+            seed=int(seed) if seed else None
+        )
+    
+    def send(self, to_number, from_number, body):
+        time.sleep(self._latency())
+        
+        with self._lock:
+            roll = self._random.random()
+            if roll < self.throttle_rate or self._over_limit(from_number):
+                raise ProviderError('Too Many Requests (simulated)', status_code=429)
+            if roll < self.throttle_rate + self.error_rate:
+                raise ProviderError('Internal Server Error (simulated)', status_code=500)
+            
+            sid = f'sim_{uuid.uuid4().hex}'
+            self._statuses[sid] = 'sent'
+            
+            if self.delivery_delay_ms is not None:
+                self._schedule_receipt(sid)
+        
+        return ProviderMessage(sid, 'sent')
+    
+    def fetch_status(self, provider_message_id):
+        time.sleep(self._latency())
+        
+        with self._lock:
+            status = self._statuses.get(provider_message_id)
+        if status is None:
+            raise ProviderError(f'Message {provider_message_id} not found (simulated)', status_code=404)
+        return status
+    
+    def validate_callback(self, url, params, signature):
+        # Signed like Twilio with SMS_WEBHOOK_SECRET; without a secret every callback is rejected
+        # Assinado como no Twilio com SMS_WEBHOOK_SECRET; sem segredo todo callback é rejeitado
+        secret = os.getenv('SMS_WEBHOOK_SECRET')
+        if not secret:
+            return False
+        
+        expected = compute_signature(secret, url, params)
+        return hmac.compare_digest(expected, signature or '')
+    
+    def _latency(self):
+        """
+        Draw one request latency in seconds / Sorteia uma latência de requisição em segundos
+        """
+        mean = self.latency_ms / 1000.0
+        if mean <= 0:
+            return 0.0
+        
+        if self.latency_distribution == 'uniform':
+            return self._random.uniform(0, 2 * mean)
+        if self.latency_distribution == 'exponential':
+            return self._random.expovariate(1 / mean)
+        if self.latency_distribution == 'lognormal':
+            # Parameterized so the mean stays at latency_ms / Parametrizado para manter a média em latency_ms
+            mu = math.log(mean) - self.latency_sigma ** 2 / 2
+            return self._random.lognormvariate(mu, self.latency_sigma)
+        return mean
+    
+    def _over_limit(self, from_number):
+        """
+        Fixed one-second window per sender, called with the lock held
+        Janela fixa de um segundo por remetente, chamada com o lock adquirido
+        """
+        if self.mps_per_number <= 0:
+            return False
+        
+        window = int(time.monotonic())
+        start, count = self._windows.get(from_number, (window, 0))
+        if start != window:
+            start, count = window, 0
+        if count >= self.mps_per_number:
+            return True
+        
+        self._windows[from_number] = (start, count + 1)
+        return False
+    
+    def _schedule_receipt(self, sid):
+        """
+        Queue a delivery receipt, called with the lock held
+        Enfileira uma confirmação de entrega, chamada com o lock adquirido
+        """
+        delay = self._random.expovariate(1000.0 / self.delivery_delay_ms) if self.delivery_delay_ms > 0 else 0.0
+        status = 'undelivered' if self._random.random() < self.undelivered_rate else 'delivered'
+        heapq.heappush(self._receipts, (time.monotonic() + delay, sid, status))
+        self._receipts_ready.notify()
+        
+        if self._receipt_thread is None:
+            self._receipt_thread = threading.Thread(target=self._deliver_receipts, name='sms-sim-receipts', daemon=True)
+            self._receipt_thread.start()
+    
+    def _deliver_receipts(self):
+        """
+        Single thread that applies receipts when they become due
+        Thread única que aplica as confirmações quando chega a hora
+        """
+        while True:
+            with self._lock:
+                while not self._receipts or self._receipts[0][0] > time.monotonic():
+                    timeout = self._receipts[0][0] - time.monotonic() if self._receipts else None
+                    self._receipts_ready.wait(timeout)
+                
+                _, sid, status = heapq.heappop(self._receipts)
+                self._statuses[sid] = status
+            
+            if self.on_status:
+                try:
+                    self.on_status(sid, status)
+                except Exception as e:
+                    print(f"Warning: simulated status callback failed: {e}")
+
+def create_provider(account_sid, auth_token):
+    """
+    Create the provider selected by SMS_PROVIDER (twilio or simulated)
+    Cria o provedor selecionado por SMS_PROVIDER (twilio ou simulated)
+    
+    Without SMS_PROVIDER, Twilio is used when credentials are configured and the
+    simulator otherwise.
+    Sem SMS_PROVIDER, o Twilio é usado quando há credenciais e o simulador caso contrário.
+    """
+    configured = account_sid != 'your_account_sid_here' and auth_token != 'your_auth_token_here'
+    provider_name = os.getenv('SMS_PROVIDER', 'twilio' if configured else 'simulated')
+    
+    if provider_name == 'twilio':
+        return TwilioProvider(account_sid, auth_token)
+    if provider_name == 'simulated':
+        if not configured:
+            print("Warning: Twilio credentials not configured. SMS sending will be simulated.")
+        return SimulatedProvider.from_env()
+    
+    raise ValueError(f'Unknown SMS provider: {provider_name}')
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that queues callers instead of rejecting them
+    Token bucket thread-safe que enfileira chamadores em vez de rejeitá-los
+    
+    Each acquire reserves the next free slot, so callers that exceed the budget
+    wait their turn in arrival order.
+    Cada acquire reserva o próximo espaço livre, então chamadores que excedem o
+    limite aguardam sua vez na ordem de chegada.
+    """
+    
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate (float): Tokens added per second / Tokens adicionados por segundo
+            capacity (float): Maximum burst size / Tamanho máximo de rajada
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def reserve(self, tokens=1):
+        """
+        Take tokens, going into debt if not enough are available
+        Retira tokens, ficando em débito se não houver o suficiente
+        
+        Args:
+            tokens (float): Tokens to take / Tokens a retirar
+        
+        Returns:
+            float: Seconds the caller must wait before using the token / Segundos que o chamador deve aguardar
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+    
+    def penalize(self, seconds):
+        """
+        Remove the tokens that would accrue over the given time (after a provider 429)
+        Remove os tokens que seriam acumulados no tempo informado (após um 429 do provedor)
+        """
+        with self._lock:
+            self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+class RateLimiter:
+    """
+    Token buckets keyed by sender number and by provider account
+    Token buckets por número remetente e por conta do provedor
+    
+    Buckets live in process memory. When several processes dispatch (e.g. gunicorn
+    workers), set SMS_DISPATCH_PROCESSES to their count so each process takes its
+    share of the provider limits, or set SMS_DISPATCH_WORKERS=0 on all but one
+    process so only that process sends.
+    Os buckets ficam na memória do processo. Quando vários processos despacham
+    (ex. workers do gunicorn), defina SMS_DISPATCH_PROCESSES com a quantidade para
+    que cada processo use sua parte dos limites do provedor, ou defina
+    SMS_DISPATCH_WORKERS=0 em todos exceto um processo para que apenas ele envie.
+    """
+    
+    def __init__(self, per_number_rate, per_account_rate, burst=None):
+        """
+        Args:
+            per_number_rate (float): Segments per second per sender number, 0 disables / Segmentos por segundo por número, 0 desativa
+            per_account_rate (float): Segments per second per account, 0 disables / Segmentos por segundo por conta, 0 desativa
+            burst (float): Optional bucket capacity / Capacidade opcional do bucket
+        """
+        self.per_number_rate = per_number_rate
+        self.per_account_rate = per_account_rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_env(cls, default_rates=(1, 100)):
+        """
+        Build a limiter from SMS_RATE_* environment variables, split across SMS_DISPATCH_PROCESSES
+        Cria um limitador a partir das variáveis de ambiente SMS_RATE_*, dividido entre SMS_DISPATCH_PROCESSES
+        
+        Args:
+            default_rates (tuple): (per number, per account) rates when not configured / Taxas (por número, por conta) quando não configuradas
+        """
+        burst = os.getenv('SMS_RATE_BURST')
+        
+        # Processes sharing the provider budget / Processos que compartilham o limite do provedor
+        processes = int(os.getenv('SMS_DISPATCH_PROCESSES', '1'))
+        if processes < 1:
+            print(f"Warning: SMS_DISPATCH_PROCESSES must be at least 1, got {processes}; using 1")
+            processes = 1
+        
+        return cls(
+            per_number_rate=float(os.getenv('SMS_RATE_PER_NUMBER', default_rates[0])) / processes,
+            per_account_rate=float(os.getenv('SMS_RATE_PER_ACCOUNT', default_rates[1])) / processes,
+            burst=float(burst) / processes if burst else None
+        )
+    
+    def acquire(self, from_number, account=None, tokens=1):
+        """
+        Block until both the number and the account budget allow one more message
+        Bloqueia até que os limites do número e da conta permitam mais uma mensagem
+        
+        Args:
+            tokens (int): Budget used by the message (its segment count) / Limite usado pela mensagem (seu número de segmentos)
+        
+        Returns:
+            float: Seconds spent waiting / Segundos aguardando
+        """
+        wait = 0.0
+        for bucket in self._buckets_for(from_number, account):
+            wait = max(wait, bucket.reserve(tokens))
+        
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+    
+    def throttle(self, from_number, account=None, seconds=1.0):
+        """
+        Back off after the provider reported throttling (HTTP 429)
+        Recua após o provedor informar limitação (HTTP 429)
+        """
+        for bucket in self._buckets_for(from_number, account):
+            bucket.penalize(seconds)
+    
+    def _buckets_for(self, from_number, account):
+        """
+        Get (creating if needed) the buckets that apply to a send
+        Obtém (criando se necessário) os buckets que se aplicam a um envio
+        """
+        keys = []
+        if self.per_number_rate > 0:
+            keys.append(('number', from_number, self.per_number_rate))
+        if self.per_account_rate > 0 and account:
+            keys.append(('account', account, self.per_account_rate))
+        
+        buckets = []
+        with self._lock:
+            for kind, key, rate in keys:
+                bucket = self._buckets.get((kind, key))
+                if bucket is None:
+                    bucket = TokenBucket(rate, self.burst)
+                    self._buckets[(kind, key)] = bucket
+                buckets.append(bucket)
+        return buckets
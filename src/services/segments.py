@@ -0,0 +1,181 @@
+import os
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+# GSM 03.38 default alphabet (one septet each) / Alfabeto padrão GSM 03.38 (um septeto cada)
+GSM_BASIC = frozenset(
+    '@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !"#¤%&\'()*+,-./0123456789:;<=>?'
+    '¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà'
+)
+
+# Extension table, sent as escape + character (two septets) / Tabela de extensão, enviada como escape + caractere (dois septetos)
+GSM_EXTENDED = frozenset('^{}\\[~]|€\f')
+
+# Septets or UTF-16 units per segment: (single message, each part of a concatenated message)
+# Septetos ou unidades UTF-16 por segmento: (mensagem única, cada parte de uma mensagem concatenada)
+SEGMENT_LIMITS = {
+    'GSM-7': (160, 153),
+    'UCS-2': (70, 67),
+}
+
+# Common characters outside GSM-7 and their closest GSM-7 spelling
+# Caracteres comuns fora do GSM-7 e sua grafia GSM-7 mais próxima
+TRANSLITERATIONS = {
+    '‘': "'", '’': "'", '‚': "'", '‛': "'", '′': "'", '`': "'", '´': "'",
+    '“': '"', '”': '"', '„': '"', '″': '"', '«': '"', '»': '"',
+    '‐': '-', '‑': '-', '‒': '-', '–': '-', '—': '-', '―': '-', '−': '-',
+    '…': '...', '•': '*', '·': '.', '\u00a0': ' ', '\u2009': ' ', '\u202f': ' ', '\t': ' ',
+    '©': '(c)', '®': '(R)', '™': 'TM', '°': 'o', 'ª': 'a', 'º': 'o',
+}
+
+# Unicode categories dropped when transliterating (emoji, symbols, joiners, marks)
+# Categorias Unicode removidas na transliteração (emoji, símbolos, junções, marcas)
+_DROPPED_CATEGORIES = frozenset({'So', 'Sk', 'Cf', 'Cs', 'Co', 'Mn', 'Me'})
+
+TRANSLITERATE_MODES = ('off', 'auto', 'always')
+
+SegmentInfo = namedtuple('SegmentInfo', ['encoding', 'segments', 'length', 'per_segment', 'non_gsm'])
+
+def is_gsm(char):
+    return char in GSM_BASIC or char in GSM_EXTENDED
+
+@lru_cache(maxsize=4096)
+def measure(text):
+    """
+    Encoding and segment count of a message
+    Codificação e número de segmentos de uma mensagem
+    
+    Concatenated parts never split an escape sequence or a surrogate pair, matching
+    how providers cut long messages.
+    Partes concatenadas nunca dividem uma sequência de escape ou um par substituto,
+    como os provedores fazem ao dividir mensagens longas.
+    
+    Args:
+        text (str): Message text / Texto da mensagem
+    
+    Returns:
+        SegmentInfo: encoding (GSM-7 or UCS-2), segments, length in septets or UTF-16 units,
+                     capacity per segment and the characters that forced UCS-2
+                     codificação (GSM-7 ou UCS-2), segmentos, tamanho em septetos ou unidades
+                     UTF-16, capacidade por segmento e os caracteres que forçaram UCS-2
+    """
+    non_gsm = tuple(dict.fromkeys(char for char in text if not is_gsm(char)))
+    if non_gsm:
+        encoding = 'UCS-2'
+        costs = [2 if ord(char) > 0xFFFF else 1 for char in text]
+    else:
+        encoding = 'GSM-7'
+        costs = [2 if char in GSM_EXTENDED else 1 for char in text]
+    
+    single, multi = SEGMENT_LIMITS[encoding]
+    length = sum(costs)
+    if length <= single:
+        return SegmentInfo(encoding, 1, length, single, non_gsm)
+    
+    segments, used = 1, 0
+    for cost in costs:
+        if used + cost > multi:
+            segments += 1
+            used = 0
+        used += cost
+    
+    return SegmentInfo(encoding, segments, length, multi, non_gsm)
+
+@lru_cache(maxsize=4096)
+def transliterate(text):
+    """
+    Replace characters outside GSM-7 with their closest GSM-7 spelling
+    Substitui caracteres fora do GSM-7 pela grafia GSM-7 mais próxima
+    
+    Accents missing from GSM-7 are stripped (ã -> a), typographic punctuation is
+    simplified, emoji and other symbols are removed and anything else becomes '?'.
+    Acentos ausentes no GSM-7 são removidos (ã -> a), pontuação tipográfica é
+    simplificada, emoji e outros símbolos são removidos e o restante vira '?'.
+    
+    Returns:
+        str: Text using only GSM-7 characters / Texto usando apenas caracteres GSM-7
+    """
+    output = []
+    dropped = False
+    for char in text:
+        if is_gsm(char):
+            # Do not leave a double space where a symbol was removed / Não deixa espaço duplo onde um símbolo foi removido
+            if char == ' ' and dropped and (not output or output[-1][-1:] in (' ', '\n')):
+                continue
+            output.append(char)
+            dropped = False
+            continue
+        
+        replacement = TRANSLITERATIONS.get(char)
+        if replacement is None:
+            decomposed = ''.join(
+                part for part in unicodedata.normalize('NFKD', char)
+                if not unicodedata.combining(part)
+            )
+            if decomposed and all(is_gsm(part) for part in decomposed):
+                replacement = decomposed
+            elif unicodedata.category(char) in _DROPPED_CATEGORIES:
+                replacement = ''
+            else:
+                replacement = '?'
+        
+        if replacement:
+            output.append(replacement)
+        dropped = not replacement
+    
+    text = ''.join(output)
+    return text.rstrip(' ') if dropped else text
+
+def optimize_encoding(text, mode='auto'):
+    """
+    Pick the text to send for a transliteration mode
+    Escolhe o texto a enviar para um modo de transliteração
+    
+    Args:
+        text (str): Rendered message / Mensagem renderizada
+        mode (str): off keeps the text, always transliterates, auto transliterates
+                    only when that saves segments
+                    off mantém o texto, always translitera, auto translitera apenas
+                    quando isso economiza segmentos
+    
+    Returns:
+        str: Text to send / Texto a enviar
+    """
+    if mode == 'off' or measure(text).encoding == 'GSM-7':
+        return text
+    
+    converted = transliterate(text)
+    if mode == 'always' or measure(converted).segments < measure(text).segments:
+        return converted
+    return text
+
+def default_transliterate_mode():
+    """
+    Transliteration mode from SMS_TRANSLITERATE (off, auto or always)
+    Modo de transliteração de SMS_TRANSLITERATE (off, auto ou always)
+    """
+    mode = os.getenv('SMS_TRANSLITERATE', 'off').lower()
+    if mode not in TRANSLITERATE_MODES:
+        print(f"Warning: invalid SMS_TRANSLITERATE value {mode}, using off")
+        return 'off'
+    return mode
+
+def parse_transliterate_mode(value):
+    """
+    Read a transliterate request field: true/false or off, auto, always
+    Lê o campo transliterate da requisição: true/false ou off, auto, always
+    
+    Returns:
+        str: Mode, or None when not given / Modo, ou None quando não informado
+    
+    Raises:
+        ValueError: On an unknown value / Para um valor desconhecido
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return 'auto' if value else 'off'
+    if isinstance(value, str) and value.lower() in TRANSLITERATE_MODES:
+        return value.lower()
+    raise ValueError(f"transliterate must be true, false or one of: {', '.join(TRANSLITERATE_MODES)}")
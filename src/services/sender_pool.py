@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+import zlib
+
+class SenderPool:
+    """
+    Pool of sender numbers with a pluggable selection strategy
+    Pool de números remetentes com estratégia de seleção configurável
+    
+    Strategies / Estratégias:
+        round_robin: cycle through the numbers / percorre os números em ciclo
+        least_recently_used: pick the number idle for the longest time / escolhe o número ocioso há mais tempo
+        sticky: always use the same number for a recipient / sempre usa o mesmo número para um destinatário
+    """
+    
+    STRATEGIES = ('round_robin', 'least_recently_used', 'sticky')
+    
+    def __init__(self, numbers, strategy='round_robin'):
+        """
+        Args:
+            numbers (list): Sender phone numbers / Números de telefone remetentes
+            strategy (str): One of STRATEGIES / Uma das STRATEGIES
+        """
+        if not numbers:
+            raise ValueError('Sender pool requires at least one number')
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f'Unknown sender strategy: {strategy}')
+        
+        self.numbers = list(numbers)
+        self.strategy = strategy
+        self._next_index = 0
+        self._last_used = {number: 0.0 for number in self.numbers}
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def from_env(cls, default_number):
+        """
+        Build the pool from TWILIO_FROM_NUMBERS (comma separated) and SMS_SENDER_STRATEGY
+        Cria o pool a partir de TWILIO_FROM_NUMBERS (separados por vírgula) e SMS_SENDER_STRATEGY
+        
+        Args:
+            default_number (str): Used when no pool is configured / Usado quando nenhum pool está configurado
+        """
+        numbers = [number.strip() for number in os.getenv('TWILIO_FROM_NUMBERS', '').split(',') if number.strip()]
+        return cls(
+            numbers or [default_number],
+            strategy=os.getenv('SMS_SENDER_STRATEGY', 'round_robin')
+        )
+    
+    def select(self, to_number):
+        """
+        Choose the sender number for one recipient
+        Escolhe o número remetente para um destinatário
+        
+        Args:
+            to_number (str): Destination phone number / Número de telefone de destino
+        
+        Returns:
+            str: Sender phone number / Número de telefone remetente
+        """
+        if len(self.numbers) == 1:
+            return self.numbers[0]
+        
+        if self.strategy == 'sticky':
+            return self._sticky(to_number)
+        
+        with self._lock:
+            if self.strategy == 'least_recently_used':
+                number = min(self.numbers, key=self._last_used.__getitem__)
+                self._last_used[number] = time.monotonic()
+                return number
+            
+            number = self.numbers[self._next_index]
+            self._next_index = (self._next_index + 1) % len(self.numbers)
+            return number
+    
+    def _sticky(self, to_number):
+        """
+        Rendezvous hashing: stable across processes, and adding a number only
+        moves the recipients that now prefer it
+        Hashing rendezvous: estável entre processos, e adicionar um número só
+        move os destinatários que passam a preferi-lo
+        """
+        return max(
+            self.numbers,
+            key=lambda number: zlib.crc32(f'{number}:{to_number}'.encode('utf-8'))
+        )
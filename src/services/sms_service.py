@@ -1,164 +1,475 @@
+import base64
+import heapq
+import json
 import os
-from twilio.rest import Client
-from twilio.base.exceptions import TwilioException
-from src.models.sms import SmsMessage, db
-from datetime import datetime
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from src.models.sms import SmsMessage, SmsJob, SmsTemplate, Contact, ContactGroup, contact_group_members, TERMINAL_STATUSES, STATUS_RANK, db
+from src.services.archive import MessageArchiver
+from src.services.idempotency import IdempotencyStore
+from src.services.phone import normalize_phone
+from src.services.providers import ProviderError, create_provider
+from src.services.rate_limiter import RateLimiter
+from src.services.segments import default_transliterate_mode, measure, optimize_encoding, transliterate as transliterate_text
+from src.services.sender_pool import SenderPool
+from src.services.status_cache import StatusCache
+from src.services.templates import TemplateCache, compile_template
+from datetime import datetime, timedelta
+
+# Lightweight view of a persisted message handed to the provider
+# Visão leve de uma mensagem persistida entregue ao provedor
+OutboundMessage = namedtuple('OutboundMessage', ['id', 'from_number', 'to_number', 'message', 'attempts', 'segments'])
+
+# Contact columns available to templates for per-recipient rendering
+# Colunas do contato disponíveis para templates na renderização por destinatário
+CONTACT_FIELDS = ('name', 'company', 'position')
+
+# Contact matched to a recipient, recorded on its messages / Contato associado a um destinatário, registrado nas mensagens
+RecipientContact = namedtuple('RecipientContact', ('id', 'contact_type') + CONTACT_FIELDS)
+
+# Columns written by the history export / Colunas gravadas pela exportação do histórico
+EXPORT_FIELDS = (
+    'id', 'from_number', 'to_number', 'message', 'encoding', 'segments', 'status', 'provider_message_id',
+    'job_id', 'group_id', 'contact_id', 'contact_type', 'attempts', 'created_at', 'updated_at'
+)
+
+def encode_history_cursor(sms_record):
+    """
+    Build the opaque history cursor pointing after a message
+    Cria o cursor opaco de histórico que aponta para depois de uma mensagem
+    """
+    payload = json.dumps([sms_record.created_at.isoformat(), sms_record.id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_history_cursor(cursor):
+    """
+    Decode a history cursor into (created_at, id)
+    Decodifica um cursor de histórico em (created_at, id)
+    
+    Raises:
+        ValueError: When the cursor is malformed / Quando o cursor é inválido
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
 
 class SmsService:
     """
-    Service class for handling SMS operations using Twilio
-    Classe de serviço para operações SMS usando Twilio
+    Service class for handling SMS operations through the configured provider
+    Classe de serviço para operações SMS através do provedor configurado
     """
     
-    def __init__(self):
+    def __init__(self, provider=None):
         # Twilio configuration - these should be set as environment variables
         # Configuração Twilio - estas devem ser definidas como variáveis de ambiente
         self.account_sid = os.getenv('TWILIO_ACCOUNT_SID', 'your_account_sid_here')
         self.auth_token = os.getenv('TWILIO_AUTH_TOKEN', 'your_auth_token_here')
         self.from_number = os.getenv('TWILIO_FROM_NUMBER', '+15551234567')
         
-        # Initialize Twilio client / Inicializa cliente Twilio
-        if self.account_sid != 'your_account_sid_here' and self.auth_token != 'your_auth_token_here':
-            self.client = Client(self.account_sid, self.auth_token)
-        else:
-            self.client = None
-            print("Warning: Twilio credentials not configured. SMS sending will be simulated.")
+        # Sender numbers used for outgoing messages / Números remetentes usados nas mensagens enviadas
+        self.sender_pool = SenderPool.from_env(self.from_number)
+        
+        # Rows per multi-row INSERT / UPDATE on bulk paths / Linhas por INSERT / UPDATE nos envios em massa
+        self.batch_size = int(os.getenv('SMS_BULK_BATCH_SIZE', '500'))
+        
+        # Group members read and queued per transaction / Membros de grupo lidos e enfileirados por transação
+        self.group_chunk_size = int(os.getenv('SMS_GROUP_CHUNK_SIZE', '2000'))
+        
+        # Maximum concurrent provider requests across all sends / Máximo de requisições simultâneas ao provedor
+        self.max_in_flight = int(os.getenv('SMS_MAX_IN_FLIGHT', '16'))
+        
+        # Shared by all dispatch workers; threads start on first use
+        # Compartilhado por todos os workers de despacho; threads iniciam no primeiro uso
+        self._executor = None
+        if self.max_in_flight > 1:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_in_flight,
+                thread_name_prefix='sms-provider'
+            )
+        
+        # Initialize SMS provider (Twilio or simulated) / Inicializa provedor SMS (Twilio ou simulado)
+        self.provider = provider or create_provider(self.account_sid, self.auth_token)
+        
+        # Provider rate limits per sender number and per account / Limites do provedor por número e por conta
+        self.rate_limiter = RateLimiter.from_env(self.provider.rate_limits)
+        self.throttle_retries = int(os.getenv('SMS_THROTTLE_RETRIES', '3'))
+        
+        # Transient failures are retried by the outbox with exponential backoff
+        # Falhas transitórias são repetidas pela fila de saída com backoff exponencial
+        self.max_attempts = int(os.getenv('SMS_DISPATCH_MAX_ATTEMPTS', '5'))
+        self.retry_backoff = float(os.getenv('SMS_RETRY_BACKOFF_SECONDS', '5'))
+        
+        # Statuses arrive through the webhook; poll only messages quiet for this long
+        # Status chegam pelo webhook; consulta apenas mensagens sem atualização por este tempo
+        self.status_stale_seconds = float(os.getenv('SMS_STATUS_STALE_SECONDS', '300'))
+        
+        # Coalesces and rate limits provider status fetches / Agrupa e limita consultas de status ao provedor
+        self.status_cache = StatusCache(ttl=self.status_stale_seconds)
+        
+        # Upper bound for batch status lookups / Limite para consultas de status em lote
+        self.status_batch_max_ids = int(os.getenv('SMS_STATUS_BATCH_MAX_IDS', '5000'))
+        
+        # Largest history page / Maior página de histórico
+        self.history_max_limit = int(os.getenv('SMS_HISTORY_MAX_LIMIT', '1000'))
+        
+        # Compiled SmsTemplate rows / Linhas SmsTemplate compiladas
+        self.template_cache = TemplateCache()
+        
+        # Idempotency keys and per-recipient dedupe keys / Chaves de idempotência e de deduplicação por destinatário
+        self.idempotency = IdempotencyStore()
+        
+        # Messages past the retention window live in monthly archive files / Mensagens após a janela de retenção ficam em arquivos mensais
+        self.archive = MessageArchiver()
+        
+        # Default transliteration of non GSM-7 text: off, auto or always / Transliteração padrão de texto fora do GSM-7: off, auto ou always
+        self.transliterate = default_transliterate_mode()
     
-    def send_sms(self, to_number, message, template_data=None):
+    def deliver_batch(self, records):
         """
-        Send a single SMS message
-        Envia uma única mensagem SMS
+        Send persisted SMS records through the provider and store the outcomes
+        Envia registros SMS persistidos pelo provedor e armazena os resultados
         
         Args:
-            to_number (str): Destination phone number / Número de telefone de destino
-            message (str): Message content / Conteúdo da mensagem
-            template_data (dict): Optional data for template substitution / Dados opcionais para substituição de template
-            
+            records (list): Objects with id, from_number, to_number, message, attempts and segments / Objetos com id, from_number, to_number, message, attempts e segments
+        
         Returns:
-            dict: Result with success status and message details / Resultado com status de sucesso e detalhes da mensagem
+            list: One result per record, in the same order / Um resultado por registro, na mesma ordem
         """
-        try:
-            # Process template data if provided / Processa dados do template se fornecidos
-            if template_data:
-                message = self._process_template(message, template_data)
-            
-            # Create SMS record in database / Cria registro SMS no banco de dados
-            sms_record = SmsMessage(
-                from_number=self.from_number,
-                to_number=to_number,
-                message=message,
-                status='pending'
+        outcomes = []
+        pending = []
+        
+        # Provider calls run concurrently; results come back in input order and are
+        # stored every batch_size records
+        # Chamadas ao provedor rodam em paralelo; resultados voltam na ordem de entrada
+        # e são armazenados a cada batch_size registros
+        for outcome in self._map_provider(records):
+            pending.append(outcome)
+            if len(pending) >= self.batch_size:
+                self._apply_results(pending)
+                outcomes.extend(pending)
+                pending = []
+        
+        self._apply_results(pending)
+        outcomes.extend(pending)
+        
+        return [outcome[0] for outcome in outcomes]
+    
+    def _map_provider(self, records):
+        """
+        Call the provider for each record with at most max_in_flight requests in flight
+        Chama o provedor para cada registro com no máximo max_in_flight requisições simultâneas
+        
+        Args:
+            records (list): Records to send / Registros a enviar
+        
+        Returns:
+            iterator: (result dict, raw provider response) tuples in input order / Tuplas na ordem de entrada
+        """
+        if self._executor is None or len(records) <= 1:
+            return map(self._send_via_provider, records)
+        
+        return self._executor.map(self._send_via_provider, records)
+    
+    def _insert_pending(self, phone_numbers, message, job_id=None, contacts=None, group_id=None):
+        """
+        Insert pending SMS rows with multi-row INSERT statements (caller commits)
+        Insere linhas SMS pendentes com INSERTs de múltiplas linhas (quem chama faz o commit)
+        
+        Args:
+            phone_numbers (list): Destination phone numbers in E.164 / Números de telefone de destino em E.164
+            message (str or list): Rendered message, or one per phone number / Mensagem renderizada, ou uma por número
+            job_id (int): Owning send job, if any / Job de envio dono, se houver
+            contacts (dict): RecipientContact by E.164 number / RecipientContact por número E.164
+            group_id (int): Originating group, if any / Grupo de origem, se houver
+        
+        Returns:
+            list: OutboundMessage tuples in the same order as phone_numbers / Tuplas OutboundMessage na mesma ordem de phone_numbers
+        """
+        contacts = contacts or {}
+        records = []
+        statement = db.insert(SmsMessage).returning(SmsMessage.id, sort_by_parameter_order=True)
+        messages = message if isinstance(message, list) else [message] * len(phone_numbers)
+        
+        for start in range(0, len(phone_numbers), self.batch_size):
+            rows = [
+                {
+                    'from_number': self.sender_pool.select(phone_number),
+                    'to_number': phone_number,
+                    'message': text,
+                    'encoding': info.encoding,
+                    'segments': info.segments,
+                    'status': 'pending',
+                    'job_id': job_id,
+                    'group_id': group_id,
+                    'contact_id': contacts[phone_number].id if phone_number in contacts else None,
+                    'contact_type': contacts[phone_number].contact_type if phone_number in contacts else None,
+                    'attempts': 0
+                }
+                for phone_number, text, info in zip(
+                    phone_numbers[start:start + self.batch_size],
+                    messages[start:start + self.batch_size],
+                    map(measure, messages[start:start + self.batch_size])
+                )
+            ]
+            ids = db.session.execute(statement, rows).scalars().all()
+            records.extend(
+                OutboundMessage(message_id, row['from_number'], row['to_number'], row['message'], 0, row['segments'])
+                for message_id, row in zip(ids, rows)
             )
-            db.session.add(sms_record)
-            db.session.commit()
+        
+        return records
+    
+    def _send_via_provider(self, record):
+        """
+        Call the provider for one record without touching the database
+        Chama o provedor para um registro sem acessar o banco de dados
+        
+        Args:
+            record: Object with id, from_number, to_number, message, attempts and segments / Objeto com id, from_number, to_number, message, attempts e segments
+        
+        Returns:
+            tuple: (result dict, raw provider response, retry time or None) / (dicionário de resultado, resposta bruta do provedor, horário de nova tentativa ou None)
+        """
+        throttled = 0
+        while True:
+            # Wait for the sender and account budget, counted in segments / Aguarda o limite do remetente e da conta, contado em segmentos
+            self.rate_limiter.acquire(record.from_number, self.provider.account_id, tokens=record.segments or 1)
             
-            # Send SMS via Twilio / Envia SMS via Twilio
-            if self.client:
-                try:
-                    twilio_message = self.client.messages.create(
-                        body=message,
-                        from_=self.from_number,
-                        to=to_number
-                    )
-                    
-                    # Update record with Twilio response / Atualiza registro com resposta do Twilio
-                    sms_record.provider_message_id = twilio_message.sid
-                    sms_record.status = 'sent'
-                    sms_record.provider_response = str(twilio_message.status)
-                    db.session.commit()
-                    
-                    return {
-                        'success': True,
-                        'message_id': sms_record.id,
-                        'provider_message_id': twilio_message.sid,
-                        'status': 'sent'
-                    }
-                    
-                except TwilioException as e:
-                    # Update record with error / Atualiza registro com erro
-                    sms_record.status = 'failed'
-                    sms_record.provider_response = str(e)
-                    db.session.commit()
-                    
+            try:
+                sent = self.provider.send(record.to_number, record.from_number, record.message)
+                
+                result = {
+                    'success': True,
+                    'message_id': record.id,
+                    'provider_message_id': sent.sid,
+                    'status': 'sent'
+                }
+                if self.provider.simulated:
+                    result['note'] = 'Simulated send - Twilio not configured'
+                return result, sent.status, None
+            
+            except ProviderError as e:
+                # Throttled requests are re-queued behind the limiter / Requisições limitadas voltam para a fila do limitador
+                if e.throttled and throttled < self.throttle_retries:
+                    throttled += 1
+                    self.rate_limiter.throttle(record.from_number, self.provider.account_id, seconds=throttled)
+                    continue
+                
+                # Transient errors go back to the outbox / Erros transitórios voltam para a fila de saída
+                if e.retryable and record.attempts < self.max_attempts:
+                    retry_at = datetime.utcnow() + timedelta(seconds=self.retry_backoff * 2 ** (record.attempts - 1))
                     return {
                         'success': False,
-                        'message_id': sms_record.id,
+                        'message_id': record.id,
                         'error': str(e),
-                        'status': 'failed'
-                    }
-            else:
-                # Simulate SMS sending for testing / Simula envio de SMS para testes
-                sms_record.status = 'sent'
-                sms_record.provider_message_id = f'sim_{sms_record.id}'
-                sms_record.provider_response = 'Simulated send - Twilio not configured'
-                db.session.commit()
+                        'status': 'pending',
+                        'retry_at': retry_at.isoformat()
+                    }, str(e), retry_at
                 
                 return {
-                    'success': True,
-                    'message_id': sms_record.id,
-                    'provider_message_id': f'sim_{sms_record.id}',
-                    'status': 'sent',
-                    'note': 'Simulated send - Twilio not configured'
-                }
-                
-        except Exception as e:
-            return {
-                'success': False,
-                'error': str(e),
-                'status': 'failed'
+                    'success': False,
+                    'message_id': record.id,
+                    'error': str(e),
+                    'status': 'failed'
+                }, str(e), None
+    
+    def _apply_results(self, outcomes):
+        """
+        Store provider results with one executemany UPDATE keyed by id
+        Armazena resultados do provedor com um único UPDATE executemany por id
+        
+        Args:
+            outcomes (list): Tuples returned by _send_via_provider / Tuplas retornadas por _send_via_provider
+        """
+        if not outcomes:
+            return
+        
+        now = datetime.utcnow()
+        db.session.execute(db.update(SmsMessage), [
+            {
+                'id': result['message_id'],
+                'status': result['status'],
+                'provider_message_id': result.get('provider_message_id'),
+                'provider_response': response,
+                'claim_token': None,
+                'next_attempt_at': retry_at,
+                'updated_at': now
             }
+            for result, response, retry_at in outcomes
+        ])
+        db.session.commit()
+    
+    def queue_sms(self, to_number, message, template_data=None, template_id=None, transliterate=None, idempotency_key=None):
+        """
+        Enqueue a single SMS in the outbox for background dispatch
+        Enfileira um único SMS na fila de saída para despacho em segundo plano
+        
+        Args:
+            to_number (str): Destination phone number / Número de telefone de destino
+            message (str): Message content / Conteúdo da mensagem
+            template_data (dict): Optional data for template substitution / Dados opcionais para substituição de template
+            template_id (int): Stored template used instead of message / Template armazenado usado no lugar de message
+            transliterate (str): off, auto or always; defaults to SMS_TRANSLITERATE / off, auto ou always; padrão SMS_TRANSLITERATE
+            idempotency_key (tuple): (scope, key) of the request's Idempotency-Key, linked to the job in the same transaction
+                                     (escopo, chave) da Idempotency-Key da requisição, ligada ao job na mesma transação
+        
+        Returns:
+            dict: Job and message identifiers / Identificadores do job e da mensagem
+        """
+        result = self.queue_bulk_sms(
+            [to_number], message, template_data,
+            job_type='single', template_id=template_id, transliterate=transliterate,
+            idempotency_key=idempotency_key
+        )
+        if result['success']:
+            result['message_id'] = result.pop('message_ids')[0]
+        return result
     
-    def send_bulk_sms(self, phone_numbers, message, template_data=None):
+    def queue_bulk_sms(self, phone_numbers, message, template_data=None, job_type='bulk', group_id=None,
+                       template_id=None, contacts=None, dedupe_keys=None, transliterate=None, idempotency_key=None):
         """
-        Send SMS to multiple phone numbers
-        Envia SMS para múltiplos números de telefone
+        Enqueue SMS to multiple phone numbers in the outbox as one job
+        Enfileira SMS para múltiplos números na fila de saída como um único job
         
         Args:
             phone_numbers (list): List of destination phone numbers / Lista de números de telefone de destino
             message (str): Message content / Conteúdo da mensagem
             template_data (dict): Optional data for template substitution / Dados opcionais para substituição de template
-            
+            job_type (str): single, bulk or group / single, bulk ou group
+            group_id (int): Originating group, if any / Grupo de origem, se houver
+            template_id (int): Stored template used instead of message / Template armazenado usado no lugar de message
+            contacts (dict): RecipientContact by E.164 number, looked up when omitted / RecipientContact por número E.164, buscados quando omitidos
+            dedupe_keys (list): Optional key per phone number; recipients whose key was already queued are skipped
+                                Chave opcional por número; destinatários cuja chave já foi enfileirada são ignorados
+            transliterate (str): off, auto or always; defaults to SMS_TRANSLITERATE / off, auto ou always; padrão SMS_TRANSLITERATE
+            idempotency_key (tuple): (scope, key) of the request's Idempotency-Key, linked to the job in the same transaction
+                                     (escopo, chave) da Idempotency-Key da requisição, ligada ao job na mesma transação
+        
         Returns:
-            dict: Result with success status and details for each message / Resultado com status de sucesso e detalhes para cada mensagem
+            dict: Job identifier and queued message ids / Identificador do job e ids das mensagens enfileiradas
+        """
+        for attempt in range(3):
+            try:
+                return self._enqueue_bulk(
+                    phone_numbers, message, template_data, job_type, group_id,
+                    template_id, contacts, dedupe_keys, transliterate, idempotency_key
+                )
+            
+            except db.exc.IntegrityError:
+                db.session.rollback()
+                # A concurrent request stored one of the dedupe keys first; look them up again
+                # Uma requisição concorrente gravou uma das chaves de deduplicação antes; busca novamente
+                if dedupe_keys and attempt < 2:
+                    continue
+                return {
+                    'success': False,
+                    'error': 'A concurrent request is queueing the same dedupe keys, retry the request'
+                }
+            
+            except Exception as e:
+                db.session.rollback()
+                return {
+                    'success': False,
+                    'error': str(e)
+                }
+    
+    def _enqueue_bulk(self, phone_numbers, message, template_data, job_type, group_id,
+                      template_id, contacts, dedupe_keys, transliterate, idempotency_key):
+        """
+        One attempt of queue_bulk_sms; raises on failure (caller rolls back)
+        Uma tentativa de queue_bulk_sms; lança exceção em caso de falha (quem chama faz o rollback)
         """
-        results = []
+        phone_numbers = self._normalize_recipients(phone_numbers)
         
-        for phone_number in phone_numbers:
-            result = self.send_sms(phone_number, message, template_data)
-            results.append({
-                'phone_number': phone_number,
-                'result': result
-            })
+        duplicates = []
+        if dedupe_keys:
+            phone_numbers, dedupe_keys, duplicates = self._drop_duplicates(phone_numbers, dedupe_keys)
+            if not phone_numbers:
+                return {
+                    'success': True,
+                    'job_id': None,
+                    'status': 'duplicate',
+                    'total_queued': 0,
+                    'total_segments': 0,
+                    'message_ids': [],
+                    'duplicates': duplicates
+                }
         
-        # Calculate summary / Calcula resumo
-        successful = sum(1 for r in results if r['result']['success'])
-        failed = len(results) - successful
+        if contacts is None:
+            contacts = self._recipient_contacts(phone_numbers)
         
-        return {
-            'success': failed == 0,
-            'total_sent': len(phone_numbers),
-            'successful': successful,
-            'failed': failed,
-            'results': results
+        # Render and validate every message before writing anything
+        # Renderiza e valida todas as mensagens antes de gravar qualquer coisa
+        message = self._render_messages(phone_numbers, message, template_data, template_id, contacts)
+        message = self._optimize_encoding(message, transliterate)
+        
+        # Create job and pending outbox rows in one transaction
+        # Cria job e linhas pendentes da fila de saída em uma única transação
+        job = SmsJob(job_type=job_type, group_id=group_id, total=len(phone_numbers))
+        db.session.add(job)
+        db.session.flush()
+        if idempotency_key:
+            self.idempotency.link_job(*idempotency_key, job.id)
+        
+        records = self._insert_pending(phone_numbers, message, job_id=job.id, contacts=contacts, group_id=group_id)
+        if dedupe_keys:
+            queued = {key: record.id for key, record in zip(dedupe_keys, records) if key}
+            self.idempotency.remember_recipients(list(queued.items()))
+            
+            # Repeats within this request point at the message just queued
+            # Repetições dentro desta requisição apontam para a mensagem recém enfileirada
+            for duplicate in duplicates:
+                if duplicate['message_id'] is None:
+                    duplicate['message_id'] = queued.get(duplicate['dedupe_key'])
+        db.session.commit()
+        
+        result = {
+            'success': True,
+            'job_id': job.id,
+            'status': 'queued',
+            'total_queued': len(records),
+            'total_segments': sum(record.segments for record in records),
+            'message_ids': [record.id for record in records]
         }
+        if duplicates:
+            result['duplicates'] = duplicates
+        
+        return result
     
-    def send_group_sms(self, group_id, message, template_data=None):
+    def queue_group_sms(self, group_id, message, template_data=None, template_id=None, transliterate=None, notify=None,
+                        idempotency_key=None):
         """
-        Send SMS to all contacts in a group
-        Envia SMS para todos os contatos de um grupo
+        Enqueue SMS to all active contacts in a group
+        Enfileira SMS para todos os contatos ativos de um grupo
+        
+        Members are read and queued in chunks of group_chunk_size, each chunk in its
+        own transaction, so memory does not grow with the group and dispatch starts
+        while later chunks are still being queued. The template is validated against
+        every member before the first chunk is written.
+        Membros são lidos e enfileirados em blocos de group_chunk_size, cada bloco em
+        sua própria transação, então a memória não cresce com o grupo e o despacho
+        começa enquanto os blocos seguintes ainda estão sendo enfileirados. O template
+        é validado para todos os membros antes de gravar o primeiro bloco.
         
         Args:
             group_id (int): ID of the contact group / ID do grupo de contatos
             message (str): Message content / Conteúdo da mensagem
             template_data (dict): Optional data for template substitution / Dados opcionais para substituição de template
-            
+            template_id (int): Stored template used instead of message / Template armazenado usado no lugar de message
+            transliterate (str): off, auto or always; defaults to SMS_TRANSLITERATE / off, auto ou always; padrão SMS_TRANSLITERATE
+            notify (callable): Called after each committed chunk (e.g. dispatcher.notify) / Chamado após cada bloco confirmado (ex. dispatcher.notify)
+            idempotency_key (tuple): (scope, key) of the request's Idempotency-Key, linked to the job in the same transaction
+                                     (escopo, chave) da Idempotency-Key da requisição, ligada ao job na mesma transação
+        
         Returns:
-            dict: Result with success status and details / Resultado com status de sucesso e detalhes
+            dict: Job identifier and summary counts, without per-recipient ids / Identificador do job e contagens resumidas, sem ids por destinatário
         """
-        from src.models.sms import ContactGroup
-        
+        job_id = None
+        summary = {'total_queued': 0, 'total_segments': 0, 'chunks': 0}
         try:
-            # Get group and its contacts / Obtém grupo e seus contatos
             group = ContactGroup.query.get(group_id)
             if not group:
                 return {
@@ -171,24 +482,172 @@ class SmsService:
                     'success': False,
                     'error': f'Group {group.name} is not active'
                 }
+            group_name = group.name
             
-            # Get active contacts from the group / Obtém contatos ativos do grupo
-            active_contacts = [contact for contact in group.contacts if contact.active]
-            phone_numbers = [contact.phone_number for contact in active_contacts]
+            self._check_group_template(group_id, message, template_data, template_id)
             
-            if not phone_numbers:
+            job = SmsJob(job_type='group', group_id=group_id, total=0)
+            db.session.add(job)
+            db.session.flush()
+            job_id = job.id
+            if idempotency_key:
+                # Committed with the first chunk / Confirmado junto com o primeiro bloco
+                self.idempotency.link_job(*idempotency_key, job_id)
+            
+            for contacts in self._iter_group_recipients(group_id):
+                phone_numbers = list(contacts)
+                texts = self._render_messages(phone_numbers, message, template_data, template_id, contacts)
+                texts = self._optimize_encoding(texts, transliterate)
+                
+                records = self._insert_pending(phone_numbers, texts, job_id=job_id, contacts=contacts, group_id=group_id)
+                summary['total_queued'] += len(records)
+                summary['total_segments'] += sum(record.segments for record in records)
+                summary['chunks'] += 1
+                
+                db.session.execute(db.update(SmsJob).where(SmsJob.id == job_id).values(total=summary['total_queued']))
+                db.session.commit()
+                if notify:
+                    notify()
+            
+            if not summary['total_queued']:
+                db.session.rollback()
                 return {
                     'success': False,
-                    'error': f'No active contacts found in group {group.name}'
+                    'error': f'No active contacts found in group {group_name}'
                 }
             
-            # Send bulk SMS / Envia SMS em massa
-            result = self.send_bulk_sms(phone_numbers, message, template_data)
-            result['group_name'] = group.name
-            result['group_id'] = group_id
-            
+            return {
+                'success': True,
+                'job_id': job_id,
+                'status': 'queued',
+                'group_id': group_id,
+                'group_name': group_name,
+                **summary
+            }
+        
+        except Exception as e:
+            db.session.rollback()
+            result = {
+                'success': False,
+                'error': str(e)
+            }
+            # Chunks committed before the failure stay queued / Blocos confirmados antes da falha continuam enfileirados
+            if summary['chunks']:
+                result.update(job_id=job_id, status='partial', **summary)
             return result
+    
+    def _drop_duplicates(self, phone_numbers, dedupe_keys):
+        """
+        Remove recipients whose dedupe key was already queued, here or in an earlier request
+        Remove destinatários cuja chave de deduplicação já foi enfileirada, aqui ou numa requisição anterior
+        
+        Returns:
+            tuple: (phone numbers, dedupe keys, duplicates) / (números, chaves de deduplicação, duplicados)
+        """
+        queued = self.idempotency.find_recipients([key for key in dedupe_keys if key])
+        
+        kept_numbers, kept_keys, duplicates = [], [], []
+        seen = set()
+        for phone_number, key in zip(phone_numbers, dedupe_keys):
+            if key and (key in queued or key in seen):
+                duplicates.append({
+                    'phone_number': phone_number,
+                    'dedupe_key': key,
+                    'message_id': queued.get(key)
+                })
+                continue
+            
+            if key:
+                seen.add(key)
+            kept_numbers.append(phone_number)
+            kept_keys.append(key)
+        
+        return kept_numbers, kept_keys, duplicates
+    
+    def preview_template(self, template_id, template_data=None, transliterate=None):
+        """
+        Render a stored template and report its encoding and segment count
+        Renderiza um template armazenado e informa sua codificação e número de segmentos
+        
+        Without data for every placeholder the fixed template text is measured instead.
+        Sem dados para todos os placeholders, o texto fixo do template é medido.
+        
+        Args:
+            template_id (int): Template to preview / Template a visualizar
+            template_data (dict): Values for the placeholders / Valores para os placeholders
+            transliterate (str): off, auto or always; defaults to SMS_TRANSLITERATE / off, auto ou always; padrão SMS_TRANSLITERATE
+        
+        Returns:
+            dict: Original and transliterated text with their segments, and the text that would be sent
+                  Texto original e transliterado com seus segmentos, e o texto que seria enviado
+        """
+        template = SmsTemplate.query.get(template_id)
+        if not template:
+            return {
+                'success': False,
+                'error': f'Template with ID {template_id} not found'
+            }
+        
+        template_data = template_data or {}
+        compiled = self.template_cache.get(template)
+        missing = compiled.missing(template_data)
+        message = template.template if missing else self._render(compiled, template_data)
+        mode = transliterate or self.transliterate
+        
+        def describe(text):
+            info = measure(text)
+            return {
+                'message': text,
+                'encoding': info.encoding,
+                'segments': info.segments,
+                'length': info.length,
+                'per_segment': info.per_segment,
+                'non_gsm_characters': list(info.non_gsm)
+            }
+        
+        return {
+            'success': True,
+            'template_id': template.id,
+            'rendered': not missing,
+            'missing': missing,
+            'transliterate': mode,
+            'original': describe(message),
+            'transliterated': describe(transliterate_text(message)),
+            'send': describe(optimize_encoding(message, mode))
+        }
+    
+    def get_job_status(self, job_id):
+        """
+        Get progress of a queued send job
+        Obtém o progresso de um job de envio enfileirado
+        
+        Reads sms_message only; archived messages are not included.
+        Lê apenas sms_message; mensagens arquivadas não são incluídas.
+        
+        Args:
+            job_id (int): ID of the send job / ID do job de envio
+        
+        Returns:
+            dict: Job details with message counts by status / Detalhes do job com contagem de mensagens por status
+        """
+        try:
+            job = SmsJob.query.get(job_id)
+            if not job:
+                return {
+                    'success': False,
+                    'error': f'Job with ID {job_id} not found'
+                }
+            
+            rows = db.session.query(SmsMessage.status, db.func.count(SmsMessage.id)) \
+                .filter(SmsMessage.job_id == job_id) \
+                .group_by(SmsMessage.status) \
+                .all()
             
+            return {
+                'success': True,
+                'job': job.to_dict(status_counts={status: count for status, count in rows})
+            }
+        
         except Exception as e:
             return {
                 'success': False,
@@ -200,9 +659,12 @@ class SmsService:
         Get the status of a specific message
         Obtém o status de uma mensagem específica
         
+        Reads sms_message only; archived messages are not included.
+        Lê apenas sms_message; mensagens arquivadas não são incluídas.
+        
         Args:
             message_id (int): ID of the SMS message / ID da mensagem SMS
-            
+        
         Returns:
             dict: Message status and details / Status da mensagem e detalhes
         """
@@ -214,98 +676,616 @@ class SmsService:
                     'error': f'Message with ID {message_id} not found'
                 }
             
-            # If we have a Twilio message ID, try to get updated status
-            # Se temos um ID de mensagem Twilio, tenta obter status atualizado
-            if self.client and sms_record.provider_message_id and not sms_record.provider_message_id.startswith('sim_'):
+            # Delivery receipts normally arrive through the status webhook; only poll the
+            # provider for non-terminal messages that have not been updated recently
+            # Confirmações de entrega normalmente chegam pelo webhook de status; só consulta
+            # o provedor para mensagens não finais que não foram atualizadas recentemente
+            if self._needs_status_poll(sms_record):
                 try:
-                    twilio_message = self.client.messages(sms_record.provider_message_id).fetch()
+                    provider_status = self.status_cache.fetch(
+                        sms_record.provider_message_id, self.provider.fetch_status
+                    )
                     
-                    # Update status if it has changed / Atualiza status se mudou
-                    if twilio_message.status != sms_record.status:
-                        sms_record.status = twilio_message.status
-                        sms_record.updated_at = datetime.utcnow()
-                        db.session.commit()
-                        
-                except TwilioException:
-                    # If we can't fetch from Twilio, just return what we have
-                    # Se não conseguimos buscar do Twilio, apenas retorna o que temos
+                    # Update status if it moved forward / Atualiza status se avançou
+                    if STATUS_RANK.get(provider_status, -1) > STATUS_RANK.get(sms_record.status, -1):
+                        sms_record.status = provider_status
+                    sms_record.updated_at = datetime.utcnow()
+                    db.session.commit()
+                
+                except ProviderError:
+                    # If we can't fetch from the provider, just return what we have
+                    # Se não conseguimos buscar do provedor, apenas retorna o que temos
                     pass
             
             return {
                 'success': True,
                 'message': sms_record.to_dict()
             }
+        
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def get_message_statuses(self, message_ids=None, job_id=None, limit=None, after_id=None):
+        """
+        Get the status of many messages with a single query
+        Obtém o status de muitas mensagens com uma única consulta
+        
+        Reads sms_message only; archived messages are not included. Messages of a
+        job are returned in pages of at most status_batch_max_ids, ordered by id;
+        pass next_after_id back as after_id to get the next page. The summary
+        always counts the whole job.
+        Lê apenas sms_message; mensagens arquivadas não são incluídas. Mensagens de
+        um job são retornadas em páginas de no máximo status_batch_max_ids, ordenadas
+        por id; passe next_after_id de volta como after_id para obter a próxima
+        página. O resumo sempre conta o job inteiro.
+        
+        Args:
+            message_ids (list): IDs of the SMS messages / IDs das mensagens SMS
+            job_id (int): Send job whose messages are returned / Job de envio cujas mensagens são retornadas
+            limit (int): Page size for job_id / Tamanho da página para job_id
+            after_id (int): Return job messages with a greater id / Retorna mensagens do job com id maior
+        
+        Returns:
+            dict: Statuses plus counts by status / Status mais contagem por status
+        """
+        try:
+            if not message_ids and job_id is None:
+                return {
+                    'success': False,
+                    'error': 'message_ids or job_id is required'
+                }
+            
+            if message_ids and len(message_ids) > self.status_batch_max_ids:
+                return {
+                    'success': False,
+                    'error': f'At most {self.status_batch_max_ids} message ids per request'
+                }
+            
+            # Read only the columns needed / Lê apenas as colunas necessárias
+            query = db.session.query(
+                SmsMessage.id, SmsMessage.to_number, SmsMessage.status,
+                SmsMessage.provider_message_id, SmsMessage.updated_at
+            )
+            if job_id is not None:
+                query = query.filter(SmsMessage.job_id == job_id)
+            if message_ids:
+                query = query.filter(SmsMessage.id.in_(message_ids))
+            
+            # Job pages use the (job_id, id) index / Páginas do job usam o índice (job_id, id)
+            page_size = None
+            if not message_ids:
+                page_size = min(limit or self.status_batch_max_ids, self.status_batch_max_ids)
+                if after_id is not None:
+                    query = query.filter(SmsMessage.id > after_id)
+                query = query.order_by(SmsMessage.id).limit(page_size + 1)
+            else:
+                query = query.order_by(SmsMessage.id)
+            
+            messages = []
+            counts = {}
+            for row in query.all():
+                messages.append({
+                    'id': row.id,
+                    'to_number': row.to_number,
+                    'status': row.status,
+                    'provider_message_id': row.provider_message_id,
+                    'updated_at': row.updated_at.isoformat() if row.updated_at else None
+                })
+                counts[row.status] = counts.get(row.status, 0) + 1
+            
+            result = {
+                'success': True,
+                'messages': messages,
+                'summary': {
+                    'total': len(messages),
+                    'status_counts': counts
+                }
+            }
             
+            if page_size is not None:
+                has_more = len(messages) > page_size
+                del messages[page_size:]
+                
+                # Count the whole job in SQL / Conta o job inteiro no SQL
+                rows = db.session.query(SmsMessage.status, db.func.count(SmsMessage.id)) \
+                    .filter(SmsMessage.job_id == job_id) \
+                    .group_by(SmsMessage.status) \
+                    .all()
+                counts = {status: count for status, count in rows}
+                
+                result['summary'] = {
+                    'total': sum(counts.values()),
+                    'status_counts': counts
+                }
+                result['has_more'] = has_more
+                result['next_after_id'] = messages[-1]['id'] if has_more else None
+            
+            if message_ids:
+                found = {message['id'] for message in messages}
+                result['not_found'] = [message_id for message_id in message_ids if message_id not in found]
+            
+            return result
+        
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e)
             }
     
-    def get_message_history(self, limit=100, offset=0, contact_type=None):
+    def _needs_status_poll(self, sms_record):
+        """
+        Check if a message status is worth fetching from the provider
+        Verifica se vale a pena buscar o status de uma mensagem no provedor
+        """
+        if not sms_record.provider_message_id or sms_record.status in TERMINAL_STATUSES:
+            return False
+        
+        updated_at = sms_record.updated_at or sms_record.created_at
+        return updated_at is None or (datetime.utcnow() - updated_at).total_seconds() >= self.status_stale_seconds
+    
+    def get_message_history(self, limit=100, offset=0, contact_type=None, cursor=None, total_mode=None,
+                            group_id=None, job_id=None, include_archived=False):
         """
         Get SMS message history
         Obtém histórico de mensagens SMS
         
+        Pages are ordered by (created_at, id) descending. Passing the next_cursor of
+        the previous page seeks directly to the following rows through the
+        (created_at, id) index, so every page costs the same as the first one.
+        As páginas são ordenadas por (created_at, id) decrescente. Passar o next_cursor
+        da página anterior busca diretamente as linhas seguintes pelo índice
+        (created_at, id), então cada página custa o mesmo que a primeira.
+        
         Args:
             limit (int): Maximum number of messages to return / Número máximo de mensagens para retornar
-            offset (int): Number of messages to skip / Número de mensagens para pular
+            offset (int): Number of messages to skip (ignored with cursor) / Número de mensagens para pular (ignorado com cursor)
             contact_type (str): Filter by contact type (client, employee) / Filtrar por tipo de contato (client, employee)
-            
+            cursor (str): Opaque cursor from a previous page / Cursor opaco de uma página anterior
+            total_mode (str): exact, estimate or none; defaults to exact for offset pages and none for cursor pages / exact, estimate ou none; padrão exact para páginas com offset e none para páginas com cursor
+            group_id (int): Filter by originating group / Filtrar por grupo de origem
+            job_id (int): Filter by send job / Filtrar por job de envio
+            include_archived (bool): Merge archived messages into the pages (cursor pages only) / Mescla mensagens arquivadas nas páginas (apenas páginas com cursor)
+        
         Returns:
             dict: List of messages and pagination info / Lista de mensagens e informações de paginação
         """
         try:
-            query = SmsMessage.query.order_by(SmsMessage.created_at.desc())
+            if total_mode is None:
+                total_mode = 'none' if cursor else 'exact'
+            if total_mode not in ('exact', 'estimate', 'none'):
+                return {
+                    'success': False,
+                    'error': f'Invalid total mode: {total_mode}'
+                }
+            if include_archived and offset and not cursor:
+                return {
+                    'success': False,
+                    'error': 'include_archived requires cursor pagination'
+                }
             
-            # Apply filters if needed / Aplica filtros se necessário
+            query = SmsMessage.query.order_by(SmsMessage.created_at.desc(), SmsMessage.id.desc())
+            
+            # Apply filters if needed; recorded at send time, so no join is needed
+            # Aplica filtros se necessário; registrados no envio, então não é preciso join
             if contact_type:
-                from src.models.sms import Contact
-                query = query.join(Contact, SmsMessage.to_number == Contact.phone_number)
-                query = query.filter(Contact.contact_type == contact_type)
+                query = query.filter(SmsMessage.contact_type == contact_type)
+            if group_id is not None:
+                query = query.filter(SmsMessage.group_id == group_id)
+            if job_id is not None:
+                query = query.filter(SmsMessage.job_id == job_id)
+            
+            filtered_query = query
             
             # Apply pagination / Aplica paginação
-            total = query.count()
-            messages = query.offset(offset).limit(limit).all()
+            position = None
+            if cursor:
+                try:
+                    created_at, message_id = decode_history_cursor(cursor)
+                except ValueError:
+                    return {
+                        'success': False,
+                        'error': 'Invalid cursor'
+                    }
+                
+                position = (created_at, message_id)
+                query = query.filter(db.or_(
+                    SmsMessage.created_at < created_at,
+                    db.and_(SmsMessage.created_at == created_at, SmsMessage.id < message_id)
+                ))
+            elif offset:
+                query = query.offset(offset)
+            
+            # Fetch one extra row to know if there is a next page / Busca uma linha extra para saber se há próxima página
+            messages = query.limit(limit + 1).all()
+            
+            # Merge archived messages unless the whole page is newer than the archive
+            # Mescla mensagens arquivadas a menos que a página inteira seja mais recente que o arquivo
+            if include_archived:
+                newest_archived = self.archive.newest_created_at()
+                if newest_archived and (len(messages) <= limit or messages[limit].created_at <= newest_archived):
+                    archived, _ = self.archive.history_page(
+                        before=position,
+                        limit=limit + 1,
+                        contact_type=contact_type,
+                        group_id=group_id,
+                        job_id=job_id
+                    )
+                    messages.extend(SmsMessage(**record) for record in archived)
+                    messages.sort(key=lambda msg: (msg.created_at, msg.id), reverse=True)
+            
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+            
+            pagination = {
+                'limit': limit,
+                'has_more': has_more,
+                'next_cursor': encode_history_cursor(messages[-1]) if has_more else None
+            }
+            if not cursor:
+                pagination['offset'] = offset
+            
+            filtered = contact_type or group_id is not None or job_id is not None
+            if total_mode == 'exact':
+                pagination['total'] = filtered_query.order_by(None).count()
+                if include_archived:
+                    pagination['total'] += self.archive.count(contact_type=contact_type, group_id=group_id, job_id=job_id)
+            elif total_mode == 'estimate':
+                pagination['total_estimate'] = self._estimate_history_total(filtered)
+                if include_archived and pagination['total_estimate'] is not None:
+                    pagination['total_estimate'] += self.archive.count()
             
             return {
                 'success': True,
                 'messages': [msg.to_dict() for msg in messages],
-                'pagination': {
-                    'total': total,
-                    'limit': limit,
-                    'offset': offset,
-                    'has_more': offset + limit < total
-                }
+                'pagination': pagination
             }
-            
+        
         except Exception as e:
             return {
                 'success': False,
                 'error': str(e)
             }
     
-    def _process_template(self, message, template_data):
+    def export_messages(self, start=None, end=None, statuses=None, contact_type=None, group_id=None, job_id=None,
+                        include_archived=True):
+        """
+        Iterate over message history for export, oldest first
+        Percorre o histórico de mensagens para exportação, do mais antigo ao mais recente
+        
+        Rows are fetched in chunks of batch_size (yield_per) as the caller consumes
+        them, so memory does not grow with the size of the export.
+        As linhas são buscadas em blocos de batch_size (yield_per) conforme quem chama
+        as consome, então a memória não cresce com o tamanho da exportação.
+        Archived months overlapping the range are read in step with the table rows.
+        Meses arquivados que se sobrepõem ao intervalo são lidos junto com as linhas da tabela.
+        
+        Args:
+            start (datetime): Include messages created at or after / Inclui mensagens criadas a partir de
+            end (datetime): Include messages created before / Inclui mensagens criadas antes de
+            statuses (list): Only these statuses / Apenas estes status
+            contact_type (str): Filter by contact type (client, employee) / Filtrar por tipo de contato (client, employee)
+            group_id (int): Filter by originating group / Filtrar por grupo de origem
+            job_id (int): Filter by send job / Filtrar por job de envio
+            include_archived (bool): Include archived messages / Inclui mensagens arquivadas
+        
+        Returns:
+            generator: One dict per message with EXPORT_FIELDS / Um dict por mensagem com EXPORT_FIELDS
+        """
+        statement = db.select(*[getattr(SmsMessage, field) for field in EXPORT_FIELDS])
+        
+        if start:
+            statement = statement.where(SmsMessage.created_at >= start)
+        if end:
+            statement = statement.where(SmsMessage.created_at < end)
+        if statuses:
+            statement = statement.where(SmsMessage.status.in_(statuses))
+        if contact_type:
+            statement = statement.where(SmsMessage.contact_type == contact_type)
+        if group_id is not None:
+            statement = statement.where(SmsMessage.group_id == group_id)
+        if job_id is not None:
+            statement = statement.where(SmsMessage.job_id == job_id)
+        
+        statement = statement.order_by(SmsMessage.created_at, SmsMessage.id) \
+            .execution_options(yield_per=self.batch_size)
+        
+        records = (row._asdict() for row in db.session.execute(statement))
+        if include_archived:
+            # Messages still in flight stay in sms_message past the retention window, so merge by position
+            # Mensagens ainda em andamento ficam em sms_message após a janela de retenção, então mescla pela posição
+            archived = self.archive.iter_messages(
+                start=start,
+                end=end,
+                statuses=statuses,
+                contact_type=contact_type,
+                group_id=group_id,
+                job_id=job_id
+            )
+            records = heapq.merge(archived, records, key=lambda record: (record['created_at'], record['id']))
+        
+        for record in records:
+            yield self._export_row(record)
+    
+    def _export_row(self, record):
+        """
+        Pick EXPORT_FIELDS from a message record / Seleciona EXPORT_FIELDS de um registro de mensagem
+        """
+        row = {field: record.get(field) for field in EXPORT_FIELDS}
+        for field in ('created_at', 'updated_at'):
+            if row[field]:
+                row[field] = row[field].isoformat()
+        return row
+    
+    def _estimate_history_total(self, filtered=False):
+        """
+        Cheap row count estimate from the primary key range
+        Estimativa barata de linhas a partir do intervalo da chave primária
+        
+        Args:
+            filtered (bool): Whether the history is filtered / Se o histórico está filtrado
+        
+        Returns:
+            int: Estimated total, or None when filters prevent an estimate / Total estimado, ou None quando filtros impedem a estimativa
+        """
+        if filtered:
+            return None
+        
+        lowest, highest = db.session.query(db.func.min(SmsMessage.id), db.func.max(SmsMessage.id)).one()
+        if lowest is None:
+            return 0
+        return highest - lowest + 1
+    
+    def _render_messages(self, phone_numbers, message, template_data=None, template_id=None, contacts=None):
         """
-        Process template placeholders in message
-        Processa placeholders de template na mensagem
+        Build the message text for each recipient from raw text or a stored template
+        Monta o texto da mensagem de cada destinatário a partir de texto avulso ou de um template armazenado
+        
+        Placeholders named after CONTACT_FIELDS are filled per recipient from the
+        matching contact; request-level template_data supplies every other value
+        and the defaults for contacts without that field.
+        Placeholders com nomes de CONTACT_FIELDS são preenchidos por destinatário a
+        partir do contato correspondente; template_data da requisição fornece os
+        demais valores e os padrões para contatos sem aquele campo.
         
         Args:
-            message (str): Message with placeholders / Mensagem com placeholders
+            phone_numbers (list): Destination phone numbers / Números de telefone de destino
+            message (str): Message content / Conteúdo da mensagem
             template_data (dict): Data to substitute / Dados para substituir
-            
+            template_id (int): Stored template used instead of message / Template armazenado usado no lugar de message
+            contacts (dict): RecipientContact by E.164 number, looked up when omitted / RecipientContact por número E.164, buscados quando omitidos
+        
         Returns:
-            str: Processed message / Mensagem processada
+            str or list: One message for all recipients, or one per phone number / Uma mensagem para todos, ou uma por número
+        
+        Raises:
+            ValueError: If the template is unknown, malformed or data is missing
+                        Se o template for desconhecido, inválido ou faltarem dados
         """
-        try:
-            return message.format(**template_data)
-        except KeyError as e:
-            # If a placeholder is missing, return the original message
-            # Se um placeholder está faltando, retorna a mensagem original
-            print(f"Warning: Template placeholder {e} not found in data")
+        template_data = template_data or {}
+        compiled = self._compile_message(message, template_data, template_id)
+        if compiled is None:
             return message
-        except Exception:
-            # If any other error occurs, return the original message
-            # Se qualquer outro erro ocorre, retorna a mensagem original
+        
+        personal = compiled.placeholders & set(CONTACT_FIELDS)
+        if not personal:
+            return self._render(compiled, template_data)
+        
+        missing = [name for name in compiled.missing(template_data) if name not in personal]
+        if missing:
+            raise ValueError(f"Missing template data: {', '.join(missing)}")
+        
+        if contacts is None:
+            contacts = self._recipient_contacts(phone_numbers)
+        
+        messages = []
+        incomplete = {}
+        for phone_number in phone_numbers:
+            data = dict(template_data)
+            contact = contacts.get(phone_number)
+            if contact:
+                for name in CONTACT_FIELDS:
+                    value = getattr(contact, name)
+                    if value is not None:
+                        data[name] = value
+            
+            for name in compiled.missing(data):
+                incomplete[name] = incomplete.get(name, 0) + 1
+            if not incomplete:
+                messages.append(self._render(compiled, data))
+        
+        if incomplete:
+            details = ', '.join(f'{name} ({count} recipients)' for name, count in sorted(incomplete.items()))
+            raise ValueError(f'Missing template data: {details}')
+        
+        return messages
+    
+    def _compile_message(self, message, template_data=None, template_id=None):
+        """
+        Compiled template for a send, or None when message is plain text
+        Template compilado para um envio, ou None quando message é texto simples
+        
+        Raises:
+            ValueError: If the template is unknown or malformed / Se o template for desconhecido ou inválido
+        """
+        if template_id is not None:
+            template = SmsTemplate.query.get(template_id)
+            if not template or not template.active:
+                raise ValueError(f'Template with ID {template_id} not found')
+            return self.template_cache.get(template)
+        
+        if template_data:
+            return compile_template(message)
+        
+        # Plain text is only treated as a template when it uses contact fields
+        # Texto simples só é tratado como template quando usa campos do contato
+        try:
+            compiled = compile_template(message)
+        except ValueError:
+            return None
+        return compiled if compiled.placeholders & set(CONTACT_FIELDS) else None
+    
+    def _normalize_recipients(self, phone_numbers):
+        """
+        Convert destination numbers to E.164 / Converte números de destino para E.164
+        
+        Raises:
+            ValueError: If any number is not a valid phone number / Se algum número não for um telefone válido
+        """
+        normalized = [normalize_phone(phone_number) for phone_number in phone_numbers]
+        
+        invalid = [phone_number for phone_number, e164 in zip(phone_numbers, normalized) if e164 is None]
+        if invalid:
+            shown = ', '.join(str(phone_number) for phone_number in invalid[:10])
+            more = f' and {len(invalid) - 10} more' if len(invalid) > 10 else ''
+            raise ValueError(f'Invalid phone numbers: {shown}{more}')
+        
+        return normalized
+    
+    def _recipient_contacts(self, phone_numbers):
+        """
+        Match E.164 numbers to contacts (column-only queries)
+        Associa números E.164 a contatos (consultas apenas de colunas)
+        
+        When several contacts share a number, the newest active one is used.
+        Quando vários contatos compartilham um número, o ativo mais recente é usado.
+        
+        Returns:
+            dict: RecipientContact by E.164 number / RecipientContact por número E.164
+        """
+        columns = [getattr(Contact, name) for name in RecipientContact._fields]
+        unique_numbers = list(dict.fromkeys(phone_numbers))
+        
+        contacts = {}
+        for start in range(0, len(unique_numbers), self.batch_size):
+            rows = db.session.query(Contact.phone_e164, *columns) \
+                .filter(Contact.phone_e164.in_(unique_numbers[start:start + self.batch_size])) \
+                .order_by(Contact.active, Contact.id) \
+                .all()
+            for phone_number, *fields in rows:
+                contacts[phone_number] = RecipientContact(*fields)
+        
+        return contacts
+    
+    def _iter_group_recipients(self, group_id):
+        """
+        Stream the active members of a group in chunks with column-only keyset queries
+        Percorre os membros ativos de um grupo em blocos com consultas por chave apenas de colunas
+        
+        Members are read newest first and deduplicated in SQL: a member is skipped when a
+        newer active member of the group has the same number, so only one chunk is held
+        in memory. Members without a valid phone number are left out.
+        Membros são lidos do mais recente ao mais antigo e deduplicados em SQL: um membro é
+        ignorado quando um membro ativo mais recente do grupo tem o mesmo número, então
+        apenas um bloco fica em memória. Membros sem um número válido são deixados de fora.
+        
+        Returns:
+            generator: Dicts of RecipientContact by E.164 number, at most group_chunk_size each
+                       Dicts de RecipientContact por número E.164, com no máximo group_chunk_size cada
+        """
+        # Looked up through the phone_e164 index, then the membership primary key
+        # Buscado pelo índice de phone_e164 e depois pela chave primária de membros
+        newer = db.aliased(Contact)
+        newer_members = contact_group_members.alias()
+        newer_is_member = db.exists().where(
+            newer_members.c.contact_id == newer.id,
+            newer_members.c.group_id == group_id
+        )
+        newer_duplicate = db.exists().where(
+            newer.phone_e164 == Contact.phone_e164,
+            newer.id > Contact.id,
+            newer.active == True,
+            newer_is_member
+        )
+        
+        member_id = contact_group_members.c.contact_id
+        columns = [getattr(Contact, name) for name in RecipientContact._fields]
+        query = db.session.query(Contact.phone_e164, *columns) \
+            .join(contact_group_members, member_id == Contact.id) \
+            .filter(contact_group_members.c.group_id == group_id, Contact.active == True) \
+            .filter(Contact.phone_e164.isnot(None), ~newer_duplicate) \
+            .order_by(member_id.desc())
+        
+        last_id = None
+        while True:
+            page = query if last_id is None else query.filter(member_id < last_id)
+            rows = page.limit(self.group_chunk_size).all()
+            if not rows:
+                return
+            last_id = rows[-1].id
+            
+            yield {phone_number: RecipientContact(*fields) for phone_number, *fields in rows}
+            
+            if len(rows) < self.group_chunk_size:
+                return
+    
+    def _check_group_template(self, group_id, message, template_data=None, template_id=None):
+        """
+        Validate a group send before any chunk is written, counting members without
+        the contact fields the template needs in SQL
+        Valida um envio para grupo antes de gravar qualquer bloco, contando em SQL os
+        membros sem os campos do contato que o template exige
+        
+        Raises:
+            ValueError: If the template is unknown, malformed or data is missing
+                        Se o template for desconhecido, inválido ou faltarem dados
+        """
+        template_data = template_data or {}
+        compiled = self._compile_message(message, template_data, template_id)
+        if compiled is None:
+            return
+        
+        personal = compiled.placeholders & set(CONTACT_FIELDS)
+        missing = [name for name in compiled.missing(template_data) if name not in personal]
+        if missing:
+            raise ValueError(f"Missing template data: {', '.join(missing)}")
+        
+        incomplete = {}
+        for name in sorted(personal - set(template_data)):
+            count = db.session.query(db.func.count()) \
+                .select_from(Contact) \
+                .join(contact_group_members, contact_group_members.c.contact_id == Contact.id) \
+                .filter(contact_group_members.c.group_id == group_id, Contact.active == True) \
+                .filter(Contact.phone_e164.isnot(None), getattr(Contact, name).is_(None)) \
+                .scalar()
+            if count:
+                incomplete[name] = count
+        
+        if incomplete:
+            details = ', '.join(f'{name} ({count} recipients)' for name, count in incomplete.items())
+            raise ValueError(f'Missing template data: {details}')
+    
+    def _optimize_encoding(self, message, transliterate=None):
+        """
+        Apply the transliteration mode to rendered messages
+        Aplica o modo de transliteração às mensagens renderizadas
+        
+        Args:
+            message (str or list): One message for all recipients, or one per phone number / Uma mensagem para todos, ou uma por número
+            transliterate (str): off, auto or always; defaults to SMS_TRANSLITERATE / off, auto ou always; padrão SMS_TRANSLITERATE
+        
+        Returns:
+            str or list: Messages to send / Mensagens a enviar
+        """
+        mode = transliterate or self.transliterate
+        if mode == 'off':
             return message
-
+        if isinstance(message, list):
+            return [optimize_encoding(text, mode) for text in message]
+        return optimize_encoding(message, mode)
+    
+    def _render(self, compiled, template_data):
+        """
+        Validate data against the placeholders, then render
+        Valida os dados contra os placeholders e então renderiza
+        """
+        missing = compiled.missing(template_data)
+        if missing:
+            raise ValueError(f"Missing template data: {', '.join(missing)}")
+        
+        try:
+            return compiled.render(template_data)
+        except (KeyError, AttributeError, IndexError, TypeError, ValueError) as e:
+            raise ValueError(f'Invalid template data: {e}')
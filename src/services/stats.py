@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+from datetime import datetime
+from src.models.sms import SmsMessage, Contact, ContactGroup, SmsTemplate, db
+
+class StatisticsCache:
+    """
+    In-process cache of the service counters shown by /api/sms/status
+    Cache em processo dos contadores do serviço exibidos por /api/sms/status
+    
+    Counters are computed with COUNT(*) once, then kept current from the writes
+    this process commits (tracked through SQLAlchemy session events). Writes that
+    cannot be attributed, and writes made by other processes, are picked up when
+    the TTL expires and the counters are recounted.
+    Os contadores são calculados com COUNT(*) uma vez e depois mantidos a partir das
+    escritas que este processo confirma (acompanhadas por eventos de sessão do
+    SQLAlchemy). Escritas que não podem ser atribuídas, e escritas de outros
+    processos, são consideradas quando o TTL expira e os contadores são recontados.
+    """
+    
+    # Counter name -> (model, column holding the active flag or None)
+    # Nome do contador -> (modelo, coluna com o indicador de ativo ou None)
+    COUNTERS = {
+        'total_messages': (SmsMessage, None),
+        'total_contacts': (Contact, 'active'),
+        'total_groups': (ContactGroup, 'active'),
+        'total_templates': (SmsTemplate, 'active'),
+    }
+    
+    def __init__(self, ttl=None):
+        """
+        Args:
+            ttl (float): Seconds before counters are recounted / Segundos até os contadores serem recontados
+        """
+        self.ttl = ttl if ttl is not None else float(os.getenv('SMS_STATS_TTL_SECONDS', '60'))
+        self._values = {}
+        self._computed_at = None
+        self._computed_monotonic = 0.0
+        self._lock = threading.Lock()
+    
+    def snapshot(self, force=False):
+        """
+        Get the current counters, recounting when expired or forced
+        Obtém os contadores atuais, recontando quando expirados ou forçado
+        
+        Args:
+            force (bool): Run exact COUNT queries now / Executa as consultas COUNT exatas agora
+        
+        Returns:
+            tuple: (counters dict, datetime of the last exact count) / (dicionário de contadores, data da última contagem exata)
+        """
+        with self._lock:
+            expired = time.monotonic() - self._computed_monotonic > self.ttl
+            if force or expired:
+                self._values = {name: self._count(name) for name in self.COUNTERS}
+                self._computed_at = datetime.utcnow()
+                self._computed_monotonic = time.monotonic()
+            else:
+                # Recount only invalidated counters / Reconta apenas contadores invalidados
+                for name in self.COUNTERS:
+                    if name not in self._values:
+                        self._values[name] = self._count(name)
+            
+            return dict(self._values), self._computed_at
+    
+    def adjust(self, deltas):
+        """
+        Apply committed row count changes / Aplica mudanças confirmadas na contagem de linhas
+        
+        Args:
+            deltas (dict): Change by counter name / Mudança por nome do contador
+        """
+        with self._lock:
+            for name, delta in deltas.items():
+                if name in self._values:
+                    self._values[name] += delta
+    
+    def invalidate(self, names=None):
+        """
+        Drop counters so the next snapshot recounts them
+        Descarta contadores para que o próximo snapshot os reconte
+        """
+        with self._lock:
+            for name in names or list(self._values):
+                self._values.pop(name, None)
+    
+    def install(self, session):
+        """
+        Track committed writes of the given (scoped) session
+        Acompanha as escritas confirmadas da sessão (scoped) informada
+        """
+        db.event.listen(session, 'after_flush', self._after_flush)
+        db.event.listen(session, 'do_orm_execute', self._on_orm_execute)
+        db.event.listen(session, 'after_commit', self._after_commit)
+        db.event.listen(session, 'after_rollback', self._after_rollback)
+    
+    def _count(self, name):
+        model, active_column = self.COUNTERS[name]
+        query = model.query
+        if active_column:
+            query = query.filter(getattr(model, active_column) == True)
+        return query.count()
+    
+    def _counter_for(self, model):
+        for name, (counted_model, active_column) in self.COUNTERS.items():
+            if counted_model is model:
+                return name, active_column
+        return None, None
+    
+    def _after_flush(self, session, flush_context):
+        """
+        Record deltas for objects written by the unit of work
+        Registra deltas dos objetos gravados pela unidade de trabalho
+        """
+        deltas = session.info.setdefault('statistics_deltas', {})
+        
+        for instances, sign in ((session.new, 1), (session.deleted, -1)):
+            for instance in instances:
+                name, active_column = self._counter_for(type(instance))
+                if name and (not active_column or getattr(instance, active_column)):
+                    deltas[name] = deltas.get(name, 0) + sign
+        
+        for instance in session.dirty:
+            name, active_column = self._counter_for(type(instance))
+            if not name or not active_column:
+                continue
+            
+            history = db.inspect(instance).attrs[active_column].history
+            if history.has_changes():
+                before = bool(history.deleted and history.deleted[0])
+                after = bool(getattr(instance, active_column))
+                deltas[name] = deltas.get(name, 0) + (after - before)
+    
+    def _on_orm_execute(self, orm_execute_state):
+        """
+        Record deltas for ORM bulk statements (insert many, update, delete)
+        Registra deltas de comandos ORM em lote (insert múltiplo, update, delete)
+        """
+        if orm_execute_state.is_select or not orm_execute_state.is_orm_statement:
+            return
+        
+        mapper = orm_execute_state.bind_mapper
+        name, active_column = self._counter_for(mapper.class_ if mapper else None)
+        if not name:
+            return
+        
+        session = orm_execute_state.session
+        if orm_execute_state.is_insert and not active_column:
+            params = orm_execute_state.parameters
+            rows = len(params) if isinstance(params, list) else 1
+            deltas = session.info.setdefault('statistics_deltas', {})
+            deltas[name] = deltas.get(name, 0) + rows
+        elif orm_execute_state.is_insert or orm_execute_state.is_delete or active_column:
+            # Effect unknown before execution: recount / Efeito desconhecido antes da execução: reconta
+            session.info.setdefault('statistics_invalidated', set()).add(name)
+    
+    def _after_commit(self, session):
+        deltas = session.info.pop('statistics_deltas', None)
+        invalidated = session.info.pop('statistics_invalidated', None)
+        if deltas:
+            self.adjust(deltas)
+        if invalidated:
+            self.invalidate(invalidated)
+    
+    def _after_rollback(self, session):
+        session.info.pop('statistics_deltas', None)
+        session.info.pop('statistics_invalidated', None)
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from src.models.sms import TERMINAL_STATUSES
+
+class _Flight:
+    """
+    One provider fetch shared by concurrent readers
+    Uma consulta ao provedor compartilhada por leitores concorrentes
+    """
+    
+    __slots__ = ('done', 'status', 'error')
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.status = None
+        self.error = None
+
+class StatusCache:
+    """
+    Cache of message statuses fetched from the provider
+    Cache de status de mensagens consultados no provedor
+    
+    Terminal statuses are kept until evicted and never fetched again, other
+    statuses are refetched at most once per TTL, failed lookups are remembered
+    for a short error TTL, and concurrent reads of the same message share a
+    single provider call.
+    Status finais são mantidos até serem removidos e nunca consultados novamente,
+    os demais são consultados no máximo uma vez por TTL, consultas com falha são
+    lembradas por um TTL de erro curto, e leituras concorrentes da mesma mensagem
+    compartilham uma única chamada ao provedor.
+    """
+    
+    def __init__(self, ttl=None, max_entries=None, error_ttl=None):
+        """
+        Args:
+            ttl (float): Seconds a non-terminal status stays fresh / Segundos em que um status não final permanece válido
+            max_entries (int): Entries kept before the oldest are evicted / Entradas mantidas antes de remover as mais antigas
+            error_ttl (float): Seconds a failed lookup is replayed without calling the provider / Segundos em que uma consulta com falha é repetida sem chamar o provedor
+        """
+        self.ttl = ttl if ttl is not None else float(os.getenv('SMS_STATUS_STALE_SECONDS', '300'))
+        self.error_ttl = error_ttl if error_ttl is not None else float(os.getenv('SMS_STATUS_ERROR_TTL_SECONDS', '5'))
+        self.max_entries = max_entries or int(os.getenv('SMS_STATUS_CACHE_SIZE', '10000'))
+        
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+    
+    def fetch(self, provider_message_id, fetcher):
+        """
+        Get a message status, calling the provider only when needed
+        Obtém o status de uma mensagem, chamando o provedor apenas quando necessário
+        
+        Args:
+            provider_message_id (str): Provider id of the message / Id da mensagem no provedor
+            fetcher (callable): Provider call taking the id / Chamada ao provedor que recebe o id
+        
+        Returns:
+            str: Message status / Status da mensagem
+        """
+        with self._lock:
+            entry = self._entries.get(provider_message_id)
+            if entry is not None:
+                status, fetched_at, error = entry
+                age = time.monotonic() - fetched_at
+                if error is not None and age < self.error_ttl:
+                    # Provider failed recently; do not call it again yet / O provedor falhou há pouco; ainda não chama de novo
+                    raise error
+                if error is None and (status in TERMINAL_STATUSES or age < self.ttl):
+                    self._entries.move_to_end(provider_message_id)
+                    return status
+            
+            flight = self._inflight.get(provider_message_id)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[provider_message_id] = _Flight()
+        
+        # Wait for the request already fetching this message / Aguarda a requisição que já consulta esta mensagem
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.status
+        
+        try:
+            flight.status = fetcher(provider_message_id)
+            self._store(provider_message_id, flight.status)
+            return flight.status
+        
+        except Exception as e:
+            flight.error = e
+            if self.error_ttl > 0:
+                self._store(provider_message_id, None, e)
+            raise
+        
+        finally:
+            with self._lock:
+                self._inflight.pop(provider_message_id, None)
+            flight.done.set()
+    
+    def invalidate(self, provider_message_id):
+        """
+        Forget a cached status / Esquece um status em cache
+        """
+        with self._lock:
+            self._entries.pop(provider_message_id, None)
+    
+    def _store(self, provider_message_id, status, error=None):
+        with self._lock:
+            self._entries[provider_message_id] = (status, time.monotonic(), error)
+            self._entries.move_to_end(provider_message_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,178 @@
+import atexit
+import os
+import threading
+from datetime import datetime
+from src.models.sms import SmsMessage, STATUS_RANK, db
+
+class StatusUpdateBuffer:
+    """
+    Collects provider delivery receipts and writes them to SmsMessage in batches
+    Coleta confirmações de entrega do provedor e grava em SmsMessage em lotes
+    
+    Receipts for the same message are merged (the most advanced status wins) and
+    a stored status never moves backwards, so out-of-order callbacks are harmless.
+    Confirmações da mesma mensagem são combinadas (vence o status mais avançado) e um
+    status armazenado nunca retrocede, então callbacks fora de ordem são inofensivos.
+    
+    A receipt can arrive before the send result carrying its provider id is
+    committed; receipts that match no message are kept for up to
+    SMS_STATUS_MAX_RETRIES more flushes before being dropped.
+    Uma confirmação pode chegar antes de o resultado do envio com o id do provedor
+    ser confirmado; confirmações sem mensagem correspondente são mantidas por até
+    SMS_STATUS_MAX_RETRIES gravações antes de serem descartadas.
+    """
+    
+    def __init__(self):
+        self.batch_size = int(os.getenv('SMS_STATUS_BATCH_SIZE', '500'))
+        self.flush_interval = float(os.getenv('SMS_STATUS_FLUSH_INTERVAL', '1.0'))
+        self.max_retries = int(os.getenv('SMS_STATUS_MAX_RETRIES', '30'))
+        
+        self._pending = {}
+        # Flushes each unmatched receipt has already waited / Gravações que cada confirmação sem correspondência já esperou
+        self._retries = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+    
+    def add(self, provider_message_id, status, error_code=None):
+        """
+        Queue one receipt / Enfileira uma confirmação
+        
+        Args:
+            provider_message_id (str): Provider id of the message / Id da mensagem no provedor
+            status (str): Reported status / Status informado
+            error_code (str): Provider error code, if any / Código de erro do provedor, se houver
+        """
+        status = (status or '').lower()
+        if status not in STATUS_RANK:
+            return
+        
+        with self._lock:
+            current = self._pending.get(provider_message_id)
+            if current is None or STATUS_RANK[status] >= STATUS_RANK[current[0]]:
+                self._pending[provider_message_id] = (status, error_code)
+            full = len(self._pending) >= self.batch_size
+        
+        if full:
+            self._wakeup.set()
+    
+    def start(self, app):
+        """
+        Start the background flusher for the given Flask app
+        Inicia o gravador em segundo plano para a aplicação Flask informada
+        """
+        if self._thread:
+            return
+        
+        self._thread = threading.Thread(target=self._run, args=(app,), name='sms-status-updates', daemon=True)
+        self._thread.start()
+        
+        # Do not lose buffered receipts on shutdown / Não perde confirmações em buffer ao encerrar
+        atexit.register(self._flush_in_context, app)
+    
+    def flush(self):
+        """
+        Write buffered receipts with one executemany UPDATE per status (needs an app context)
+        Grava as confirmações em buffer com um UPDATE executemany por status (requer contexto da aplicação)
+        
+        Returns:
+            int: Number of receipts matched to a message / Número de confirmações associadas a uma mensagem
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            
+            if not pending:
+                return 0
+            
+            by_status = {}
+            for provider_message_id, (status, error_code) in pending.items():
+                by_status.setdefault(status, []).append({
+                    'sid': provider_message_id,
+                    'response': f'{status} (error {error_code})' if error_code else status
+                })
+            
+            now = datetime.utcnow()
+            try:
+                for status, params in by_status.items():
+                    # Only move messages forward; literal values keep the IN list usable with executemany
+                    # Apenas avança as mensagens; valores literais mantêm a lista IN compatível com executemany
+                    lower = [db.literal(name) for name, rank in STATUS_RANK.items() if rank < STATUS_RANK[status]]
+                    db.session.execute(
+                        db.update(SmsMessage.__table__)
+                        .where(SmsMessage.__table__.c.provider_message_id == db.bindparam('sid'))
+                        .where(SmsMessage.__table__.c.status.in_(lower))
+                        .values(status=status, provider_response=db.bindparam('response'), updated_at=now),
+                        params
+                    )
+                db.session.commit()
+                
+                unmatched = self._unmatched(list(pending))
+            
+            except Exception:
+                db.session.rollback()
+                # Put the receipts back for the next attempt / Devolve as confirmações para a próxima tentativa
+                for provider_message_id, (status, error_code) in pending.items():
+                    self.add(provider_message_id, status, error_code)
+                raise
+            
+            self._retry(pending, unmatched)
+            return len(pending) - len(unmatched)
+    
+    def _unmatched(self, provider_message_ids):
+        """
+        Provider ids with no stored message yet / Ids do provedor ainda sem mensagem armazenada
+        """
+        column = SmsMessage.__table__.c.provider_message_id
+        found = set()
+        for start in range(0, len(provider_message_ids), 500):
+            chunk = provider_message_ids[start:start + 500]
+            found.update(db.session.execute(db.select(column).where(column.in_(chunk))).scalars())
+        return [sid for sid in provider_message_ids if sid not in found]
+    
+    def _retry(self, pending, unmatched):
+        """
+        Queue unmatched receipts for the next flush, dropping those out of retries
+        Enfileira confirmações sem correspondência para a próxima gravação, descartando as que esgotaram as tentativas
+        """
+        unmatched = set(unmatched)
+        retry = []
+        dropped = 0
+        
+        with self._lock:
+            for provider_message_id in pending:
+                attempts = self._retries.pop(provider_message_id, 0) + 1
+                if provider_message_id not in unmatched:
+                    continue
+                if attempts > self.max_retries:
+                    dropped += 1
+                    continue
+                self._retries[provider_message_id] = attempts
+                retry.append(provider_message_id)
+        
+        for provider_message_id in retry:
+            self.add(provider_message_id, *pending[provider_message_id])
+        
+        if dropped:
+            print(f"Warning: dropped {dropped} status updates for unknown provider message ids")
+    
+    def _flush_in_context(self, app):
+        with app.app_context():
+            self.flush()
+    
+    def _run(self, app):
+        """
+        Flush loop / Loop de gravação
+        """
+        with app.app_context():
+            while True:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Warning: status update flush failed: {e}")
+                finally:
+                    db.session.remove()
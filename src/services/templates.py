@@ -0,0 +1,136 @@
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from string import Formatter
+
+_formatter = Formatter()
+
+class CompiledTemplate:
+    """
+    SMS template parsed once into literal text and placeholder fields
+    Template SMS analisado uma vez em texto literal e campos de placeholder
+    
+    Uses str.format syntax ({name}, {name:spec}, {name!r}, {contact.name}).
+    Positional fields ({} or {0}) are rejected because templates are filled from a dict.
+    Usa a sintaxe de str.format ({name}, {name:spec}, {name!r}, {contact.name}).
+    Campos posicionais ({} ou {0}) são rejeitados pois templates são preenchidos com um dict.
+    """
+    
+    __slots__ = ('text', 'placeholders', '_parts')
+    
+    def __init__(self, text):
+        """
+        Args:
+            text (str): Template text / Texto do template
+        
+        Raises:
+            ValueError: If the template is malformed / Se o template for inválido
+        """
+        self.text = text
+        parts = []
+        placeholders = set()
+        
+        for literal, field_name, format_spec, conversion in _formatter.parse(text):
+            if field_name is None:
+                parts.append((literal, None, None, None, None))
+                continue
+            
+            root = field_name.split('.', 1)[0].split('[', 1)[0]
+            if not root or root.isdigit():
+                raise ValueError('Positional placeholders are not supported in templates')
+            
+            placeholders.add(root)
+            # Simple names are looked up directly / Nomes simples são buscados diretamente
+            lookup = None if root == field_name else field_name
+            parts.append((literal, root, lookup, conversion, format_spec or ''))
+        
+        self.placeholders = frozenset(placeholders)
+        self._parts = tuple(parts)
+    
+    def missing(self, data):
+        """
+        Placeholders without a value in data / Placeholders sem valor em data
+        
+        Returns:
+            list: Sorted missing placeholder names / Nomes de placeholders ausentes ordenados
+        """
+        return sorted(name for name in self.placeholders if name not in data)
+    
+    def render(self, data):
+        """
+        Fill the template without parsing it again
+        Preenche o template sem analisá-lo novamente
+        
+        Args:
+            data (dict): Values by placeholder name / Valores por nome de placeholder
+        
+        Returns:
+            str: Rendered message / Mensagem renderizada
+        """
+        output = []
+        for literal, root, lookup, conversion, format_spec in self._parts:
+            output.append(literal)
+            if root is None:
+                continue
+            
+            value = data[root] if lookup is None else _formatter.get_field(lookup, (), data)[0]
+            if conversion:
+                value = _formatter.convert_field(value, conversion)
+            if '{' in format_spec:
+                format_spec = _formatter.vformat(format_spec, (), data)
+            output.append(format(value, format_spec))
+        
+        return ''.join(output)
+
+def extract_placeholders(text):
+    """
+    Placeholder names used by a template / Nomes de placeholders usados por um template
+    
+    Raises:
+        ValueError: If the template is malformed / Se o template for inválido
+    """
+    return sorted(compile_template(text).placeholders)
+
+@lru_cache(maxsize=256)
+def compile_template(text):
+    """
+    Compile ad hoc message text, reusing earlier compilations
+    Compila texto de mensagem avulso, reaproveitando compilações anteriores
+    """
+    return CompiledTemplate(text)
+
+class TemplateCache:
+    """
+    Compiled SmsTemplate rows keyed by (template id, version)
+    Linhas SmsTemplate compiladas indexadas por (id do template, versão)
+    """
+    
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.getenv('SMS_TEMPLATE_CACHE_SIZE', '512'))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, template):
+        """
+        Get the compiled form of a template row / Obtém a forma compilada de uma linha de template
+        
+        Args:
+            template (SmsTemplate): Template row / Linha do template
+        
+        Returns:
+            CompiledTemplate: Compiled template / Template compilado
+        """
+        key = (template.id, template.version)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                return compiled
+        
+        compiled = CompiledTemplate(template.template)
+        with self._lock:
+            self._entries[key] = compiled
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compiled
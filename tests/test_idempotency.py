@@ -0,0 +1,191 @@
+import time
+import pytest
+from datetime import timedelta
+from types import SimpleNamespace
+from flask import Flask
+from src.models.sms import IdempotencyKey, SmsJob, db
+from src.models.migrations import run_migrations
+from src.models.storage import configure_database
+from src.routes.sms import sms_bp
+from src.services.idempotency import IdempotencyStore
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.delenv('DATABASE_URL', raising=False)
+    app = Flask(__name__)
+    app.register_blueprint(sms_bp, url_prefix='/api')
+    configure_database(app, f"sqlite:///{tmp_path / 'test.db'}")
+    with app.app_context():
+        db.create_all()
+        run_migrations()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def store(app):
+    return IdempotencyStore(ttl=60, lease=60)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def send_bulk(client, body, key=None):
+    headers = {'Idempotency-Key': key} if key else {}
+    return client.post('/api/sms/send/bulk', json=body, headers=headers)
+
+# Store / Armazenamento
+
+def test_new_key_then_replay(store):
+    request_hash = IdempotencyStore.request_hash({'to': ['+15551234567']})
+    
+    state, record = store.begin('send', 'k1', request_hash)
+    assert state == 'new'
+    
+    store.complete('send', 'k1', 202, {'success': True, 'job_id': 7})
+    state, record = store.begin('send', 'k1', request_hash)
+    assert state == 'replay'
+    assert record.status_code == 202
+    assert '"job_id": 7' in record.response
+
+def test_request_hash_mismatch(store):
+    store.begin('send', 'k1', IdempotencyStore.request_hash({'message': 'a'}))
+    
+    state, _ = store.begin('send', 'k1', IdempotencyStore.request_hash({'message': 'b'}))
+    assert state == 'mismatch'
+
+def test_request_hash_ignores_key_order():
+    assert IdempotencyStore.request_hash({'a': 1, 'b': 2}) == IdempotencyStore.request_hash({'b': 2, 'a': 1})
+
+def test_unfinished_key_is_in_progress_within_lease(store):
+    store.begin('send', 'k1', 'hash')
+    
+    state, _ = store.begin('send', 'k1', 'hash')
+    assert state == 'in_progress'
+
+def test_unfinished_key_is_taken_over_after_lease(store):
+    expired = IdempotencyStore(ttl=60, lease=0)
+    store.begin('send', 'k1', 'hash')
+    time.sleep(0.01)
+    
+    state, record = expired.begin('send', 'k1', 'hash')
+    assert state == 'new'
+    assert record.key == 'k1'
+    assert IdempotencyKey.query.filter_by(scope='send', key='k1').count() == 1
+
+def test_stale_lease_is_taken_over_once(store):
+    _, record = store.begin('send', 'k1', 'hash')
+    stale = SimpleNamespace(id=record.id, created_at=record.created_at)
+    later = record.created_at + timedelta(seconds=120)
+    
+    assert store._take_over(record, later)[0] == 'new'
+    
+    # A second caller that read the stale lease loses / Um segundo chamador que leu o prazo antigo perde
+    assert store._take_over(stale, later + timedelta(seconds=1)) == ('in_progress', None)
+
+def test_linked_job_is_not_abandoned(store):
+    store.begin('send', 'k1', 'hash')
+    job = SmsJob(job_type='bulk', total=1)
+    db.session.add(job)
+    db.session.flush()
+    store.link_job('send', 'k1', job.id)
+    db.session.commit()
+    
+    store.abandon('send', 'k1')
+    state, record = store.begin('send', 'k1', 'hash')
+    assert state == 'job'
+    assert record.job_id == job.id
+
+def test_unlinked_key_is_abandoned(store):
+    store.begin('send', 'k1', 'hash')
+    
+    store.abandon('send', 'k1')
+    assert store.begin('send', 'k1', 'hash')[0] == 'new'
+
+def test_expired_key_is_reused(app):
+    store = IdempotencyStore(ttl=0, lease=60)
+    store.begin('send', 'k1', IdempotencyStore.request_hash({'message': 'a'}))
+    
+    state, _ = store.begin('send', 'k1', IdempotencyStore.request_hash({'message': 'b'}))
+    assert state == 'new'
+
+# Idempotency-Key header / Cabeçalho Idempotency-Key
+
+def test_header_replays_response(client):
+    body = {'to': ['+15551234567', '+15551234568'], 'message': 'hi'}
+    
+    first = send_bulk(client, body, key='req-1')
+    second = send_bulk(client, body, key='req-1')
+    assert first.status_code == 202
+    assert second.status_code == 202
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert second.get_json() == first.get_json()
+    assert SmsJob.query.count() == 1
+
+def test_header_reused_with_other_body(client):
+    send_bulk(client, {'to': ['+15551234567'], 'message': 'hi'}, key='req-1')
+    
+    response = send_bulk(client, {'to': ['+15551234567'], 'message': 'bye'}, key='req-1')
+    assert response.status_code == 422
+
+def test_failed_request_releases_key(client):
+    assert send_bulk(client, {'to': [], 'message': 'hi'}, key='req-1').status_code == 400
+    
+    response = send_bulk(client, {'to': ['+15551234567'], 'message': 'hi'}, key='req-1')
+    assert response.status_code == 202
+
+# Per-recipient dedupe keys / Chaves de deduplicação por destinatário
+
+def test_dedupe_keys_skip_queued_recipients(client):
+    first = send_bulk(client, {
+        'to': ['+15551234567', '+15551234568'],
+        'message': 'hi',
+        'dedupe_keys': ['a', 'b']
+    })
+    second = send_bulk(client, {
+        'to': ['+15551234568', '+15551234569'],
+        'message': 'hi',
+        'dedupe_keys': ['b', 'c']
+    })
+    assert second.status_code == 202
+    result = second.get_json()
+    assert result['total_queued'] == 1
+    assert result['duplicates'] == [{
+        'phone_number': '+15551234568',
+        'dedupe_key': 'b',
+        'message_id': first.get_json()['message_ids'][1]
+    }]
+
+def test_dedupe_key_repeated_in_one_request(client):
+    response = send_bulk(client, {
+        'to': ['+15551234567', '+15551234568', '+15551234569'],
+        'message': 'hi',
+        'dedupe_keys': ['a', 'a', None]
+    })
+    result = response.get_json()
+    assert result['total_queued'] == 2
+    assert result['duplicates'][0]['message_id'] == result['message_ids'][0]
+
+def test_all_duplicates_queue_nothing(client):
+    body = {'to': ['+15551234567'], 'message': 'hi', 'dedupe_keys': ['a']}
+    send_bulk(client, body)
+    
+    result = send_bulk(client, body).get_json()
+    assert result['status'] == 'duplicate'
+    assert result['job_id'] is None
+    assert SmsJob.query.count() == 1
+
+@pytest.mark.parametrize('dedupe_keys', [
+    [1, 2],
+    ['a', ''],
+    ['a', 'x' * 256],
+    ['a'],
+    'ab',
+])
+def test_invalid_dedupe_keys_are_rejected(client, dedupe_keys):
+    response = send_bulk(client, {
+        'to': ['+15551234567', '+15551234568'],
+        'message': 'hi',
+        'dedupe_keys': dedupe_keys
+    })
+    assert response.status_code == 400
@@ -0,0 +1,42 @@
+import pytest
+from src.services.phone import normalize_phone
+
+@pytest.mark.parametrize('number, expected', [
+    ('+1 (555) 123-4567', '+15551234567'),
+    ('(555) 123-4567', '+15551234567'),
+    ('15551234567', '+15551234567'),
+    ('0044 20 7946 0958', '+442079460958'),
+    ('+44 20 7946 0958', '+442079460958'),
+])
+def test_normalizes_to_e164(number, expected):
+    assert normalize_phone(number, '1') == expected
+
+@pytest.mark.parametrize('number', [
+    '١٢٣٤٥٦٧٨٩٠',
+    '+1555١٢٣٤٥٦٧',
+    'call me',
+    '123',
+    '+0123456789',
+    None,
+])
+def test_rejects_invalid_numbers(number):
+    assert normalize_phone(number, '1') is None
+
+# Trunk 0 / Prefixo nacional 0
+
+def test_trunk_zero_is_rejected_for_nanp_default():
+    assert normalize_phone('020 7946 0958', '1') is None
+
+def test_trunk_zero_is_replaced_by_default_country():
+    assert normalize_phone('020 7946 0958', '44') == '+442079460958'
+    assert normalize_phone('(011) 91234-5678', '55') == '+5511912345678'
+    assert normalize_phone('030 123456', '49') == '+4930123456'
+
+def test_trunk_zero_is_kept_where_e164_keeps_it():
+    assert normalize_phone('06 1234 5678', '39') == '+390612345678'
+
+def test_default_country_from_environment(monkeypatch):
+    monkeypatch.setenv('SMS_DEFAULT_COUNTRY_CODE', '+44')
+    assert normalize_phone('07911 123456') == '+447911123456'
+    monkeypatch.delenv('SMS_DEFAULT_COUNTRY_CODE')
+    assert normalize_phone('07911 123456') is None
@@ -0,0 +1,74 @@
+import pytest
+from src.services.segments import measure, optimize_encoding, parse_transliterate_mode, transliterate
+
+# measure: GSM-7 / medição: GSM-7
+
+def test_gsm_single_segment_boundary():
+    assert measure('a' * 160)[:3] == ('GSM-7', 1, 160)
+    assert measure('a' * 161)[:3] == ('GSM-7', 2, 161)
+
+def test_gsm_concatenated_parts_hold_153_septets():
+    assert measure('a' * 306).segments == 2
+    assert measure('a' * 307).segments == 3
+
+def test_extension_characters_count_two_septets():
+    assert measure('€' * 80)[:3] == ('GSM-7', 1, 160)
+    assert measure('€' * 80 + 'a')[:3] == ('GSM-7', 2, 161)
+
+def test_escape_sequence_is_not_split_across_parts():
+    # 306 septets fit two parts only if the escape could be split / 306 septetos só caberiam em duas partes se o escape pudesse ser dividido
+    text = 'a' * 152 + '€' + 'a' * 152
+    assert measure(text).length == 306
+    assert measure(text).segments == 3
+
+# measure: UCS-2 / medição: UCS-2
+
+def test_ucs2_single_segment_boundary():
+    assert measure('ã' * 70)[:3] == ('UCS-2', 1, 70)
+    assert measure('ã' * 71)[:3] == ('UCS-2', 2, 71)
+
+def test_surrogate_pairs_count_two_units():
+    assert measure('😀' * 35)[:3] == ('UCS-2', 1, 70)
+    assert measure('😀' * 35 + 'a')[:3] == ('UCS-2', 2, 71)
+
+def test_surrogate_pair_is_not_split_across_parts():
+    text = 'a' * 66 + '😀' + 'a' * 66
+    assert measure(text).length == 134
+    assert measure(text).segments == 3
+
+def test_non_gsm_characters_are_reported_once():
+    assert measure('ã ã 😀').non_gsm == ('ã', '😀')
+    assert measure('Hello').non_gsm == ()
+
+# transliterate / transliteração
+
+@pytest.mark.parametrize('text, expected', [
+    ('“Olá” – São Paulo…', '"Ola" - Sao Paulo...'),
+    ('Açaí', 'Acai'),
+    ('Hi 🚨 there', 'Hi there'),
+    ('🚨 ALERT', 'ALERT'),
+    ('Bye 👋', 'Bye'),
+    ('Price 中', 'Price ?'),
+    ('Ça {va} [ok] €5', 'Ça {va} [ok] €5'),
+])
+def test_transliterate(text, expected):
+    assert transliterate(text) == expected
+    assert measure(transliterate(text)).encoding == 'GSM-7'
+
+# optimize_encoding / otimização da codificação
+
+def test_auto_keeps_text_unless_segments_drop():
+    assert optimize_encoding('Olá ã', 'auto') == 'Olá ã'
+    assert optimize_encoding('ã' * 100, 'auto') == 'a' * 100
+
+def test_off_and_always():
+    assert optimize_encoding('ã' * 100, 'off') == 'ã' * 100
+    assert optimize_encoding('Olá ã', 'always') == 'Ola a'
+
+def test_parse_transliterate_mode():
+    assert parse_transliterate_mode(None) is None
+    assert parse_transliterate_mode(True) == 'auto'
+    assert parse_transliterate_mode(False) == 'off'
+    assert parse_transliterate_mode('ALWAYS') == 'always'
+    with pytest.raises(ValueError):
+        parse_transliterate_mode('sometimes')